@@ -1,11 +1,12 @@
-import os, time, math
+import os, time, math, threading
 from datetime import datetime, timezone
 from collections import OrderedDict
 import numpy as np
 from netCDF4 import MFDataset, Variable
-from typing import List, Dict, Any, Sequence, BinaryIO, TextIO, ValuesView, Optional, Tuple
+from typing import List, Dict, Any, Sequence, BinaryIO, TextIO, ValuesView, Optional, Tuple, Callable
 from edas.process.source import VID
 from edas.config import EdasEnv
+from edas.collection.index import AggIndex
 import defusedxml.ElementTree as ET
 from edas.util.logging import EDASLogger
 
@@ -55,8 +56,8 @@ class File:
     def __init__(self, _agg: "Aggregation", *args ):
        self.logger = EDASLogger.getLogger()
        self.agg = _agg
-       self.start_time = float(args[0].strip())
-       self.size = int(args[1].strip())
+       self.start_time = float(args[0].strip()) if isinstance( args[0], str ) else float(args[0])
+       self.size = int(args[1].strip()) if isinstance( args[1], str ) else int(args[1])
        self.relpath = args[2].strip()
        self.date = datetime.fromtimestamp( self.start_time*60, tz=timezone.utc)
 
@@ -73,6 +74,56 @@ class File:
            return int( result ) if isInt else result
        except: return 1 if isInt else 0.0
 
+class CatalogCache:
+    # Process-wide LRU cache of parsed Collection and Aggregation objects, invalidated when the spec file's mtime changes.
+    # Spec files are re-stat'ed at most once per 'catalog.cache.check' seconds, so steady-state requests do no catalog file I/O.
+
+    def __init__( self, maxEntries: int, checkInterval: float ):
+        self.maxEntries = maxEntries
+        self.checkInterval = checkInterval
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[str,List]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def mtime( path: str ) -> Optional[int]:
+        try: return os.stat( path ).st_mtime_ns
+        except OSError: return None
+
+    def get( self, key: str, path: str, factory: Callable[[],Any] ) -> Any:
+        with self._lock:
+            entry = self._entries.get( key )
+            if entry is not None:
+                mtime, checked, obj = entry
+                now = time.time()
+                if ( now - checked < self.checkInterval ) or ( self.mtime(path) == mtime ):
+                    entry[1] = now
+                    self._entries.move_to_end( key )
+                    self.hits += 1
+                    return obj
+                del self._entries[key]
+            self.misses += 1
+        mtime = self.mtime( path )
+        obj = factory()
+        with self._lock:
+            self._entries[key] = [ mtime, time.time(), obj ]
+            self._entries.move_to_end( key )
+            while len( self._entries ) > self.maxEntries:
+                self._entries.popitem( last=False )
+                self.evictions += 1
+        return obj
+
+    def clear(self):
+        with self._lock: self._entries.clear()
+
+    def stats(self) -> Dict[str,int]:
+        with self._lock:
+            return dict( hits=self.hits, misses=self.misses, evictions=self.evictions, entries=len(self._entries), maxEntries=self.maxEntries )
+
+CatalogCacheMgr = CatalogCache( int( EdasEnv.get( "catalog.cache.size", 256 ) ), float( EdasEnv.get( "catalog.cache.check", 2.0 ) ) )
+
 class Collection:
 
 
@@ -93,7 +144,7 @@ class Collection:
     @classmethod
     def new(cls, name: str ):
         spec_file = os.path.join( cls.baseDir, name + ".csv" )
-        return Collection(name, spec_file)
+        return CatalogCacheMgr.get( spec_file, spec_file, lambda: Collection(name, spec_file) )
 
     def __init__(self, _name, _spec_file ):
         self.logger = EDASLogger.getLogger()
@@ -116,12 +167,20 @@ class Collection:
                     toks = line.split(",")
                     self.aggs[toks[0].strip()] = ",".join(toks[1:]).strip()
 
+    def getParm( self, key: str, default=None ) -> str:
+        return self.parms.get( key, EdasEnv.get( key, default ) )
+
+    def getBool( self, key: str, default: bool ) -> bool:
+        rv = self.getParm( key )
+        if rv is None: return default
+        return rv.lower().startswith("t")
+
     def getAggId( self, varName: str ) -> str:
         return self.aggs.get( varName )
 
     def getAggregation( self, aggId: str ) -> "Aggregation":
         agg_file = os.path.join( Collection.baseDir, aggId + ".ag1")
-        return Aggregation( self.name, agg_file )
+        return CatalogCacheMgr.get( agg_file + "@" + self.name, agg_file, lambda: Aggregation( self.name, agg_file ) )
 
     def getVariableSpec( self, varName: str ):
         agg =  self.getAggregation( self.getAggId( varName ) )
@@ -238,40 +297,67 @@ class Aggregation:
         self.name = _name
         self.spec = _agg_file
         self.parms = {}
-        self.files: Dict[str,File] = OrderedDict()
         self.axes: Dict[str,Axis] = {}
         self.dims = {}
         self.vars = {}
-        self._parseAggFile()
+        self.index: Optional[AggIndex] = None
+        self._files: Optional[Dict[str,File]] = None
+        self.coordChecks: Dict[str,bool] = {}      # Whether the catalog coordinate of a dim matches the files' ( see VirtualDataset.checkFileCoord )
+        if EdasEnv.getBool( "agg.index", True ):  self._loadIndex()
+        else:                                    self._parseAggFile()
+
+    @property
+    def files(self) -> Dict[str,File]:
+        if self._files is None:
+            self._files = OrderedDict( [ ( str(start), File( self, start, size, relpath ) ) for ( start, size, relpath ) in self.index.iterRecords() ] )
+        return self._files
+
+    @property
+    def nFiles(self) -> int:
+        return len( self.index ) if self.index is not None else len( self.files )
 
     def getChunkSize(self, maxFiles: int, nfiles: int ) -> Tuple[Optional[int], int]:
         from statistics import median
-        files: List[File] = list(self.fileList())
-        fileSize = median( [ f.size for f in files ] )
+        if self.index is not None:  fileSize = int( np.median( self.index.sizes ) )
+        else:                       fileSize = median( [ f.size for f in self.fileList() ] )
         nchunks = None
         if nfiles > maxFiles:
             nchunks = int( math.ceil(nfiles/float(maxFiles)) * fileSize )
         return ( nchunks, fileSize )
 
+    def _loadIndex(self):
+        assert os.path.isfile(self.spec), "Unknown Aggregation: " + os.path.basename(self.spec)
+        try:
+            self.index = AggIndex.load( self.spec )
+            for line in self.index.header: self._parseLine( line )
+        except Exception as err:
+            self.logger.error(f"Loading index for Agg file {self.spec}: " + repr(err) )
+            raise err
+        self.logger.info( f"Loaded Agg index: {len(self.index)} files, {len(self.vars)} vars")
+
+    def _parseLine(self, line: str ):
+        if len(line) > 1 and line[1] == ";":
+            try:
+                type = line[0]
+                value = line[2:].split(";")
+                if type == 'P': self.parms[ value[0].replace('"',' ').strip() ] = ";".join( value[1:] ).replace('"',' ').strip()
+                elif type == 'A': self.axes[ value[2].strip() ] = Axis( *value )
+                elif type == 'C': self.dims[ value[0].strip() ] = File.getNumber( value[1].strip(), True )
+                elif type == 'V': self.vars[ value[0].strip() ] = VarRec.new( value )
+                elif type == 'F': self._files[ value[0].strip() ] = File( self, *value )
+            except Exception as err:
+                self.logger.error( "Error parsing line: " + line )
+                raise err
+
     def _parseAggFile(self):
         assert os.path.isfile(self.spec), "Unknown Aggregation: " + os.path.basename(self.spec)
         self.logger.info( "Parsing Agg file: " + self.spec )
+        self._files = OrderedDict()
         try:
             with open(self.spec, "r") as file:
                 for line in file.readlines():
                     if not line: break
-                    if line[1] == ";":
-                        try:
-                            type = line[0]
-                            value = line[2:].split(";")
-                            if type == 'P': self.parms[ value[0].replace('"',' ').strip() ] = ";".join( value[1:] ).replace('"',' ').strip()
-                            elif type == 'A': self.axes[ value[2].strip() ] = Axis( *value )
-                            elif type == 'C': self.dims[ value[0].strip() ] = File.getNumber( value[1].strip(), True )
-                            elif type == 'V': self.vars[ value[0].strip() ] = VarRec.new( value )
-                            elif type == 'F': self.files[ value[0].strip() ] = File( self, *value )
-                        except Exception as err:
-                            self.logger.error( "Error parsing line: " + line )
-                            raise err
+                    self._parseLine( line )
         except Exception as err:
             self.logger.error(f"Parsing Agg file {self.spec}: " + repr(err) )
             raise err
@@ -300,23 +386,38 @@ class Aggregation:
         return self.files.values()
 
     def pathList(self)-> List[str]:
-        return [ file.getPath() for file in self.files.values() ]
+        if self.index is None: return [ file.getPath() for file in self.files.values() ]
+        return self.pathRange( 0, len(self.index) )
+
+    def pathRange(self, start: int, end: int )-> List[str]:
+        base_path = self.parm("base.path")
+        return [ base_path + "/" + relpath for relpath in self.index.relpaths( start, end ) ]
+
+    @staticmethod
+    def fileRange( starts: np.ndarray, start:datetime, end:datetime ) -> Tuple[int,int]:
+        # Index range [i0,i1) of the files ( sorted start minutes ) overlapping [start,end]: from the file containing start
+        # ( the last file starting at or before it ) to the last file starting at or before end.  A single file is always selected.
+        if starts.size <= 1: return 0, starts.size
+        i0 = max( int( np.searchsorted( starts, start.timestamp()/60.0, side="right" ) ) - 1, 0 )
+        i1 = int( np.searchsorted( starts, end.timestamp()/60.0, side="right" ) )
+        return ( i0, i1 ) if i1 > 0 else ( 0, 0 )
+
+    def periodRange(self, start:datetime, end:datetime ) -> Tuple[int,int]:
+        return self.fileRange( self.index.starts, start, end )
 
     def periodPathList(self, start:datetime, end:datetime  )-> List[str]:
         t0 = time.time()
-        filesView = self.files.values()
-        if len( filesView ) == 1:
-            paths: List[str] = [ file.getPath() for file in filesView ]
-        else:
-            paths: List[str] = []
-            prev_file = None
-            for file in filesView:
-                if file.date > end: break
-                if file.date >= start:
-                    if (len(paths) == 0) and (prev_file is not None):
-                        paths.append( prev_file.getPath() )
-                    paths.append( file.getPath() )
-                prev_file = file
+        if self.index is None: return self._periodPathList( start, end )
+        paths: List[str] = self.pathRange( *self.periodRange( start, end ) )
+        self.logger.info(f"@PPL: extracted {len(paths)} paths from {len(self.index)}: time = {time.time()-t0} sec")
+        return paths
+
+    def _periodPathList(self, start:datetime, end:datetime  )-> List[str]:
+        # Same selection as periodRange, from the parsed file records ( agg.index = false ).
+        t0 = time.time()
+        files = sorted( self.files.values(), key=lambda file: file.start_time )
+        i0, i1 = self.fileRange( np.array( [ file.start_time for file in files ] ), start, end )
+        paths: List[str] = [ file.getPath() for file in files[i0:i1] ]
         self.logger.info(f"@PPL: extracted {len(paths)} paths from {len(self.files)}: time = {time.time()-t0} sec")
         return paths
 
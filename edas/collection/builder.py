@@ -0,0 +1,149 @@
+import os, time, fnmatch
+import numpy as np
+import netCDF4
+from datetime import timezone
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Tuple
+from edas.collection.index import AggIndex
+from edas.util.logging import EDASLogger
+
+TimeUnits = "minutes since 1970-01-01T00:00:00Z"
+
+def getAxisType( name: str, var: netCDF4.Variable ) -> Optional[str]:
+    axis = getattr( var, "axis", "" ).upper()
+    if axis in [ "T", "X", "Y", "Z" ]: return axis
+    units = getattr( var, "units", "" ).lower()
+    if " since " in units: return "T"
+    if units in [ "degrees_east", "degree_east", "degrees_e" ] or name.lower() in [ "lon", "longitude" ]: return "X"
+    if units in [ "degrees_north", "degree_north", "degrees_n" ] or name.lower() in [ "lat", "latitude" ]: return "Y"
+    if hasattr( var, "positive" ) or name.lower() in [ "lev", "level", "plev", "height", "depth" ]: return "Z"
+    return None
+
+def getTimeVariable( ds: netCDF4.Dataset ) -> netCDF4.Variable:
+    for name, var in ds.variables.items():
+        if var.ndim == 1 and var.dimensions[0] == name and getAxisType( name, var ) == "T": return var
+    raise Exception( f"No time coordinate found in {ds.filepath()}" )
+
+def toMinutes( tvar: netCDF4.Variable, values: np.ndarray ) -> np.ndarray:
+    # Converts time coordinate values to (float) minutes since 1970-01-01 UTC, the time unit of the 'F;' records.
+    dates = netCDF4.num2date( values, tvar.units, getattr( tvar, "calendar", "standard" ), only_use_cftime_datetimes=False, only_use_python_datetimes=True )
+    return np.array( [ date.replace( tzinfo=timezone.utc ).timestamp() / 60.0 for date in np.atleast_1d( dates ) ] )
+
+def scanFile( path: str ) -> Tuple[Optional[Tuple[float,int,float]],Optional[str]]:
+    # Returns the start time (minutes), number of time steps and end time of a file, or an error message; runs in the builder's process pool.
+    try:
+        with netCDF4.Dataset( path ) as ds:
+            tvar = getTimeVariable( ds )
+            nsteps = tvar.shape[0]
+            bounds = toMinutes( tvar, tvar[ [ 0, nsteps-1 ] ] )
+            return ( float( bounds[0] ), int( nsteps ), float( bounds[1] ) ), None
+    except Exception as err:
+        return None, repr( err )
+
+class AggBuilder:
+    # Builds an aggregation (.ag1) file from the netCDF files matching a pattern under a base directory.  File time ranges
+    # are scanned in a process pool and written as 'F;' records sorted by start time; the 'A;', 'C;' and 'V;' header records
+    # are generated from the last file, with the time axis and variable shapes extended to the whole aggregation.
+    # In incremental mode the 'F;' records of an existing .ag1 file are kept and only files that it doesn't list are
+    # scanned, so updating a large collection costs one directory walk plus the new files.  Files that can't be scanned
+    # are logged and left out, so they are retried by the next incremental build.  The .ag1 file is replaced atomically.
+
+    def __init__(self, aggFile: str, baseDir: str, pattern: str = "*.nc", nProcs: int = 8 ):
+        self.logger = EDASLogger.getLogger()
+        self.aggFile = aggFile
+        self.baseDir = os.path.abspath( os.path.expanduser( baseDir ) )
+        self.pattern = pattern
+        self.nProcs = max( nProcs, 1 )
+
+    def listFiles(self) -> List[str]:
+        relpaths = []
+        for root, dirs, files in os.walk( self.baseDir ):
+            dirs.sort()
+            for file in sorted( files ):
+                relpath = os.path.relpath( os.path.join( root, file ), self.baseDir )
+                if fnmatch.fnmatch( relpath, self.pattern ) or fnmatch.fnmatch( file, self.pattern ): relpaths.append( relpath )
+        return relpaths
+
+    def scanFiles( self, relpaths: List[str] ) -> Dict[str,Tuple[float,int,float]]:
+        paths = [ os.path.join( self.baseDir, relpath ) for relpath in relpaths ]
+        results: Dict[str,Tuple[float,int,float]] = {}
+        if len( paths ) == 0: return results
+        with ProcessPoolExecutor( max_workers=min( self.nProcs, len(paths) ) ) as executor:
+            chunksize = max( 1, len(paths) // ( self.nProcs * 4 ) )
+            for relpath, ( result, error ) in zip( relpaths, executor.map( scanFile, paths, chunksize=chunksize ) ):
+                if result is None: self.logger.error( f"AggBuilder: skipping file {relpath}: {error}" )
+                else: results[relpath] = result
+        return results
+
+    def readExisting(self) -> Tuple[ Dict[str,str], List[Tuple[int,int,str]], Optional[float] ]:
+        # Parms, file records and time axis end (minutes) of the existing .ag1 file.
+        header, files = AggIndex.parseFileRecords( self.aggFile )
+        parms, tEnd = {}, None
+        for line in header:
+            value = line[2:].split(";")
+            if line[0] == 'P': parms[ value[0].strip() ] = ";".join( value[1:] ).strip()
+            elif line[0] == 'A' and value[2].strip() == "T": tEnd = float( value[6] )
+        return parms, [ ( start, size, relpath.decode() ) for ( start, size, relpath ) in files.values() ], tEnd
+
+    def header(self, path: str, parms: Dict[str,str], ntime: int, tStart: float, tEnd: float ) -> List[str]:
+        lines = [ f"P; {key}; {value}\n" for key, value in parms.items() ]
+        with netCDF4.Dataset( path ) as ds:
+            tname = getTimeVariable( ds ).name
+            resolution: Dict[str,float] = {}
+            for name, var in ds.variables.items():
+                if var.ndim != 1 or var.dimensions[0] != name: continue
+                atype = getAxisType( name, var )
+                if atype is None: continue
+                long_name = getattr( var, "long_name", name )
+                if atype == "T":
+                    lines.append( f"A; {name}; {long_name}; T; {ntime}; {TimeUnits}; {int(round(tStart))}; {int(round(tEnd))}\n" )
+                else:
+                    values = var[:]
+                    if values.size > 1: resolution[name] = abs( float( values[1] - values[0] ) )
+                    lines.append( f"A; {name}; {long_name}; {atype}; {values.size}; {getattr(var,'units','')}; {float(values[0])}; {float(values[-1])}\n" )
+            for name, dim in ds.dimensions.items():
+                lines.append( f"C; {name}; {ntime if name == tname else dim.size}\n" )
+            for name, var in ds.variables.items():
+                if name in ds.dimensions or tname not in var.dimensions: continue
+                shape = ",".join( [ str( ntime if dim == tname else ds.dimensions[dim].size ) for dim in var.dimensions ] )
+                res = ",".join( [ f"{dim}:{resolution[dim]}" for dim in var.dimensions if dim in resolution ] )
+                long_name = getattr( var, "long_name", name )
+                description = getattr( var, "standard_name", long_name )
+                lines.append( f"V; {name}; {long_name}; {name}; {description}; {shape}; {res}; {' '.join(var.dimensions)}; {getattr(var,'units','')}\n" )
+        return lines
+
+    def build(self, incremental: bool = False ) -> int:
+        # Returns the number of files added to the aggregation.
+        t0 = time.time()
+        parms, records, tEnd = self.readExisting() if incremental and os.path.isfile( self.aggFile ) else ( {}, [], None )
+        parms["base.path"] = self.baseDir
+        listed = { relpath for ( start, size, relpath ) in records }
+        relpaths = [ relpath for relpath in self.listFiles() if relpath not in listed ]
+        scanned = self.scanFiles( relpaths )
+        self.logger.info( f"AggBuilder: scanned {len(scanned)} of {len(relpaths)} new files under {self.baseDir} ({len(records)} existing), time = {time.time()-t0} sec" )
+        if len( scanned ) == 0: return 0
+        if len( records ) and min( start for ( start, size, end ) in scanned.values() ) <= max( start for ( start, size, relpath ) in records ):
+            self.logger.warning( f"AggBuilder: new files of {self.aggFile} overlap or precede existing files, records are re-sorted" )
+        records = sorted( records + [ ( int( round( start ) ), size, relpath ) for relpath, ( start, size, end ) in scanned.items() ] )
+        lastNew = max( scanned.items(), key=lambda item: item[1][0] )
+        if tEnd is None or lastNew[1][2] > tEnd: tEnd = lastNew[1][2]
+        ntime = sum( size for ( start, size, relpath ) in records )
+        lines = self.header( os.path.join( self.baseDir, lastNew[0] ), parms, ntime, records[0][0], tEnd )
+        lines.extend( [ f"F; {start}; {size}; {relpath}\n" for ( start, size, relpath ) in records ] )
+        tmpFile = f"{self.aggFile}.{os.getpid()}.tmp"
+        with open( tmpFile, "w" ) as file: file.writelines( lines )
+        os.replace( tmpFile, self.aggFile )
+        self.logger.info( f"AggBuilder: wrote {self.aggFile}: {len(records)} files, {len(scanned)} added, time = {time.time()-t0} sec" )
+        return len( scanned )
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser( description="Build an EDAS aggregation (.ag1) file from the netCDF files under a directory" )
+    parser.add_argument( "aggFile" )
+    parser.add_argument( "baseDir" )
+    parser.add_argument( "-p", "--pattern", default="*.nc", help="file name or relative path pattern ( default: *.nc )" )
+    parser.add_argument( "-n", "--nprocs", type=int, default=8, help="number of scanning processes ( default: 8 )" )
+    parser.add_argument( "-i", "--incremental", action="store_true", help="only scan files not listed in the existing aggFile" )
+    args = parser.parse_args()
+    nAdded = AggBuilder( args.aggFile, args.baseDir, args.pattern, args.nprocs ).build( args.incremental )
+    print( f"Added {nAdded} files to {args.aggFile}" )
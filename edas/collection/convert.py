@@ -0,0 +1,151 @@
+import os, json, time, threading
+import numpy as np
+import xarray as xr
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+from edas.collection.agg import Collection, Aggregation
+from edas.collection.virtual import VirtualDataset
+from edas.data.chunks import ChunkPlanner
+from edas.util.logging import EDASLogger
+
+class ZarrConverter:
+    # Converts an aggregation to a chunked, compressed Zarr store with consolidated metadata.  The store is created with the
+    # full layout (and all non time-dependent variables) first; the time-dependent variables are then written in blocks of
+    # whole time chunks, several blocks at a time.  Completed blocks are recorded in a progress file next to the store, so
+    # an interrupted conversion resumes with the blocks that haven't been written.  The progress file is removed once the
+    # conversion completes, so a store with no progress file is complete (see isComplete).
+    # Chunks default to those planned for the full variable shape (see edas.data.chunks) with no reduction dims.
+
+    ProgressSuffix = ".progress"
+    ZarrFormat = 2          # numcodecs compressors are native to the v2 format, which both zarr 2 and zarr 3 read and write
+
+    def __init__(self, agg: Aggregation, storePath: str, chunks: Dict[str,int] = None, compressor = None, blockChunks: int = 4, nParallel: int = 4 ):
+        self.logger = EDASLogger.getLogger()
+        self.agg = agg
+        self.storePath = storePath
+        self.chunks = chunks
+        self.compressor = compressor      # e.g. numcodecs.Blosc( cname="zstd", clevel=5 ), None uses zarr's default compression.
+        self.blockChunks = max( blockChunks, 1 )
+        self.nParallel = max( nParallel, 1 )
+        self._lock = threading.Lock()
+
+    @classmethod
+    def getStorePath( cls, zarrDir: str, aggId: str ) -> str:
+        return os.path.join( os.path.expanduser( zarrDir ), aggId + ".zarr" )
+
+    @classmethod
+    def isComplete( cls, storePath: str ) -> bool:
+        # The progress file is written before the store is created, so a store without one is complete.
+        return os.path.isdir( storePath ) and not os.path.exists( storePath + cls.ProgressSuffix )
+
+    @classmethod
+    def getStore( cls, collection: Collection, aggId: str ) -> Optional[str]:
+        # Path of the completed Zarr store converted from an aggregation of the collection, if any ( see the 'zarr.dir' parm ).
+        zarrDir = collection.getParm( "zarr.dir" )
+        if not zarrDir: return None
+        storePath = cls.getStorePath( zarrDir, aggId )
+        return storePath if cls.isComplete( storePath ) else None
+
+    @classmethod
+    def convertCollection( cls, collectionName: str, zarrDir: str, **kwargs ) -> List[str]:
+        collection = Collection.new( collectionName )
+        storePaths = []
+        for aggId in sorted( set( collection.aggs.values() ) ):
+            storePath = cls.getStorePath( zarrDir, aggId )
+            cls( collection.getAggregation( aggId ), storePath, **kwargs ).convert()
+            storePaths.append( storePath )
+        return storePaths
+
+    def openSource( self, chunks: Dict[str,int] ) -> xr.Dataset:
+        varNames = list( self.agg.vars.keys() )
+        try:
+            return VirtualDataset( self.agg ).open( varNames, chunks=chunks )
+        except VirtualDataset.Incomplete as err:
+            self.logger.info( f"Can't open virtual dataset for aggregation {self.agg.spec}, using open_mfdataset: {err}" )
+            return xr.open_mfdataset( self.agg.pathList(), engine='netcdf4', data_vars=varNames, parallel=True, chunks=chunks )
+
+    @property
+    def timeDim(self) -> str:
+        axis = self.agg.getAxis("T")
+        return "time" if axis is None else axis.name
+
+    def planChunks(self) -> Dict[str,int]:
+        # Planned from the catalog shapes, so the source is opened with (file-aligned) read chunks matching the store chunks.
+        shapes = [ dict( zip( varRec.dims, varRec.shape ) ) for varRec in self.agg.vars.values() ]
+        shape = max( shapes, key=lambda shape: np.prod( list( shape.values() ) ) )
+        if self.chunks: return { dim: min( size, shape[dim] ) for dim, size in self.chunks.items() if dim in shape }
+        return ChunkPlanner( shape, np.float32, [], self.timeDim ).plan()
+
+    def getBlocks(self, ntime: int, timeChunk: int ) -> List[Tuple[int,int]]:
+        blockSize = timeChunk * self.blockChunks
+        return [ ( i0, min( i0 + blockSize, ntime ) ) for i0 in range( 0, ntime, blockSize ) ]
+
+    def readProgress(self) -> Optional[Dict[str,Any]]:
+        try:
+            with open( self.storePath + self.ProgressSuffix ) as file: return json.load( file )
+        except ( OSError, ValueError ): return None
+
+    def writeProgress( self, progress: Dict[str,Any] ):
+        tmpFile = self.storePath + self.ProgressSuffix + ".tmp"
+        with open( tmpFile, "w" ) as file: json.dump( progress, file )
+        os.replace( tmpFile, self.storePath + self.ProgressSuffix )
+
+    def convert(self) -> str:
+        t0 = time.time()
+        if self.isComplete( self.storePath ):
+            self.logger.info( f"ZarrConverter: store {self.storePath} is complete, skipping" )
+            return self.storePath
+        tname = self.timeDim
+        chunks = self.planChunks()
+        dset = self.openSource( chunks ).chunk( chunks )
+        for var in dset.variables.values(): var.encoding = {}
+        ntime = dset.sizes[tname]
+        blocks = self.getBlocks( ntime, chunks.get( tname, ntime ) )
+        signature = dict( source=self.agg.spec, ntime=ntime, chunks=chunks )
+        progress = self.readProgress()
+        if progress is None or progress.get( "signature" ) != signature or not progress.get( "initialized" ):
+            if progress is not None: self.logger.info( f"ZarrConverter: restarting conversion of {self.agg.spec}, previous progress = {progress.get('signature')}" )
+            progress = dict( signature=signature, initialized=False, blocks=[] )
+            self.writeProgress( progress )
+            self.initializeStore( dset, tname )
+            progress["initialized"] = True
+            self.writeProgress( progress )
+        done = { tuple( block ) for block in progress["blocks"] }
+        todo = [ block for block in blocks if block not in done ]
+        self.logger.info( f"ZarrConverter: converting {self.agg.spec} -> {self.storePath}, chunks = {chunks}, {len(todo)} of {len(blocks)} blocks to write" )
+        timeVars = [ name for name, var in dset.data_vars.items() if tname in var.dims ]
+        with ThreadPoolExecutor( max_workers=self.nParallel ) as executor:
+            for future in [ executor.submit( self.writeBlock, dset, timeVars, tname, block, progress ) for block in todo ]: future.result()
+        import zarr
+        zarr.consolidate_metadata( self.storePath )
+        os.remove( self.storePath + self.ProgressSuffix )
+        self.logger.info( f"ZarrConverter: completed {self.storePath}, time = {time.time()-t0} sec" )
+        return self.storePath
+
+    def compressorEncoding( self ) -> Dict[str,Any]:
+        # zarr 2 takes a single 'compressor'; zarr 3 takes a 'compressors' tuple, also for format 2 stores.
+        import zarr
+        if int( zarr.__version__.split(".")[0] ) < 3: return dict( compressor=self.compressor )
+        return dict( compressors=( self.compressor, ) )
+
+    def initializeStore( self, dset: xr.Dataset, tname: str ):
+        # Writes the metadata, the coordinates and the non time-dependent variables; time-dependent data is written by writeBlock.
+        for name, var in dset.variables.items():
+            if tname not in var.dims: var.load()
+        encoding = { name: self.compressorEncoding() for name in dset.data_vars } if self.compressor is not None else None
+        dset.to_zarr( self.storePath, mode="w", compute=False, consolidated=True, encoding=encoding, zarr_format=self.ZarrFormat )
+
+    def writeBlock( self, dset: xr.Dataset, timeVars: List[str], tname: str, block: Tuple[int,int], progress: Dict[str,Any] ):
+        t0 = time.time()
+        region = { tname: slice( *block ) }
+        subset = dset[timeVars].isel( region )
+        subset.drop_vars( list( subset.coords ) ).to_zarr( self.storePath, region=region, zarr_format=self.ZarrFormat )
+        with self._lock:
+            progress["blocks"].append( list( block ) )
+            self.writeProgress( progress )
+        self.logger.info( f"ZarrConverter: wrote block {block} of {self.storePath}, time = {time.time()-t0} sec" )
+
+if __name__ == "__main__":
+    import sys
+    assert len( sys.argv ) == 3, "Usage: python -m edas.collection.convert <collection> <zarrDir>"
+    for storePath in ZarrConverter.convertCollection( sys.argv[1], sys.argv[2] ): print( f"Converted: {storePath}" )
@@ -0,0 +1,176 @@
+import os, time
+import numpy as np
+import pandas as pd
+import xarray as xr
+from typing import Dict, Optional, Union, Tuple
+from datetime import datetime, timezone
+from edas.collection.agg import Aggregation, CatalogCacheMgr
+from edas.collection.index import AggIndex
+from edas.collection.virtual import VirtualDataset
+from edas.data.handles import HandlePoolMgr, PooledNetCDF4Backend
+from edas.util.logging import EDASLogger
+
+class CoordWindow:
+    # Coordinate values (keyed by EDAS axis name: 't','x','y','z') of a dataset opened from an aggregation, taken from its
+    # CoordIndex.  Domain cropping and value -> index conversion run against these arrays, with xarray 'sel' semantics,
+    # instead of the dataset's coordinates.  Time values are int64 minutes since 1970-01-01 UTC.
+
+    TimeTolerance = 1    # minutes
+
+    def __init__(self, coords: Dict[str,np.ndarray] ):
+        self.coords = coords
+        self._indices: Dict[str,pd.Index] = {}
+
+    def has(self, axis: str ) -> bool:
+        return axis in self.coords
+
+    def values(self, axis: str ) -> np.ndarray:
+        values = self.coords[axis]
+        return ( values * 60000000000 ).astype( "datetime64[ns]" ) if axis == "t" else values
+
+    def index(self, axis: str ) -> pd.Index:
+        index = self._indices.get( axis )
+        if index is None:
+            index = self._indices[axis] = pd.Index( self.values( axis ) )
+        return index
+
+    def indexer(self, axis: str, label: Union[slice,int,float,str] ) -> Union[slice,int]:
+        # Index slice for a value slice, or the index of the point nearest to a value, as xarray's sel would select them.
+        index = self.index( axis )
+        if isinstance( label, slice ): return index.slice_indexer( label.start, label.stop, label.step )
+        if axis == "t": label = pd.Timestamp( label )
+        return int( index.get_indexer( [ label ], method="nearest" )[0] )
+
+    def isel(self, indexers: Dict[str,Union[slice,int]] ) -> "CoordWindow":
+        # Window of the result of an isel with these indexers; point selections drop the axis.
+        coords = {}
+        for axis, values in self.coords.items():
+            sel = indexers.get( axis, slice(None) )
+            if isinstance( sel, slice ): coords[axis] = values[ sel ]
+        return CoordWindow( coords )
+
+    def fits(self, xarray: xr.DataArray ) -> bool:
+        # Checks that the window has the shape of an array opened with the same file range, region and time slice ( the
+        # coordinate values themselves are checked against the files once per aggregation, see CoordLookup.checkTime ).
+        return all( xarray.sizes[axis] == values.size for axis, values in self.coords.items() if axis in xarray.dims )
+
+class CoordIndex:
+    # Persistent per-aggregation coordinate index: the time value of every time step (int64 minutes, derived from the 'F;'
+    # records, see VirtualDataset.timeCoord), the first time step of each file, and the lat/lon/lev values read from the
+    # first file (or synthesized from the 'A;' records if it can't be read).  Stored next to the compiled AggIndex and
+    # rebuilt when the .ag1 file changes.  window() returns the coordinates of a dataset opened from a range of files.
+
+    VERSION = 1
+
+    def __init__(self, spec: str, time: np.ndarray, fileSteps: np.ndarray, axes: Dict[str,np.ndarray] ):
+        self.spec = spec
+        self.time = time
+        self.fileSteps = fileSteps
+        self.axes = axes
+
+    @classmethod
+    def path(cls, spec: str ) -> str:
+        return AggIndex.indexBase( spec ) + ".coords.npz"
+
+    @classmethod
+    def load(cls, agg: Aggregation ) -> "CoordIndex":
+        index = cls.open( agg.spec )
+        return index if index is not None else cls.build( agg )
+
+    @classmethod
+    def open(cls, spec: str ) -> Optional["CoordIndex"]:
+        try:
+            with np.load( cls.path( spec ) ) as data:
+                stamp = AggIndex.sourceStamp( spec )
+                if int( data["version"] ) != cls.VERSION or data["source"].tolist() != [ stamp["mtime"], stamp["size"] ]: return None
+                axes = { key[5:]: data[key] for key in data.files if key.startswith("axis_") }
+                return CoordIndex( spec, data["time"], data["fileSteps"], axes )
+        except FileNotFoundError:
+            return None
+        except Exception as err:
+            EDASLogger.getLogger().warning( f"Discarding unreadable coordinate index for {spec}: {err}" )
+            return None
+
+    @classmethod
+    def build(cls, agg: Aggregation ) -> "CoordIndex":
+        logger = EDASLogger.getLogger()
+        t0 = time.time()
+        assert agg.index is not None, f"Aggregation {agg.spec} has no file index"
+        stamp = AggIndex.sourceStamp( agg.spec )
+        vds = VirtualDataset( agg )
+        minutes = np.round( vds.timeCoord( 0, len(agg.index) ).astype( np.int64 ) / 60.0e9 ).astype( np.int64 )
+        fileSteps = np.concatenate( [ [0], np.cumsum( agg.index.sizes ) ] ).astype( np.int64 )
+        axes: Dict[str,np.ndarray] = {}
+        spatialAxes = [ axis for axis in agg.axes.values() if axis.type in [ "X", "Y", "Z" ] ]
+        try:
+            with HandlePoolMgr.open( agg.pathRange( 0, 1 )[0] ) as ds, HandlePoolMgr.readLock:
+                for axis in spatialAxes: axes[ axis.type.lower() ] = np.asarray( ds.variables[axis.name][:], dtype=np.float64 )
+        except Exception as err:
+            logger.warning( f"Can't read coordinates from the first file of {agg.spec}, using catalog axis bounds: {err}" )
+            for axis in spatialAxes: axes[ axis.type.lower() ] = np.linspace( axis.bounds[0], axis.bounds[1], axis.length )
+        path = cls.path( agg.spec )
+        tmp = f"{path[:-4]}.{os.getpid()}.tmp.npz"
+        np.savez( tmp, version=cls.VERSION, source=np.array( [ stamp["mtime"], stamp["size"] ], dtype=np.int64 ), time=minutes, fileSteps=fileSteps,
+                  **{ "axis_" + key: values for key, values in axes.items() } )
+        os.replace( tmp, path )
+        logger.info( f"Built coordinate index for {agg.spec}: {minutes.size} time steps, axes = { {key: values.size for key, values in axes.items()} }, time = {time.time()-t0} sec" )
+        return CoordIndex( agg.spec, minutes, fileSteps, axes )
+
+    def window(self, iStart: int = 0, iEnd: Optional[int] = None, region: Dict[str,slice] = None ) -> CoordWindow:
+        # Coordinates of files [iStart,iEnd) with the spatial region (axis name -> index slice, see VirtualDataset.getRegion) applied.
+        iEnd = self.fileSteps.size - 1 if iEnd is None else iEnd
+        coords = { "t": self.time[ self.fileSteps[iStart]: self.fileSteps[iEnd] ] }
+        for axis, values in self.axes.items(): coords[axis] = values[ ( region or {} ).get( axis, slice(None) ) ]
+        return CoordWindow( coords )
+
+class CoordLookup:
+    # Process-wide lookup service for aggregation coordinate indices, cached (with mtime invalidation) in the catalog cache.
+
+    def __init__(self):
+        self.logger = EDASLogger.getLogger()
+
+    def get(self, agg: Aggregation ) -> Optional[CoordIndex]:
+        if agg.index is None: return None
+        try: return CatalogCacheMgr.get( agg.spec + "#coords", agg.spec, lambda: CoordIndex.load( agg ) )
+        except Exception as err:
+            self.logger.warning( f"No coordinate index for aggregation {agg.spec}: {err}" )
+            return None
+
+    def window(self, agg: Aggregation, iStart: int = 0, iEnd: Optional[int] = None, region: Dict[str,slice] = None ) -> Optional[CoordWindow]:
+        # Region slices are keyed by the aggregation's axis names; windows are keyed by EDAS axis name.
+        index = self.get( agg )
+        if index is None: return None
+        axisRegion = { axis.type.lower(): region[axis.name] for axis in agg.axes.values() if region and axis.name in region }
+        return index.window( iStart, iEnd, axisRegion )
+
+    def select(self, agg: Aggregation, iStart: int = 0, iEnd: Optional[int] = None, start: Optional[datetime] = None, end: Optional[datetime] = None, region: Dict[str,slice] = None ) -> Tuple[Optional[slice],Optional[CoordWindow]]:
+        # Index slice of the time steps of files [iStart,iEnd) within [start,end] ( as xarray's sel would select them ), to be
+        # applied to the dataset as it is opened, and the window of the selected data.  No slice if start is None, if the
+        # selection is empty, or if the catalog times don't match the files.
+        window = self.window( agg, iStart, iEnd, region )
+        if window is None or start is None or not window.has( "t" ) or not self.checkTime( agg ): return None, window
+        bounds = [ pd.Timestamp( date.astimezone( timezone.utc ).replace( tzinfo=None ) if date.tzinfo else date ) for date in ( start, end ) ]
+        tslice = window.indexer( "t", slice( *bounds ) )
+        if tslice.stop <= tslice.start: return None, window
+        return tslice, window.isel( { "t": tslice } )
+
+    def checkTime(self, agg: Aggregation ) -> bool:
+        # The catalog time steps must match the first file's decoded time coordinate before time slices computed from them are
+        # applied to the files ( checked once per aggregation object, i.e. per catalog version, as VirtualDataset.checkFileCoord ).
+        tAxis = agg.getAxis("T")
+        if tAxis is None: return False
+        matches = agg.coordChecks.get( tAxis.name )
+        if matches is None:
+            index = self.get( agg )
+            try:
+                with xr.open_dataset( VirtualDataset( agg ).firstPath(), engine=PooledNetCDF4Backend ) as ds: values = ds[tAxis.name].values
+                minutes = values.astype( "datetime64[ns]" ).astype( np.int64 ) / 60.0e9
+                expected = index.time[ index.fileSteps[0]: index.fileSteps[1] ]
+                matches = minutes.shape == expected.shape and bool( np.all( np.abs( minutes - expected ) <= CoordWindow.TimeTolerance ) )
+            except Exception as err:
+                self.logger.info( f"Can't check the catalog times of aggregation {agg.spec} against its files: {err}" )
+                matches = False
+            agg.coordChecks[ tAxis.name ] = matches
+        return matches
+
+CoordLookupMgr = CoordLookup()
@@ -0,0 +1,122 @@
+import os, json, hashlib, time
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple, Iterator
+from edas.config import EdasEnv
+from edas.util.logging import EDASLogger
+
+class AggIndex:
+    # Compiled binary form of the 'F;' records of an aggregation (.ag1) file.  The file records are stored as a numpy
+    # structured array (start minutes, timestep count, path offset/length) plus a byte blob of relative paths, both
+    # memory-mapped on load.  The (few) header records (P;, A;, C;, V;) are kept as text in the json metadata file.
+
+    VERSION = 1
+    RecordType = np.dtype( [ ("start", "<i8"), ("size", "<i8"), ("offset", "<i8"), ("length", "<i4") ] )
+
+    def __init__(self, spec: str, records: np.ndarray, paths: np.ndarray, header: List[str] ):
+        self.spec = spec
+        self.records = records
+        self.paths = paths
+        self.header = header
+
+    @classmethod
+    def indexDir(cls) -> str:
+        path = os.path.expanduser( EdasEnv.get( "agg.index.dir", os.path.join( EdasEnv.TRANSIENTS_DIR, "aggindex" ) ) )
+        os.makedirs( path, mode=0o777, exist_ok=True )
+        return path
+
+    @classmethod
+    def indexBase(cls, spec: str ) -> str:
+        spec_path = os.path.abspath( spec )
+        tag = hashlib.md5( spec_path.encode() ).hexdigest()[0:8]
+        return os.path.join( cls.indexDir(), os.path.splitext( os.path.basename(spec_path) )[0] + "-" + tag )
+
+    @classmethod
+    def sourceStamp(cls, spec: str ) -> Dict[str,int]:
+        stat = os.stat( spec )
+        return dict( mtime=stat.st_mtime_ns, size=stat.st_size )
+
+    @classmethod
+    def load(cls, spec: str ) -> "AggIndex":
+        index = cls.open( spec )
+        return index if index is not None else cls.build( spec )
+
+    @classmethod
+    def open(cls, spec: str ) -> Optional["AggIndex"]:
+        base = cls.indexBase( spec )
+        try:
+            with open( base + ".meta.json", "r" ) as mfile: meta = json.load( mfile )
+            if meta.get("version") != cls.VERSION or meta.get("source") != cls.sourceStamp( spec ): return None
+            records = np.load( base + ".idx.npy", mmap_mode="r" )
+            paths = np.memmap( base + ".paths", dtype=np.uint8, mode="r" ) if meta["nbytes"] > 0 else np.zeros( [0], np.uint8 )
+            return AggIndex( spec, records, paths, meta["header"] )
+        except FileNotFoundError:
+            return None
+        except Exception as err:
+            EDASLogger.getLogger().warning( f"Discarding unreadable aggregation index {base}: {err}" )
+            return None
+
+    @classmethod
+    def parseFileRecords(cls, spec: str ) -> Tuple[ List[str], Dict[str,Tuple[int,int,bytes]] ]:
+        header: List[str] = []
+        files: Dict[str,Tuple[int,int,bytes]] = {}
+        with open( spec, "r" ) as file:
+            for line in file:
+                if len(line) < 2 or line[1] != ";": continue
+                if line[0] == 'F':
+                    value = line[2:].split(";")
+                    key = value[0].strip()
+                    files[key] = ( int( round( float(key) ) ), int( value[1].strip() ), value[2].strip().encode() )
+                else:
+                    header.append( line )
+        return header, files
+
+    @classmethod
+    def build(cls, spec: str ) -> "AggIndex":
+        logger = EDASLogger.getLogger()
+        assert os.path.isfile( spec ), "Unknown Aggregation: " + os.path.basename( spec )
+        t0 = time.time()
+        stamp = cls.sourceStamp( spec )
+        header, files = cls.parseFileRecords( spec )
+        entries = sorted( files.values(), key=lambda f: f[0] )
+        records = np.zeros( [ len(entries) ], dtype=cls.RecordType )
+        lengths = np.array( [ len(f[2]) for f in entries ], dtype=np.int64 )
+        records["start"] = [ f[0] for f in entries ]
+        records["size"] = [ f[1] for f in entries ]
+        records["offset"] = np.cumsum( lengths ) - lengths
+        records["length"] = lengths
+        paths = np.frombuffer( b"".join( [ f[2] for f in entries ] ), dtype=np.uint8 )
+
+        base = cls.indexBase( spec )
+        tmp = f"{base}.{os.getpid()}.tmp"
+        np.save( tmp + ".idx.npy", records )
+        paths.tofile( tmp + ".paths" )
+        with open( tmp + ".meta.json", "w" ) as mfile:
+            json.dump( dict( version=cls.VERSION, source=stamp, nfiles=int(records.size), nbytes=int(paths.size), header=header ), mfile )
+        for ext in [ ".idx.npy", ".paths", ".meta.json" ]: os.replace( tmp + ext, base + ext )
+        logger.info( f"Built aggregation index for {spec}: {records.size} files, time = {time.time()-t0} sec" )
+        return cls.open( spec ) or AggIndex( spec, records, paths, header )
+
+    def __len__(self) -> int: return self.records.size
+
+    @property
+    def starts(self) -> np.ndarray: return self.records["start"]
+
+    @property
+    def sizes(self) -> np.ndarray: return self.records["size"]
+
+    def relpath(self, iFile: int ) -> str:
+        rec = self.records[iFile]
+        offset = int(rec["offset"])
+        return self.paths[ offset: offset + int(rec["length"]) ].tobytes().decode()
+
+    def relpaths(self, start: int = 0, end: Optional[int] = None ) -> List[str]:
+        records = self.records[ start: end ]
+        if records.size == 0: return []
+        offsets, lengths = records["offset"], records["length"]
+        blob = self.paths[ int(offsets[0]): int(offsets[-1] + lengths[-1]) ].tobytes()
+        base = int(offsets[0])
+        return [ blob[ o-base: o-base+l ].decode() for o, l in zip( offsets.tolist(), lengths.tolist() ) ]
+
+    def iterRecords(self, start: int = 0, end: Optional[int] = None ) -> Iterator[Tuple[int,int,str]]:
+        records = self.records[ start: end ]
+        return zip( records["start"].tolist(), records["size"].tolist(), self.relpaths( start, end ) )
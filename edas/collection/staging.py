@@ -0,0 +1,176 @@
+import os, time, shutil, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Set, Tuple, Any
+from edas.config import EdasEnv
+from edas.portal.parsers import SizeParser
+from edas.util.logging import EDASLogger
+
+class StagingCache:
+    # Read-through staging of collection files (typically on shared NFS) to a local directory ('staging.dir').  Paths passed
+    # to stage() are redirected to their local copies once staged, and the remaining files are copied in the background.
+    # Staged files mirror the source path under the staging dir and keep the source mtime, so a staged copy is stale (and
+    # re-staged) whenever the source file changes.  An LRU bounded by 'staging.quota' bytes evicts staged files, except those
+    # pinned by a running request ( see stage/release ), and stage() queues no more copies than fit in the quota.
+    # Paths are only redirected where the workers can read the staged copies: when the staging dir is shared by the server
+    # and the workers ('staging.shared'), or when the scheduler is local ( no 'scheduler.address' ).  Otherwise staging is off.
+
+    PartSuffix = ".part"
+
+    def __init__( self, stagingDir: Optional[str], quota: int, nThreads: int = 2, shared: bool = False ):
+        self.logger = EDASLogger.getLogger()
+        self.stagingDir = stagingDir
+        self.quota = quota
+        self.shared = shared
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[str,List[float]]" = OrderedDict()    # source path -> [ size, last use ]
+        self._pending: Dict[str,int] = {}                                 # source path -> size, queued or being copied
+        self.pins: Dict[str,Set[str]] = {}      # source path -> owners ( request ids )
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytesSaved = 0
+        self.evictions = 0
+        if self.enabled:
+            self._executor = ThreadPoolExecutor( max_workers=max( nThreads, 1 ) )
+            self._scan()
+
+    @property
+    def enabled(self) -> bool:
+        return bool( self.stagingDir )
+
+    @property
+    def redirects(self) -> bool:
+        # Staged copies are only visible to the workers if the staging dir is shared or the workers run on this host.
+        return self.shared or EdasEnv.get( "scheduler.address", None ) is None
+
+    def localPath( self, path: str ) -> str:
+        return os.path.join( self.stagingDir, os.path.abspath( path ).lstrip( os.sep ) )
+
+    def _scan(self):
+        # Rebuilds the LRU from the files already in the staging dir, oldest access first.
+        os.makedirs( self.stagingDir, exist_ok=True )
+        staged = []
+        for root, dirs, files in os.walk( self.stagingDir ):
+            for file in files:
+                local = os.path.join( root, file )
+                if file.endswith( self.PartSuffix ): os.remove( local )
+                else:
+                    st = os.stat( local )
+                    staged.append( ( st.st_atime, os.sep + os.path.relpath( local, self.stagingDir ), st.st_size ) )
+        with self._lock:
+            for atime, path, size in sorted( staged ):
+                self._entries[path] = [ size, 0.0 ]
+                self.nbytes += size
+        self.logger.info( f"StagingCache: found {len(staged)} staged files ({self.nbytes} bytes) in {self.stagingDir}" )
+
+    def isStaged( self, path: str ) -> bool:
+        return self.fileStatus( path )[1]
+
+    def fileStatus( self, path: str ) -> Tuple[Optional[int],bool]:
+        # The size of the source file ( None if it can't be read ), and whether its staged copy is current.
+        try: source = os.stat( path )
+        except OSError: return None, False
+        try: return source.st_size, os.stat( self.localPath( path ) ).st_mtime_ns == source.st_mtime_ns
+        except OSError: return source.st_size, False
+
+    @property
+    def pendingBytes(self) -> int:
+        return sum( self._pending.values() )
+
+    def stage( self, paths: List[str], owner: Optional[str] = None ) -> List[str]:
+        # Returns the paths redirected to their staged copies where available ( pinned for owner, if given, until released ),
+        # and queues the others for staging.
+        if not self.enabled: return paths
+        if not self.redirects:
+            self.logger.info( f"StagingCache: not staging, {self.stagingDir} isn't shared with the workers of scheduler {EdasEnv.get( 'scheduler.address', None )} ( see staging.shared )" )
+            return paths
+        t0 = time.time()
+        result, hits, misses, saved, skipped = [], 0, 0, 0, 0
+        status = [ self.fileStatus( path ) for path in paths ]
+        with self._lock:
+            now, pendingBytes = time.time(), self.pendingBytes
+            for path, ( size, staged ) in zip( paths, status ):
+                entry = self._entries.get( path )
+                if entry is not None and path not in self._pending and staged:
+                    entry[1] = now
+                    self._entries.move_to_end( path )
+                    if owner is not None: self.pins.setdefault( path, set() ).add( owner )
+                    result.append( self.localPath( path ) )
+                    hits, saved = hits + 1, saved + int( entry[0] )
+                else:
+                    result.append( path )
+                    misses = misses + 1
+                    if path in self._pending or size is None: continue
+                    if pendingBytes + size > self.quota:
+                        skipped = skipped + 1
+                        continue
+                    self._pending[path] = size
+                    pendingBytes += size
+                    self._executor.submit( self._copy, path )
+            self.hits, self.misses, self.bytesSaved = self.hits + hits, self.misses + misses, self.bytesSaved + saved
+        if skipped: self.logger.info( f"StagingCache: {skipped} files not staged, {pendingBytes} bytes already pending for quota {self.quota}" )
+        self.logger.info( f"StagingCache: {hits} hits, {misses} misses, {saved} bytes read from staging, {len(self._pending)} files pending, time = {time.time()-t0} sec" )
+        return result
+
+    def _copy( self, path: str ):
+        local = self.localPath( path )
+        try:
+            os.makedirs( os.path.dirname( local ), exist_ok=True )
+            shutil.copy2( path, local + self.PartSuffix )
+            os.replace( local + self.PartSuffix, local )
+            size = os.stat( local ).st_size
+            with self._lock:
+                entry = self._entries.pop( path, None )
+                if entry is not None: self.nbytes -= int( entry[0] )
+                self._entries[path] = [ size, time.time() ]
+                self.nbytes += size
+                self._evict()
+        except Exception as err:
+            self.logger.error( f"StagingCache: error staging {path}: {err}" )
+            if os.path.exists( local + self.PartSuffix ): os.remove( local + self.PartSuffix )
+        finally:
+            with self._lock: self._pending.pop( path, None )
+
+    def _evict(self):
+        # Evicts least recently used files down to the quota; only files pinned by running requests are kept.
+        for path in list( self._entries.keys() ):
+            if self.nbytes <= self.quota: return
+            if path in self.pins: continue
+            self._remove( path )
+            self.evictions += 1
+        if self.nbytes > self.quota: self.logger.warning( f"StagingCache: {self.nbytes} bytes staged exceeds quota {self.quota}, all remaining files are pinned" )
+
+    def release( self, owner: str ):
+        # Unpins all staged files used by owner.
+        with self._lock:
+            for path in list( self.pins.keys() ):
+                self.pins[path].discard( owner )
+                if not self.pins[path]: del self.pins[path]
+
+    def _remove( self, path: str ):
+        size, lastUse = self._entries.pop( path )
+        self.nbytes -= int( size )
+        try: os.remove( self.localPath( path ) )
+        except OSError as err: self.logger.warning( f"StagingCache: error removing staged copy of {path}: {err}" )
+
+    def clear(self):
+        with self._lock:
+            for path in list( self._entries.keys() ):
+                if path not in self._pending and path not in self.pins: self._remove( path )
+
+    def wait(self):
+        # Blocks until all queued copies have completed.
+        while True:
+            with self._lock:
+                if not self._pending: return
+            time.sleep( 0.05 )
+
+    def stats(self) -> Dict[str,Any]:
+        requests = self.hits + self.misses
+        return dict( stagingDir=self.stagingDir, files=len(self._entries), nbytes=self.nbytes, quota=self.quota, pending=len(self._pending), pinned=len(self.pins), hits=self.hits,
+                     misses=self.misses, bytesSaved=self.bytesSaved, evictions=self.evictions, hitRate=( self.hits / requests if requests else 0.0 ) )
+
+StagingCacheMgr = StagingCache( EdasEnv.get( "staging.dir", None ), SizeParser.parse( EdasEnv.get( "staging.quota", "100G" ) ),
+                                int( EdasEnv.get( "staging.threads", 2 ) ), EdasEnv.getBool( "staging.shared", False ) )
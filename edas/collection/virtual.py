@@ -0,0 +1,217 @@
+import time
+import numpy as np
+import xarray as xr
+import dask
+import dask.array as da
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from edas.collection.agg import Aggregation, Axis as AggAxis, VarRec
+from edas.process.domain import Domain, Axis
+from edas.data.chunks import ChunkPlanner
+from edas.data.handles import HandlePoolMgr
+from edas.collection.staging import StagingCacheMgr
+from edas.util.logging import EDASLogger
+
+def readFileVariable( path: str, varName: str, dtype: np.dtype, hyperslab: Tuple[slice,...] ) -> np.ndarray:
+    with HandlePoolMgr.open( path ) as ds, HandlePoolMgr.readLock:
+        data = ds.variables[varName][ hyperslab ]
+    if np.ma.isMaskedArray( data ): return data.astype( dtype ).filled( np.nan )
+    return np.asarray( data, dtype=dtype )
+
+def readFilesVariable( paths: List[str], varName: str, dtype: np.dtype, hyperslab: Tuple[slice,...] ) -> np.ndarray:
+    if len( paths ) == 1: return readFileVariable( paths[0], varName, dtype, hyperslab )
+    fileslab = ( slice(None), ) + tuple( hyperslab[1:] )
+    return np.concatenate( [ readFileVariable( path, varName, dtype, fileslab ) for path in paths ], axis=0 )
+
+def splitSlice( islice: slice, chunkSize: Optional[int] ) -> List[slice]:
+    if not chunkSize or chunkSize >= islice.stop - islice.start: return [ islice ]
+    return [ slice( i0, min( i0 + chunkSize, islice.stop ) ) for i0 in range( islice.start, islice.stop, chunkSize ) ]
+
+class VirtualDataset:
+    # Builds a lazy xarray Dataset for an aggregation directly from its catalog (.ag1 / compiled index), without opening the
+    # data files: each file becomes one dask chunk read via netCDF4 when computed, time coordinates are synthesized from the
+    # per-file start minutes and timestep counts, and spatial coordinates from the (regular) axis bounds in the 'A;' records.
+    # Only the first file is opened, to get dtype and attributes.  Raises VirtualDataset.Incomplete if the catalog can't
+    # describe the requested variables, in which case the caller should fall back to xr.open_mfdataset.
+    # A region (dim name -> index slice, see getRegion) restricts each file read to a hyperslab of the spatial axes, and
+    # chunks (dim name -> size, see edas.data.chunks) split each file's read into several hyperslab reads.  With alignFiles,
+    # time chunks longer than a file hold a whole number of consecutive files, read by a single task.
+
+    class Incomplete(Exception): pass
+
+    RegularityTolerance = 1.0e-3
+    ExcludedAttrs = [ "_FillValue", "missing_value", "scale_factor", "add_offset" ]
+
+    def __init__(self, agg: Aggregation ):
+        self.logger = EDASLogger.getLogger()
+        self.agg = agg
+        self.axes: Dict[str,AggAxis] = { axis.name: axis for axis in agg.axes.values() }
+
+    def getVarRec(self, varName: str ) -> VarRec:
+        varRec = self.agg.vars.get( varName )
+        if varRec is None: raise self.Incomplete( f"Variable {varName} not found in aggregation {self.agg.spec}" )
+        if len( varRec.dims ) == 0 or varRec.dims[0] != self.timeAxis.name:
+            raise self.Incomplete( f"Variable {varName} is not time-major: dims = {varRec.dims}" )
+        return varRec
+
+    @property
+    def timeAxis(self) -> AggAxis:
+        axis = self.agg.getAxis("T")
+        if axis is None: raise self.Incomplete( f"Aggregation {self.agg.spec} has no time axis" )
+        return axis
+
+    def timeCoord( self, iStart: int, iEnd: int ) -> np.ndarray:
+        starts, sizes = self.agg.index.starts, self.agg.index.sizes
+        nFiles = starts.size
+        if nFiles > 1:
+            steps = np.diff( starts ).astype( np.float64 ) / sizes[:-1]
+            steps = np.append( steps, steps[-1] )
+        else:
+            tAxis = self.timeAxis
+            steps = np.array( [ ( tAxis.bounds[1] - tAxis.bounds[0] ) / max( tAxis.length - 1, 1 ) ] )
+        offsets = [ starts[iFile] + steps[iFile] * np.arange( sizes[iFile] ) for iFile in range( iStart, iEnd ) ]
+        minutes = np.concatenate( offsets ) if len( offsets ) else np.zeros( [0] )
+        return ( np.round( minutes * 60.0e9 ).astype( np.int64 ) ).astype( "datetime64[ns]" )
+
+    def spatialCoord(self, dim: str, length: int, strict: bool = False ) -> xr.DataArray:
+        # Synthesized from the axis bounds, so only valid for regular axes; vertical axes (and all axes if strict) must have a catalog resolution to check against.
+        axis = self.axes.get( dim )
+        if axis is None: raise self.Incomplete( f"No axis record for dimension {dim}" )
+        if axis.length != length: raise self.Incomplete( f"Axis {dim} length {axis.length} doesn't match variable shape {length}" )
+        values = np.linspace( axis.bounds[0], axis.bounds[1], length )
+        resolution = next( ( varRec.resolution[dim] for varRec in self.agg.vars.values() if dim in varRec.resolution ), None )
+        if length > 1 and resolution is None and ( strict or axis.type == "Z" ):
+            raise self.Incomplete( f"Can't verify that axis {dim} is regular: no resolution in catalog" )
+        if length > 1 and resolution is not None:
+            step = abs( values[1] - values[0] )
+            if abs( step - abs(resolution) ) > self.RegularityTolerance * abs(resolution):
+                raise self.Incomplete( f"Axis {dim} is not regular: step {step} != resolution {resolution}" )
+        return xr.DataArray( values, dims=[dim], attrs=dict( units=axis.units, long_name=axis.long_name, axis=axis.type ) )
+
+    @staticmethod
+    def indexSlice( values: np.ndarray, minVal: float, maxVal: float, periodic: bool ) -> Optional[slice]:
+        # Index range covering [minVal,maxVal] on a monotonic axis, padded by one cell each side so that 'nearest' point
+        # selection and inclusive value slices applied later still see the same coordinates.  None means read the full axis.
+        size = values.size
+        lo, hi = min( minVal, maxVal ), max( minVal, maxVal )
+        vmin, vmax = min( values[0], values[-1] ), max( values[0], values[-1] )
+        if periodic:
+            while hi < vmin: lo, hi = lo + 360.0, hi + 360.0
+            while lo > vmax: lo, hi = lo - 360.0, hi - 360.0
+            if lo < vmin or hi > vmax: return None
+        ascending = values if values[0] <= values[-1] else values[::-1]
+        i0 = max( int( np.searchsorted( ascending, lo, side="left" ) ) - 1, 0 )
+        i1 = min( int( np.searchsorted( ascending, hi, side="right" ) ) + 1, size )
+        if values[0] > values[-1]: i0, i1 = size - i1, size - i0
+        if i1 <= i0 or i1 - i0 >= size: return None
+        return slice( i0, i1 )
+
+    def getRegion(self, domain: Optional[Domain] ) -> Dict[str,slice]:
+        # Resolves the value-system x/y/z bounds of a source domain to index slices on the catalog axes.  Index-system bounds
+        # are not pushed down, since they are applied relative to the full axis when the domain subset is applied after opening.
+        region: Dict[str,slice] = {}
+        if domain is None: return region
+        for bounds in domain.axisBounds.values():
+            if bounds.type not in [ Axis.X, Axis.Y, Axis.Z ] or not bounds.isValueType: continue
+            aggAxis = self.agg.getAxis( bounds.type.name )
+            if aggAxis is None: continue
+            try:
+                values = self.spatialCoord( aggAxis.name, aggAxis.length, True ).values
+                self.checkFileCoord( aggAxis.name, values )
+                islice = self.indexSlice( values, float(bounds.start), float(bounds.end), bounds.type == Axis.X )
+                if islice is not None: region[ aggAxis.name ] = islice
+            except ( self.Incomplete, TypeError, ValueError ) as err:
+                self.logger.info( f"Not pushing down domain bounds for axis {aggAxis.name}: {err}" )
+        return region
+
+    def checkFileCoord(self, dim: str, values: np.ndarray ):
+        # Raises Incomplete unless the synthesized coordinate matches the first file's coordinate variable ( checked once per
+        # aggregation object, i.e. per catalog version ), since index slices computed from it are applied to the files.
+        matches = self.agg.coordChecks.get( dim )
+        if matches is None:
+            with HandlePoolMgr.open( self.firstPath() ) as ds, HandlePoolMgr.readLock:
+                fileValues = np.asarray( ds.variables[dim][:], dtype=np.float64 ) if dim in ds.variables else None
+            tolerance = self.RegularityTolerance * ( abs( values[1] - values[0] ) if values.size > 1 else 1.0 )
+            matches = fileValues is not None and fileValues.shape == values.shape and bool( np.allclose( fileValues, values, rtol=0.0, atol=tolerance ) )
+            self.agg.coordChecks[dim] = matches
+        if not matches: raise self.Incomplete( f"Catalog coordinate {dim} doesn't match the coordinate in the aggregation's files" )
+
+    def regionChunks(self, region: Dict[str,slice] ) -> Dict[str,Tuple[int,...]]:
+        # Chunking that puts each region slice in a chunk of its own, so that a region subset of a per-file dask chunk doesn't read the full grid.
+        chunks: Dict[str,Tuple[int,...]] = {}
+        for dim, islice in region.items():
+            size = self.axes[dim].length
+            chunks[dim] = tuple( n for n in [ islice.start, islice.stop - islice.start, size - islice.stop ] if n > 0 )
+        return chunks
+
+    def firstPath(self) -> str:
+        paths = self.agg.pathRange( 0, 1 ) if self.agg.index is not None else [ file.getPath() for file in list( self.agg.fileList() )[:1] ]
+        if len( paths ) == 0: raise self.Incomplete( f"Aggregation {self.agg.spec} has no files" )
+        return paths[0]
+
+    def probe(self, varNames: List[str] ) -> Tuple[ Dict[str,np.dtype], Dict[str,Dict[str,Any]], Dict[str,Any] ]:
+        # Decoded dtypes and attributes of the variables, and the global attributes, from the first file.
+        dtypes, attrs = {}, {}
+        with HandlePoolMgr.open( self.firstPath() ) as ds, HandlePoolMgr.readLock:
+            for varName in varNames:
+                var = ds.variables[varName]
+                vattrs = { key: var.getncattr(key) for key in var.ncattrs() }
+                dtype = np.dtype( var.dtype )
+                if "scale_factor" in vattrs or "add_offset" in vattrs:
+                    dtype = np.result_type( dtype, np.asarray( vattrs.get( "scale_factor", vattrs.get( "add_offset" ) ) ).dtype )
+                if dtype.kind in "iu" and ( "_FillValue" in vattrs or "missing_value" in vattrs ):
+                    dtype = np.dtype( np.float32 if dtype.itemsize <= 2 else np.float64 )
+                dtypes[varName] = dtype
+                attrs[varName] = { key: value for key, value in vattrs.items() if key not in self.ExcludedAttrs }
+            global_attrs = { key: ds.getncattr(key) for key in ds.ncattrs() }
+        return dtypes, attrs, global_attrs
+
+    @classmethod
+    def blockGrid( cls, prefix: List[slice], splits: List[List[slice]], newBlock ) -> List:
+        # Nested list (for da.block) of the blocks covering the cartesian product of the per-dimension slice splits.
+        if len( splits ) == 0: return newBlock( tuple( prefix ), tuple( s.stop - s.start for s in prefix ) )
+        return [ cls.blockGrid( prefix + [ islice ], splits[1:], newBlock ) for islice in splits[0] ]
+
+    def getShape(self, varName: str, start: Optional[datetime] = None, end: Optional[datetime] = None, region: Dict[str,slice] = None ) -> Dict[str,int]:
+        varRec = self.getVarRec( varName )
+        region = region or {}
+        if self.agg.index is None: ntime = varRec.shape[0]
+        else:
+            iStart, iEnd = ( 0, len(self.agg.index) ) if start is None else self.agg.periodRange( start, end )
+            ntime = int( self.agg.index.sizes[ iStart: iEnd ].sum() )
+        shape = { varRec.dims[0]: ntime }
+        for dim, length in zip( varRec.dims[1:], varRec.shape[1:] ):
+            shape[dim] = len( range( *region[dim].indices( length ) ) ) if dim in region else length
+        return shape
+
+    def open(self, varNames: List[str], start: Optional[datetime] = None, end: Optional[datetime] = None, region: Dict[str,slice] = None, chunks: Dict[str,int] = None, alignFiles: bool = True, owner: Optional[str] = None ) -> xr.Dataset:
+        t0 = time.time()
+        region, chunks = region or {}, chunks or {}
+        if self.agg.index is None: raise self.Incomplete( f"Aggregation {self.agg.spec} has no file index" )
+        if len( self.agg.index ) == 0: raise self.Incomplete( f"Aggregation {self.agg.spec} has no files" )
+        iStart, iEnd = ( 0, len(self.agg.index) ) if start is None else self.agg.periodRange( start, end )
+        if iEnd <= iStart: raise self.Incomplete( f"No files found in aggregation {self.agg.spec} for date range {start} - {end}" )
+        varRecs = [ self.getVarRec( varName ) for varName in varNames ]
+        tname = self.timeAxis.name
+        coords = { tname: xr.DataArray( self.timeCoord( iStart, iEnd ), dims=[tname], attrs=dict( axis="T" ) ) }
+        for varRec in varRecs:
+            for dim, length in zip( varRec.dims[1:], varRec.shape[1:] ):
+                if dim not in coords: coords[dim] = self.spatialCoord( dim, length ).isel( { dim: region.get( dim, slice(None) ) } )
+        dtypes, attrs, global_attrs = self.probe( varNames )
+        paths = StagingCacheMgr.stage( self.agg.pathRange( iStart, iEnd ), owner )
+        sizes = self.agg.index.sizes[ iStart: iEnd ].tolist()
+        data_vars = {}
+        read = dask.delayed( readFilesVariable, pure=True )
+        groups = ChunkPlanner.fileGroups( sizes, chunks.get( tname ) ) if alignFiles else [ ( iFile, iFile+1 ) for iFile in range( len(paths) ) ]
+        for name, varRec in zip( varNames, varRecs ):
+            dtype = dtypes[name]
+            spatialSplits = [ splitSlice( slice( *region.get( dim, slice(None) ).indices( length ) ), chunks.get( dim ) ) for dim, length in zip( varRec.dims[1:], varRec.shape[1:] ) ]
+            blocks = []
+            for ( i0, i1 ) in groups:
+                groupPaths, groupSize = paths[i0:i1], sum( sizes[i0:i1] )
+                for tslice in ( [ slice( 0, groupSize ) ] if i1 - i0 > 1 else splitSlice( slice( 0, groupSize ), chunks.get( tname ) ) ):
+                    blocks.append( self.blockGrid( [ tslice ], spatialSplits, lambda hyperslab, shape: da.from_delayed( read( groupPaths, name, dtype, hyperslab ), shape, dtype=dtype ) ) )
+            data_vars[name] = xr.Variable( varRec.dims, da.block( blocks ), attrs[name] )
+        dset = xr.Dataset( data_vars, coords, global_attrs )
+        self.logger.info( f"Opened virtual dataset from {self.agg.spec}: vars={varNames}, NFILES={len(paths)}, region={region}, chunks={chunks}, shape={dict(dset.sizes)}, time = {time.time()-t0} sec" )
+        return dset
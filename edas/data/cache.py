@@ -1,37 +1,537 @@
+import os, json, time, shutil, hashlib, fnmatch, atexit
+import pandas as pd
+import xarray as xr
 from edas.workflow.data import EDASArray
-from typing import Dict
+from edas.process.domain import Domain, Axis
+from typing import Dict, Set, Any, List, Optional, Callable, Tuple
 from collections import OrderedDict
+from threading import RLock
+from concurrent.futures import ThreadPoolExecutor
 from edas.config import EdasEnv
 from edas.portal.parsers import SizeParser
+from edas.util.logging import EDASLogger
+
+class SpillCache:
+    # Second (disk) tier of the array cache: arrays evicted from memory are written to compressed Zarr stores (data and
+    # coordinates) under 'cache.spill.dir', bounded by 'cache.spill.size' bytes on disk with LRU eviction.  The index
+    # ( key -> store, name, domain, size, last access, region ) is saved as index.json, so spilled arrays survive server restarts.
+    # Spilled arrays are faulted back in lazily: get returns an EDASArray backed by the Zarr store.  Stores are written
+    # ( write ) without holding any lock, then indexed ( add ); unindexed stores ( see drop ) are deleted by discard, also
+    # without the lock.  The index is saved at most every SaveInterval seconds ( and at exit ), and stores left out of the
+    # saved index ( e.g. by a crash ) are deleted when it is loaded.
+
+    IndexFile = "index.json"
+    SaveInterval = 10.0    # seconds
+
+    def __init__(self, spillDir: Optional[str], maxSize: int ):
+        self.logger = EDASLogger.getLogger()
+        self.spillDir = os.path.expanduser( spillDir ) if spillDir else None
+        self.maxSize = maxSize
+        self.entries: Dict[str,Dict[str,Any]] = OrderedDict()
+        self.currentSize = 0
+        self.hits = 0
+        self.spills = 0
+        self.evictions = 0
+        self._lock = RLock()
+        self._saveLock = RLock()
+        self._saved = time.time()
+        self._dirty = False
+        if self.enabled:
+            self.load()
+            atexit.register( self.flush )
+
+    @property
+    def enabled(self) -> bool:
+        return bool( self.spillDir ) and self.maxSize > 0
+
+    def storePath( self, key: str ) -> str:
+        return os.path.join( self.spillDir, hashlib.md5( key.encode() ).hexdigest() + ".zarr" )
+
+    def load(self):
+        os.makedirs( self.spillDir, exist_ok=True )
+        try:
+            with open( os.path.join( self.spillDir, self.IndexFile ) ) as file: entries = json.load( file )
+        except FileNotFoundError: entries = {}
+        except ValueError as err:
+            self.logger.warning( f"Discarding unreadable spill cache index in {self.spillDir}: {err}" )
+            entries = {}
+        for key, entry in sorted( entries.items(), key=lambda item: item[1]["atime"] ):
+            if os.path.isdir( entry["path"] ):
+                self.entries[key] = entry
+                self.currentSize += entry["nbytes"]
+        indexed = { entry["path"] for entry in self.entries.values() }
+        for name in os.listdir( self.spillDir ):
+            path = os.path.join( self.spillDir, name )
+            if name.endswith( ".zarr" ) and path not in indexed: shutil.rmtree( path, ignore_errors=True )
+
+    def save(self):
+        # Writes a snapshot of the index, taken under the lock; the file is written without it.
+        with self._saveLock:
+            with self._lock:
+                entries = OrderedDict( ( key, dict( entry ) ) for key, entry in self.entries.items() )
+                self._saved, self._dirty = time.time(), False
+            path = os.path.join( self.spillDir, self.IndexFile )
+            with open( path + ".tmp", "w" ) as file: json.dump( entries, file )
+            os.replace( path + ".tmp", path )
+
+    def saveIfDue(self):
+        with self._lock: due = self._dirty and time.time() - self._saved > self.SaveInterval
+        if due: self.save()
+
+    def flush(self):
+        # Saves access times recorded since the last save ( if the spill directory still exists ).
+        if self._dirty and os.path.isdir( self.spillDir ): self.save()
+
+    def write( self, key: str, variable: EDASArray ) -> Optional[Dict[str,Any]]:
+        # Writes the array ( computing it if it is lazy ) to its store and returns its index entry, or None if it doesn't fit.
+        if not self.enabled or variable.bsize > self.maxSize: return None
+        t0 = time.time()
+        path = self.storePath( key )
+        name = variable.name or "data"
+        array = variable.xrArray.rename( name )
+        dset = array.to_dataset()
+        for var in dset.variables.values(): var.encoding = {}
+        dset.to_zarr( path, mode="w", consolidated=True )
+        nbytes = sum( os.path.getsize( os.path.join( root, file ) ) for root, dirs, files in os.walk( path ) for file in files )
+        self.logger.info( f"Spilled cached array {key} to {path}: {nbytes} bytes on disk, time = {time.time()-t0} sec" )
+        return dict( path=path, name=name, domId=variable.domId, nbytes=nbytes, atime=time.time() )
+
+    def add( self, key: str, entry: Dict[str,Any], isPinned: Callable[[str],bool] ) -> List[str]:
+        # Indexes a written store ( replacing the key's previous store, at the same path ), and unindexes least recently used,
+        # unpinned stores beyond the quota.  Returns the paths of the unindexed stores, to be deleted by discard.
+        with self._lock:
+            self.drop( key )
+            self.entries[key] = entry
+            self.currentSize += entry["nbytes"]
+            self.spills += 1
+            evicted = []
+            for oldKey in list( self.entries.keys() ):
+                if self.currentSize <= self.maxSize: break
+                if oldKey == key or isPinned( oldKey ): continue
+                evicted.append( self.drop( oldKey ) )
+                self.evictions += 1
+            self._dirty = True
+        return evicted
+
+    def spill( self, key: str, variable: EDASArray, isPinned: Callable[[str],bool] ) -> bool:
+        # Writes and indexes the array; returns False if it doesn't fit.
+        entry = self.write( key, variable )
+        if entry is not None: self.discard( self.add( key, entry, isPinned ) )
+        return entry is not None
+
+    def get( self, key: str ) -> Optional[EDASArray]:
+        with self._lock: entry = self.entries.get( key ) if self.enabled else None
+        if entry is None: return None
+        try:
+            array = xr.open_zarr( entry["path"], consolidated=True )[ entry["name"] ]
+        except Exception as err:
+            self.logger.warning( f"Dropping unreadable spilled array {key} ( {entry['path']} ): {err}" )
+            self.remove( key )
+            return None
+        with self._lock:
+            entry["atime"] = time.time()
+            if key in self.entries: self.entries.move_to_end( key )
+            self.hits += 1
+            self._dirty = True
+        self.saveIfDue()
+        return EDASArray( entry["name"], entry["domId"], array )
+
+    def drop( self, key: str ) -> Optional[str]:
+        # Unindexes the key's store; returns its path, to be deleted by discard.
+        with self._lock:
+            entry = self.entries.pop( key, None )
+            if entry is None: return None
+            self.currentSize -= entry["nbytes"]
+            self._dirty = True
+            return entry["path"]
+
+    def discard( self, paths: List[Optional[str]] ):
+        # Deletes unindexed stores, then saves the index if due.
+        for path in paths:
+            if path: shutil.rmtree( path, ignore_errors=True )
+        self.saveIfDue()
+
+    def remove( self, key: str ):
+        self.discard( [ self.drop( key ) ] )
+
+    def stats(self) -> Dict[str,Any]:
+        return dict( entries=len(self.entries), nbytes=self.currentSize, maxSize=self.maxSize, hits=self.hits, spills=self.spills, evictions=self.evictions )
+
+class ClusterCache:
+    # Cluster-resident tier of the array cache: arrays are persisted on the dask workers and published on the scheduler
+    # ( as 'edas-cache-<md5(key)>' ), so any portal or endpoint process connected to the same scheduler can reuse them.
+    # The LRU index ( key -> dataset name, domain, nbytes, last access ) is itself published, guarded by a distributed Lock,
+    # and shared by all clients; entries beyond 'cache.cluster.size' bytes are unpublished, which releases the workers'
+    # memory once no running request references them.  Enabled ( 'cache.cluster' ) when the process has a dask client.
+
+    IndexName = "edas-cache-index"
+
+    def __init__(self, enabled: bool, maxSize: int ):
+        self.logger = EDASLogger.getLogger()
+        self.requested = enabled
+        self.maxSize = maxSize
+        self.hits = 0
+        self.evictions = 0
+
+    @property
+    def client(self):
+        if not self.requested: return None
+        try:
+            from distributed import default_client
+            return default_client()
+        except ( ImportError, ValueError ): return None
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None
+
+    @staticmethod
+    def datasetName( key: str ) -> str:
+        return "edas-cache-" + hashlib.md5( key.encode() ).hexdigest()
+
+    def _lock(self):
+        from distributed import Lock
+        return Lock( self.IndexName )
+
+    def _read( self, client ) -> Dict[str,Dict[str,Any]]:
+        return client.get_dataset( self.IndexName, default={} )
+
+    def _write( self, client, entries: Dict[str,Dict[str,Any]] ):
+        client.publish_dataset( entries, name=self.IndexName, override=True )
+
+    def cache( self, key: str, variable: EDASArray, region: Optional[Dict[str,Tuple[float,float]]] = None ) -> bool:
+        # Persists and publishes the array, evicting least recently used entries; returns False if there is no client.
+        client = self.client
+        if client is None: return False
+        t0 = time.time()
+        name = self.datasetName( key )
+        array = client.persist( variable.xrArray )
+        with self._lock():
+            entries = self._read( client )
+            if name in client.list_datasets(): client.unpublish_dataset( name )
+            client.publish_dataset( array, name=name )
+            entries[key] = dict( name=name, domId=variable.domId, nbytes=variable.bsize, atime=time.time(), region=region )
+            for oldKey, entry in sorted( entries.items(), key=lambda item: item[1]["atime"] ):
+                if sum( entry["nbytes"] for entry in entries.values() ) <= self.maxSize: break
+                if oldKey == key: continue
+                self._unpublish( client, entries.pop( oldKey ) )
+                self.evictions += 1
+            self._write( client, entries )
+        self.logger.info( f"Published cached array {key} as {name} on the cluster: {variable.bsize} bytes, time = {time.time()-t0} sec" )
+        return True
+
+    def get( self, key: str ) -> Optional[EDASArray]:
+        client = self.client
+        if client is None: return None
+        entry = self._read( client ).get( key )       # read without the index lock, which is only taken to update it
+        if entry is None: return None
+        try:
+            array = client.get_dataset( entry["name"] )
+        except KeyError:
+            self.remove( key )
+            return None
+        with self._lock():
+            entries = self._read( client )
+            if key in entries:
+                entries[key]["atime"] = time.time()
+                self._write( client, entries )
+        self.hits += 1
+        return EDASArray( array.name, entry["domId"], array )
+
+    def remove( self, key: str ):
+        client = self.client
+        if client is None: return
+        with self._lock():
+            entries = self._read( client )
+            if key in entries:
+                self._unpublish( client, entries.pop( key ) )
+                self._write( client, entries )
+
+    def _unpublish( self, client, entry: Dict[str,Any] ):
+        try: client.unpublish_dataset( entry["name"] )
+        except KeyError: pass
+
+    def entries(self) -> Dict[str,Dict[str,Any]]:
+        client = self.client
+        return self._read( client ) if client is not None else {}
+
+    def keys(self) -> List[str]:
+        return list( self.entries().keys() )
+
+    def stats(self) -> Dict[str,Any]:
+        client = self.client
+        entries = self._read( client ) if client is not None else {}
+        return dict( enabled=client is not None, entries=len(entries), nbytes=sum( entry["nbytes"] for entry in entries.values() ), maxSize=self.maxSize, hits=self.hits, evictions=self.evictions )
+
+class RegionIndex:
+    # Value bounds ( axis -> ( start, end ), times in ns ) of the domains of the cached arrays of each source id, for
+    # containment queries: a request domain inside a cached region is served by subsetting the cached array, and a domain
+    # extending a cached region along one axis by reading only the missing intervals of that axis ( see
+    # InputKernel.getCachedDataset ).  Axes that a cached domain doesn't bound are cached over their full extent.  Regions are
+    # also stored in the spill and cluster tier entries ( 'region' ), from which the index is rebuilt ( see restore ).
+
+    def __init__(self):
+        self.regions: Dict[str,Dict[str,Dict[str,Tuple[float,float]]]] = {}      # id -> key -> region
+
+    @staticmethod
+    def toValue( axis: str, value: Any ) -> float:
+        return float( pd.Timestamp( value ).value ) if axis == "t" else float( value )
+
+    @staticmethod
+    def fromValue( axis: str, value: float ) -> Any:
+        return pd.Timestamp( int( value ) ).isoformat() if axis == "t" else value
+
+    @classmethod
+    def bounds( cls, domain: Optional[Domain] ) -> Optional[Dict[str,Tuple[float,float]]]:
+        # Value bounds of a domain, None if it has index bounds, strides or unknown axes.
+        bounds = {}
+        for axis, bound in ( domain.axisBounds.items() if domain is not None else [] ):
+            if axis == Axis.UNKNOWN or not bound.system.startswith("val") or bound.step not in [ None, 1 ]: return None
+            name = axis.name.lower()
+            bounds[name] = tuple( sorted( [ cls.toValue( name, bound.start ), cls.toValue( name, bound.end ) ] ) )
+        return bounds
+
+    def add( self, id: str, key: str, domain: Optional[Domain] ) -> Optional[Dict[str,Tuple[float,float]]]:
+        bounds = self.bounds( domain )
+        if bounds is not None: self.regions.setdefault( id, {} )[key] = bounds
+        return bounds
+
+    def region( self, key: str ) -> Optional[Dict[str,Tuple[float,float]]]:
+        return self.regions.get( key.split("|")[0], {} ).get( key )
+
+    def restore( self, entries: Dict[str,Dict[str,Any]] ):
+        # Indexes the regions of cache tier entries ( key -> entry ).
+        for key, entry in entries.items():
+            if entry.get( "region" ): self.regions.setdefault( key.split("|")[0], {} )[key] = { axis: tuple( extent ) for axis, extent in entry["region"].items() }
+
+    def remove( self, id: str, key: str ):
+        self.regions.get( id, {} ).pop( key, None )
+
+    def find( self, id: str, domain: Optional[Domain] ) -> List[Tuple[str,Optional[Tuple[str,List[Tuple[float,float]]]]]]:
+        # Cached regions containing the domain ( key, None ), then those containing it except along one axis, which they
+        # overlap ( key, ( axis, missing intervals ) ), fewest missing values first.
+        bounds = self.bounds( domain )
+        if bounds is None: return []
+        contained, partial = [], []
+        for key, region in self.regions.get( id, {} ).items():
+            if any( axis not in bounds for axis in region ): continue
+            uncovered = [ ( axis, bounds[axis], extent ) for axis, extent in region.items() if not ( extent[0] <= bounds[axis][0] and bounds[axis][1] <= extent[1] ) ]
+            if len( uncovered ) == 0: contained.append( ( key, None ) )
+            elif len( uncovered ) == 1:
+                axis, ( start, end ), ( lo, hi ) = uncovered[0]
+                if start > hi or end < lo: continue
+                missing = ( [ ( start, lo ) ] if start < lo else [] ) + ( [ ( hi, end ) ] if end > hi else [] )
+                partial.append( ( sum( e - s for s, e in missing ), key, ( axis, missing ) ) )
+        return contained + [ ( key, missing ) for size, key, missing in sorted( partial, key=lambda item: item[0] ) ]
 
 class CacheManager:
+    # Process-wide LRU cache of EDASArrays, bounded by 'cache.size.max' bytes ( dtype-accurate nbytes, see EDASArray.bsize ).
+    # Recency is updated on every access.  Entries acquired by a request are pinned ( never evicted ) until the request
+    # releases them, see SubmissionThread.  All methods are thread safe: requests run concurrently in SubmissionThreads.
+    # Arrays evicted from memory are spilled to the disk tier ( see SpillCache ), from which get faults them back in.  Spills
+    # are written, and unindexed spilled stores deleted, by a background thread, outside the lock; until written, evicted
+    # arrays are still served from memory.
+    # With a dask client and 'cache.cluster' set, arrays are cached on the cluster instead ( see ClusterCache ).
+    # Keys combine the source id and the domain bounds ( see key ).
 
     def __init__(self):
+        self.logger = EDASLogger.getLogger()
         self.arrayCache: Dict[str,EDASArray] = OrderedDict()
+        self.spillCache = SpillCache( EdasEnv.get( "cache.spill.dir", None ), SizeParser.parse( EdasEnv.get( "cache.spill.size", "10G" ) ) )
+        self.clusterCache = ClusterCache( EdasEnv.getBool( "cache.cluster", False ), SizeParser.parse( EdasEnv.get( "cache.cluster.size", "8G" ) ) )
+        self.regionIndex = RegionIndex()
+        self._restored: Optional[SpillCache] = None     # spill tier whose regions are indexed
+        self.atimes: Dict[str,float] = {}
+        self.sizes: Dict[str,int] = {}
+        self.pins: Dict[str,Set[str]] = {}       # key -> owners ( request ids )
+        self.spilling: Dict[str,EDASArray] = {}   # evicted arrays waiting to be written to the spill tier
+        self._spiller: Optional[ThreadPoolExecutor] = None
         self.maxSize = SizeParser.parse(EdasEnv.get("cache.size.max", "500M"))
         self.currentSize = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = RLock()
+
+    @staticmethod
+    def key( id: str, domain: Optional[Domain] = None ) -> str:
+        signature = domain.signature if domain is not None else ""
+        return id + "|" + signature if signature else id
+
+    def cacheRegion(self, id: str, domain: Optional[Domain], variable: EDASArray ):
+        # Caches the array of source id over domain, and indexes its region for findRegion.
+        key = self.key( id, domain )
+        with self._lock: region = self.regionIndex.add( id, key, domain )
+        self.cache( key, variable, region )
+
+    def findRegion(self, id: str, domain: Optional[Domain], owner: Optional[str] = None ) -> Tuple[Optional[EDASArray],Optional[Tuple[str,List[Tuple[float,float]]]]]:
+        # The cached array of source id for the domain: an exact match, or a cached region containing it ( missing = None ),
+        # or else one that overlaps it along one axis ( missing = ( axis, value intervals to read ) ).
+        # Arrays cached under the bare id ( e.g. by a CacheKernel whose domain isn't in the request ) are the fallback.
+        variable = self.get( self.key( id, domain ), owner )
+        if variable is not None: return variable, None
+        clusterEntries = self.clusterCache.entries()
+        with self._lock:
+            self.restoreRegions( clusterEntries )
+            candidates = self.regionIndex.find( id, domain )
+        for key, missing in candidates:
+            variable = self.get( key, owner )
+            if variable is not None: return variable, missing
+            with self._lock: self.regionIndex.remove( id, key )
+        if domain is not None and domain.signature: return self.get( id, owner ), None
+        return None, None
 
-    def cache(self, id: str, variable: EDASArray ):
-        assert id not in self.arrayCache,  "Error: id {} already exists in cache".format( id )
+    def restoreRegions( self, clusterEntries: Dict[str,Dict[str,Any]] ):
+        # Indexes the regions of the cluster tier ( shared with other processes ) and, once, of the spill tier ( kept across restarts ).
+        with self._lock:
+            if self._restored is not self.spillCache:
+                self.regionIndex.restore( self.spillCache.entries )
+                self._restored = self.spillCache
+            self.regionIndex.restore( clusterEntries )
+
+    @property
+    def maxEntrySize(self) -> int:
+        # Size in bytes of the largest array that can be cached ( in the cluster tier, if enabled ).
+        return self.clusterCache.maxSize if self.clusterCache.enabled else self.maxSize
+
+    def cache(self, id: str, variable: EDASArray, region: Optional[Dict[str,Tuple[float,float]]] = None ):
+        if self.clusterCache.cache( id, variable, region ): return
         input_size = variable.bsize
         assert input_size <= self.maxSize, "Error: array {} is too big for cache".format( id )
-        self.clearSpace( input_size )
-        self.arrayCache[id] = variable
-        self.currentSize += input_size
+        with self._lock:
+            if id in self.arrayCache: self._remove( id )
+            self.spilling.pop( id, None )
+            spilled = self.spillCache.drop( id )
+            self.clearSpace( input_size )
+            self.arrayCache[id] = variable
+            self.sizes[id] = input_size
+            self.atimes[id] = time.time()
+            self.currentSize += input_size
+        self._discard( spilled )
 
     def clearSpace( self, bsize: int ):
-        if self.currentSize + bsize > self.maxSize:
-            for key, value in self.arrayCache.items():
-               del self[key]
-               if self.currentSize + bsize < self.maxSize:  break
+        # Evicts least recently used, unpinned entries until bsize bytes fit.
+        with self._lock:
+            for key in list( self.arrayCache.keys() ):
+                if self.currentSize + bsize <= self.maxSize: break
+                if key in self.pins: continue
+                self._evict( key )
+            assert self.currentSize + bsize <= self.maxSize, "Error: can't free {} bytes in cache, pinned entries: {}".format( bsize, list( self.pins.keys() ) )
+
+    def get( self, key: str, owner: Optional[str] = None ) -> Optional[EDASArray]:
+        # Returns the entry ( pinned for owner, if given ) and marks it most recently used, or None.
+        with self._lock:
+            value = self.arrayCache.get( key, None )
+            if value is not None:
+                self.arrayCache.move_to_end( key )
+                self.atimes[key] = time.time()
+            else: value = self.spilling.get( key )
+            if owner is not None: self.pins.setdefault( key, set() ).add( owner )     # pinned first, so the spilled store isn't evicted while opened
+        if value is None: value = self.clusterCache.get( key ) or self.spillCache.get( key )      # scheduler and disk round trips without the lock
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                if owner is not None: self._unpin( key, owner )
+                return None
+            self.hits += 1
+            return value
+
+    def _unpin( self, key: str, owner: str ):
+        owners = self.pins.get( key )
+        if owners is None: return
+        owners.discard( owner )
+        if not owners: del self.pins[key]
+
+    def release( self, owner: str ):
+        # Unpins all entries acquired by owner.
+        with self._lock:
+            for key in list( self.pins.keys() ): self._unpin( key, owner )
+
+    def stats(self) -> Dict[str,Any]:
+        with self._lock:
+            requests = self.hits + self.misses
+            return dict( entries=len(self.arrayCache), nbytes=self.currentSize, maxSize=self.maxSize, pinned=len(self.pins), hits=self.hits,
+                         misses=self.misses, evictions=self.evictions, hitRate=( self.hits / requests if requests else 0.0 ), spill=self.spillCache.stats(), cluster=self.clusterCache.stats() )
+
+    def entries(self) -> List[Dict[str,Any]]:
+        # All cached arrays, per tier, most recently used last.
+        with self._lock:
+            entries = [ dict( key=key, tier="memory", nbytes=self.sizes[key], atime=self.atimes.get( key ), owners=sorted( self.pins.get( key, [] ) ) ) for key in self.arrayCache.keys() ]
+            entries += [ dict( key=key, tier="spilling", nbytes=variable.bsize, atime=None, owners=sorted( self.pins.get( key, [] ) ) ) for key, variable in self.spilling.items() ]
+            entries += [ dict( key=key, tier="spill", nbytes=entry["nbytes"], atime=entry["atime"], owners=sorted( self.pins.get( key, [] ) ) ) for key, entry in self.spillCache.entries.items() ]
+        entries += [ dict( key=key, tier="cluster", nbytes=entry["nbytes"], atime=entry["atime"], owners=[] ) for key, entry in sorted( self.clusterCache.entries().items(), key=lambda item: item[1]["atime"] ) ]
+        return entries
+
+    def evict( self, pattern: str ) -> List[str]:
+        # Removes the entries whose key or id ( the key's source id, see key() ) matches the glob pattern, from all tiers.
+        # The entries ( including the cluster tier's ) are listed, and removed, without holding the lock.
+        keys = { entry["key"] for entry in self.entries() if fnmatch.fnmatchcase( entry["key"], pattern ) or fnmatch.fnmatchcase( entry["key"].split("|")[0], pattern ) }
+        for key in list( keys ):
+            try: del self[key]
+            except KeyError: keys.discard( key )        # removed concurrently
+        self.logger.info( f"Evicted cached arrays matching '{pattern}': {sorted(keys)}" )
+        return sorted( keys )
 
+    def _evict( self, key: str ):
+        # Called with the lock held: the array is queued for the spill thread, which writes it without the lock.
+        variable = self.arrayCache[key]
+        self._remove( key, False )
+        self.evictions += 1
+        if not self.spillCache.enabled: return
+        self.spilling[key] = variable
+        self.spiller().submit( self._spill, key, variable )
 
-    def __getitem__( self, key: str ) -> EDASArray: return self.arrayCache.get( key, None )
+    def spiller(self) -> ThreadPoolExecutor:
+        # One thread: writes and deletions of a key's store never overlap, and run in the order they were queued.
+        with self._lock:
+            if self._spiller is None: self._spiller = ThreadPoolExecutor( max_workers=1 )
+            return self._spiller
+
+    def _spill( self, key: str, variable: EDASArray ):
+        try: entry = self.spillCache.write( key, variable )
+        except Exception as err:
+            self.logger.error( f"Error spilling cached array {key}: {err}" )
+            entry = None
+        evicted = []
+        with self._lock:
+            current = self.spilling.get( key ) is variable
+            if current: del self.spilling[key]
+            if entry is not None and current: evicted = self.spillCache.add( key, dict( entry, region=self.regionIndex.region( key ) ), lambda key: key in self.pins )
+        if entry is not None and not current: evicted = [ entry["path"] ]      # re-cached or deleted meanwhile
+        self.spillCache.discard( evicted )
+
+    def _discard( self, path: Optional[str] ):
+        # Queues the deletion of an unindexed spilled store on the spill thread.
+        if path is not None: self.spiller().submit( self.spillCache.discard, [ path ] )
+
+    def waitForSpills(self):
+        # Blocks until the queued spills have been written.
+        if self._spiller is not None: self._spiller.submit( lambda: None ).result()
+
+    def _remove( self, key: str, unpin: bool = True ):
+        del self.arrayCache[key]
+        self.currentSize -= self.sizes.pop( key )
+        self.atimes.pop( key, None )
+        if unpin: self.pins.pop( key, None )
+
+    def __getitem__( self, key: str ) -> EDASArray: return self.get( key )
     def __setitem__( self, key: str, value: EDASArray ): self.cache( key, value )
+    def __contains__( self, key: str ) -> bool: return self._containsLocal( key ) or key in self.clusterCache.keys()
+    def __len__( self ) -> int: return len( self.arrayCache )
+
+    def _containsLocal( self, key: str ) -> bool:
+        with self._lock: return key in self.arrayCache or key in self.spilling or key in self.spillCache.entries
 
     def __delitem__( self, key ):
-        value = self.arrayCache[key]
-        del self.arrayCache[key]
-        self.currentSize = self.currentSize - value.bsize
+        inCluster = key in self.clusterCache.keys()
+        if inCluster: self.clusterCache.remove( key )
+        with self._lock:
+            if not ( inCluster or self._containsLocal( key ) ): raise KeyError( key )
+            if key in self.arrayCache: self._remove( key )
+            self.spilling.pop( key, None )
+            spilled = self.spillCache.drop( key )
+            self.pins.pop( key, None )
+            self.regionIndex.remove( key.split("|")[0], key )
+        self._discard( spilled )
 
 EDASKCacheMgr = CacheManager()
@@ -0,0 +1,85 @@
+import numpy as np
+from typing import Dict, List, Optional, Iterable, Sequence, Tuple
+from edas.config import EdasEnv
+from edas.portal.parsers import SizeParser
+from edas.util.logging import EDASLogger
+
+class ChunkPlanner:
+    # Plans per-dimension chunk sizes for an input variable so that each chunk is close to a target size in bytes
+    # ('chunk.bytes', capped by the worker memory limit).  Dimensions are split in groups: first time (unless it is reduced
+    # downstream), since time chunks map to whole files; then the other non-reduction dims; and only then the downstream
+    # kernel's reduction dims, so reductions stay chunk-local as long as possible.  Dims within a group are split evenly.
+
+    def __init__(self, shape: Dict[str,int], dtype: np.dtype = np.float32, reductionDims: Iterable[str] = (), timeDim: str = "time", targetBytes: Optional[int] = None ):
+        self.logger = EDASLogger.getLogger()
+        self.shape: Dict[str,int] = { dim: int(size) for dim, size in shape.items() }
+        self.itemsize = np.dtype( dtype ).itemsize
+        self.reductionDims = [ dim for dim in reductionDims if dim in self.shape ]
+        self.timeDim = timeDim
+        self.targetBytes = targetBytes if targetBytes is not None else self.getTargetBytes()
+
+    @classmethod
+    def getTargetBytes( cls ) -> int:
+        target = SizeParser.parse( EdasEnv.get( "chunk.bytes", "128M" ) )
+        memoryLimit = cls.getWorkerMemoryPerThread()
+        if memoryLimit is not None:
+            target = min( target, int( memoryLimit * float( EdasEnv.get( "chunk.memory.fraction", 0.25 ) ) ) )
+        return max( target, 1 )
+
+    @classmethod
+    def getWorkerMemoryPerThread( cls ) -> Optional[int]:
+        from edas.process.manager import ProcessManager
+        manager = ProcessManager.getManager()
+        if manager is None or not manager.workers: return None
+        limits = [ int( wData["memory_limit"] ) // max( int( wData.get( "nthreads", wData.get( "ncores", 1 ) ) ), 1 ) for wData in manager.workers.values() if wData.get("memory_limit") ]
+        return min( limits ) if limits else None
+
+    @classmethod
+    def getReductionDims( cls, axes: Iterable[str], coordMap: Dict[str,str] ) -> List[str]:
+        # Maps EDAS axis names ('t','x','y','z') of downstream operations to dataset dimension names, via an axis -> dim name map.
+        return [ coordMap[axis.lower()] for axis in axes if axis.lower() in coordMap ]
+
+    def nbytes(self, chunks: Dict[str,int] ) -> int:
+        return self.itemsize * int( np.prod( list( chunks.values() ) ) )
+
+    def splitGroups(self) -> List[List[str]]:
+        spatial = [ dim for dim in self.shape if dim != self.timeDim and dim not in self.reductionDims ]
+        groups = [ spatial, [ dim for dim in self.shape if dim in self.reductionDims ] ]
+        return groups if self.timeDim in self.reductionDims or self.timeDim not in self.shape else [ [ self.timeDim ] ] + groups
+
+    def plan(self) -> Dict[str,int]:
+        chunks = dict( self.shape )
+        for group in self.splitGroups():
+            dims = [ dim for dim in group if chunks[dim] > 1 ]
+            while dims and self.nbytes( chunks ) > self.targetBytes:
+                factor = ( self.nbytes( chunks ) / self.targetBytes ) ** ( 1.0 / len(dims) )
+                for dim in dims: chunks[dim] = max( 1, int( chunks[dim] / factor ) )
+                dims = [ dim for dim in dims if chunks[dim] > 1 ]
+        self.logger.info( f"ChunkPlanner: shape={self.shape}, reductionDims={self.reductionDims}, target={self.targetBytes}, chunks={chunks}, chunk bytes={self.nbytes(chunks)}" )
+        return chunks
+
+    @classmethod
+    def fileGroups( cls, fileSizes: Sequence[int], timeChunk: Optional[int] ) -> List[Tuple[int,int]]:
+        # Groups consecutive files into [i0,i1) ranges holding at most timeChunk time steps (but at least one file), so that
+        # every time chunk maps to a whole number of files.  Files longer than timeChunk form groups of their own.
+        groups: List[Tuple[int,int]] = []
+        i0, nsteps = 0, 0
+        for iFile, size in enumerate( fileSizes ):
+            if iFile > i0 and timeChunk and nsteps + size > timeChunk:
+                groups.append( ( i0, iFile ) )
+                i0, nsteps = iFile, 0
+            nsteps += size
+        if len( fileSizes ) > i0: groups.append( ( i0, len( fileSizes ) ) )
+        return groups
+
+    @classmethod
+    def fileChunk( cls, fileSizes: Sequence[int], timeChunk: Optional[int] ) -> Optional[int]:
+        # Time chunk for readers that chunk each file separately (open_mfdataset), where chunks can't span files: a whole file
+        # when every file fits in timeChunk, otherwise the largest divisor of the usual length of the longer files that fits,
+        # so those files split into equal chunks.  Lengths with no usable divisor (under half of timeChunk) keep timeChunk.
+        if not timeChunk or len( fileSizes ) == 0: return timeChunk
+        longer = [ int(size) for size in fileSizes if size > timeChunk ]
+        if not longer: return int( max( fileSizes ) )
+        usual = max( set( longer ), key=longer.count )
+        divisor = max( size for size in range( 1, timeChunk + 1 ) if usual % size == 0 )
+        return divisor if 2 * divisor >= timeChunk else timeChunk
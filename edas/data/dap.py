@@ -0,0 +1,285 @@
+import os, time, hashlib, threading
+import numpy as np
+import xarray as xr
+import dask
+import dask.array as da
+from urllib.parse import urlparse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Union, Callable
+from requests import Session
+from edas.config import EdasEnv
+from edas.portal.parsers import SizeParser
+from edas.collection.virtual import VirtualDataset, splitSlice
+from edas.util.logging import EDASLogger
+
+Hyperslab = Tuple[slice,...]
+
+class SessionPool:
+    # One (authenticated) requests session per ( scheme://host, auth method ), shared by all requests to that server.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: Dict[Tuple[str,Optional[str]],Session] = {}
+
+    @staticmethod
+    def newSession( url: str, auth: Optional[str] ) -> Session:
+        if auth == "esgf":
+            from pydap.cas.esgf import setup_session
+            openid = EdasEnv.get("esgf.openid", "")
+            password = EdasEnv.get("esgf.password", "")
+            username = EdasEnv.get("esgf.username", openid.split("/")[-1])
+            return setup_session( openid, password, username, check_url=url )
+        elif auth == "urs":
+            from pydap.cas.urs import setup_session
+            username = EdasEnv.get("urs.username", "")
+            password = EdasEnv.get("urs.password", "")
+            return setup_session( username, password, check_url=url )
+        elif auth == "cookie":
+            from pydap.cas.get_cookies import setup_session
+            username = EdasEnv.get("auth.username", "")
+            password = EdasEnv.get("auth.password", "")
+            auth_url = EdasEnv.get("auth.url", "")
+            return setup_session( auth_url, username, password )
+        elif auth is not None:
+            raise Exception( "Unknown authentication method: " + auth )
+        return Session()
+
+    def get( self, url: str, auth: Optional[str] ) -> Session:
+        parsed = urlparse( url )
+        key = ( f"{parsed.scheme}://{parsed.netloc}", auth )
+        with self._lock:
+            session = self._sessions.get( key )
+            if session is None: session = self._sessions[key] = self.newSession( url, auth )
+            return session
+
+    def clear(self):
+        with self._lock:
+            for session in self._sessions.values(): session.close()
+            self._sessions.clear()
+
+class BlockCache:
+    # On-disk LRU cache of fetched DAP hyperslabs, keyed by ( url, dataset version, variable, hyperslab ) and bounded by
+    # 'dap.cache.size' bytes.  The version is the server's ETag or Last-Modified for the dataset ( see DapAccess.getVersion ),
+    # so blocks of a dataset that changed on the server are no longer hit ( and age out of the LRU ).  Blocks are stored as
+    # .npy files under 'dap.cache.dir', which all the worker processes share: any process reads the blocks the others wrote,
+    # a hit touches the block's mtime, and the quota applies to the directory's contents.  Each process rebuilds its LRU from
+    # the directory ( by mtime ) on first use, every ScanInterval seconds, and whenever its count exceeds the quota, and then
+    # evicts the least recently used blocks of all processes down to EvictFraction of the quota, so that a full cache isn't
+    # rescanned on every put.  The directory can exceed the quota by what the other processes wrote since the last scan.
+
+    ScanInterval = 30.0    # seconds
+    EvictFraction = 0.9
+
+    def __init__( self, cacheDir: str, maxSize: int ):
+        self.logger = EDASLogger.getLogger()
+        self.cacheDir = cacheDir
+        self.maxSize = maxSize
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[str,int]" = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._scanned = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxSize > 0
+
+    @staticmethod
+    def key( url: str, version: str, varName: str, hyperslab: Hyperslab ) -> str:
+        slab = ",".join( f"{s.start}:{s.stop}" for s in hyperslab )
+        return hashlib.md5( f"{url}|{version}|{varName}|{slab}".encode() ).hexdigest()
+
+    def path( self, key: str ) -> str:
+        return os.path.join( self.cacheDir, key[0:2], key + ".npy" )
+
+    def _scan(self):
+        # Rebuilds the LRU from the blocks in the cache dir ( written by any process ), least recently used first.  The
+        # directory is walked without the lock.
+        with self._lock: self._scanned = time.time()
+        os.makedirs( self.cacheDir, exist_ok=True )
+        blocks = []
+        for root, dirs, files in os.walk( self.cacheDir ):
+            for file in files:
+                if file.endswith( ".npy" ):
+                    try: st = os.stat( os.path.join( root, file ) )
+                    except OSError: continue        # evicted by another process
+                    blocks.append( ( st.st_mtime, file[:-4], st.st_size ) )
+        with self._lock:
+            self._entries = OrderedDict( ( key, size ) for mtime, key, size in sorted( blocks ) )
+            self.nbytes = sum( self._entries.values() )
+
+    def _refresh(self):
+        if time.time() - self._scanned > self.ScanInterval: self._scan()
+
+    def get( self, key: str ) -> Optional[np.ndarray]:
+        # Blocks missing from the LRU may have been written by another process since the last scan, so the file is tried anyway.
+        if not self.enabled: return None
+        self._refresh()
+        path = self.path( key )
+        try:
+            data = np.load( path )
+            os.utime( path )
+        except OSError:
+            with self._lock:
+                self.misses += 1
+                self.nbytes -= self._entries.pop( key, 0 )
+            return None
+        with self._lock:
+            self.hits += 1
+            if key not in self._entries: self._entries[key] = data.nbytes
+            self._entries.move_to_end( key )
+        return data
+
+    def put( self, key: str, data: np.ndarray ):
+        if not self.enabled or data.nbytes > self.maxSize: return
+        self._refresh()
+        path = self.path( key )
+        os.makedirs( os.path.dirname( path ), exist_ok=True )
+        tmp = f"{path[:-4]}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open( tmp, "wb" ) as file: np.save( file, data )
+        os.replace( tmp, path )
+        size = os.stat( path ).st_size
+        with self._lock:
+            self.nbytes += size - self._entries.pop( key, 0 )
+            self._entries[key] = size
+            full = self.nbytes > self.maxSize
+        if full: self.evict( key )
+
+    def evict( self, keep: Optional[str] = None ):
+        # Evicts the least recently used blocks in the cache dir ( but keep ) after rescanning it, if it exceeds the quota.
+        self._scan()
+        with self._lock:
+            victims = []
+            target = self.maxSize * self.EvictFraction if self.nbytes > self.maxSize else self.maxSize
+            for oldKey in list( self._entries.keys() ):
+                if self.nbytes <= target: break
+                if oldKey == keep: continue
+                self.nbytes -= self._entries.pop( oldKey )
+                victims.append( oldKey )
+            self.evictions += len( victims )
+        for oldKey in victims:
+            try: os.remove( self.path( oldKey ) )
+            except OSError: pass
+
+    def stats(self) -> Dict[str,Any]:
+        requests = self.hits + self.misses
+        return dict( blocks=len(self._entries), nbytes=self.nbytes, maxSize=self.maxSize, hits=self.hits, misses=self.misses,
+                     evictions=self.evictions, hitRate=( self.hits / requests if requests else 0.0 ) )
+
+class DapAccess:
+    # Lazy, cached access to OPeNDAP datasets.  Dataset metadata (DDS/DAS) is fetched once per ( url, auth ) over a pooled
+    # session; variables become dask arrays whose chunks are fetched as hyperslab requests through the block cache, at most
+    # 'dap.fetch.threads' at a time per process.  Coordinates are fetched concurrently when the dataset is opened.  Each open
+    # revalidates the dataset version with the server ( a HEAD request ), refetching the metadata if it changed.
+    # Dask tasks refer to an instance by name (see readDapBlock), so on a worker they run against that worker's instance.
+    # The fetch threads are started on first use.
+
+    instances: Dict[str,"DapAccess"] = {}
+
+    def __init__( self, blockCache: BlockCache, nThreads: int, name: str = "default" ):
+        self.logger = EDASLogger.getLogger()
+        self.name = name
+        DapAccess.instances[name] = self
+        self.sessions = SessionPool()
+        self.blocks = blockCache
+        self.nThreads = max( nThreads, 1 )
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._datasets: Dict[Tuple[str,Optional[str]],Tuple[str,Any]] = {}      # ( url, auth ) -> ( version, pydap dataset )
+        self.fetches = 0
+        self.bytesFetched = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None: self._executor = ThreadPoolExecutor( max_workers=self.nThreads )
+            return self._executor
+
+    def getVersion( self, url: str, auth: Optional[str] = None ) -> str:
+        # The server's validator for the dataset: the ETag, else the Last-Modified date, of its DDS ( '' if it sends neither ).
+        try:
+            response = self.sessions.get( url, auth ).head( url + ".dds", allow_redirects=True )
+            return response.headers.get( "ETag" ) or response.headers.get( "Last-Modified" ) or ""
+        except Exception as err:
+            self.logger.warning( f"Can't get the version of DAP dataset {url}: {err}" )
+            return ""
+
+    def getDataset( self, url: str, auth: Optional[str] = None, version: str = "" ):
+        from pydap.client import open_url
+        key = ( url, auth )
+        with self._lock: entry = self._datasets.get( key )
+        if entry is None or entry[0] != version:
+            entry = ( version, open_url( url, session=self.sessions.get( url, auth ) ) )
+            with self._lock: self._datasets[key] = entry
+        return entry[1]
+
+    def getVariable( self, url: str, auth: Optional[str], varName: str, version: str = "" ):
+        from pydap.model import GridType
+        var = self.getDataset( url, auth, version )[varName]
+        return var.array if isinstance( var, GridType ) else var
+
+    def _fetch( self, url: str, auth: Optional[str], version: str, varName: str, hyperslab: Hyperslab ) -> np.ndarray:
+        key = BlockCache.key( url, version, varName, hyperslab )
+        data = self.blocks.get( key )
+        if data is None:
+            data = np.asarray( self.getVariable( url, auth, varName, version )[ hyperslab ].data )
+            with self._lock:
+                self.fetches += 1
+                self.bytesFetched += data.nbytes
+            self.blocks.put( key, data )
+        return data
+
+    def read( self, url: str, auth: Optional[str], version: str, varName: str, hyperslab: Hyperslab ) -> np.ndarray:
+        return self.executor.submit( self._fetch, url, auth, version, varName, hyperslab ).result()
+
+    def fetch( self, blocks: List[Tuple[str,Optional[str],str,str,Hyperslab]] ) -> List[np.ndarray]:
+        # Fetches independent hyperslabs concurrently.
+        return [ future.result() for future in [ self.executor.submit( self._fetch, *block ) for block in blocks ] ]
+
+    @staticmethod
+    def attributes( attrs: Dict[str,Any] ) -> Dict[str,Any]:
+        return { key: value for key, value in attrs.items() if not isinstance( value, dict ) }
+
+    def open( self, url: str, auth: Optional[str] = None, chunks: Union[ Dict[str,int], Callable[[xr.Dataset],Dict[str,int]], None ] = None ) -> xr.Dataset:
+        # Chunks ( dim name -> size ) default to one chunk per variable.  Data are decoded (CF conventions) lazily.  Chunks may be
+        # planned from the dataset: a callable is passed a template dataset ( one chunk per variable, nothing read but the
+        # coordinates ) and returns the chunks, so metadata and coordinates are fetched once.
+        t0 = time.time()
+        version = self.getVersion( url, auth )
+        dataset = self.getDataset( url, auth, version )
+        variables = { name: self.getVariable( url, auth, name, version ) for name in dataset.keys() }
+        dimensions = { name: tuple( dataset[name].dimensions ) for name in dataset.keys() }     # Grid dims are those of its maps
+        coordNames = [ name for name in variables.keys() if dimensions[name] == ( name, ) ]
+        coordValues = self.fetch( [ ( url, auth, version, name, ( slice( 0, variables[name].shape[0] ), ) ) for name in coordNames ] )
+        read = dask.delayed( readDapBlock, pure=True )
+
+        def build( chunks: Dict[str,int] ) -> xr.Dataset:
+            xrVars = {}
+            for name, var in variables.items():
+                dims, attrs = dimensions[name], self.attributes( dataset[name].attributes )
+                if name in coordNames: data = coordValues[ coordNames.index( name ) ]
+                else:
+                    dtype = np.dtype( var.dtype )
+                    splits = [ splitSlice( slice( 0, size ), chunks.get( dim ) ) for dim, size in zip( dims, var.shape ) ]
+                    newBlock = lambda hyperslab, shape, name=name, dtype=dtype: da.from_delayed( read( self.name, url, auth, version, name, hyperslab ), shape, dtype=dtype )
+                    data = da.block( VirtualDataset.blockGrid( [], splits, newBlock ) ) if len( dims ) else newBlock( (), () )
+                xrVars[name] = xr.Variable( dims, data, attrs )
+            return xr.decode_cf( xr.Dataset( xrVars, attrs=self.attributes( dataset.attributes.get( "NC_GLOBAL", {} ) ) ) )
+
+        if callable( chunks ): chunks = chunks( build( {} ) )
+        chunks = chunks or {}
+        dset = build( chunks )
+        self.logger.info( f"Opened DAP dataset {url} ( version '{version}' ): vars = {list(dset.data_vars.keys())}, chunks = {chunks}, time = {time.time()-t0} sec, {self.stats()}" )
+        return dset
+
+    def stats(self) -> Dict[str,Any]:
+        return dict( fetches=self.fetches, bytesFetched=self.bytesFetched, blockCache=self.blocks.stats() )
+
+def readDapBlock( accessName: str, url: str, auth: Optional[str], version: str, varName: str, hyperslab: Hyperslab ) -> np.ndarray:
+    return DapAccess.instances[accessName].read( url, auth, version, varName, hyperslab )
+
+DapAccessMgr = DapAccess( BlockCache( os.path.expanduser( EdasEnv.get( "dap.cache.dir", os.path.join( EdasEnv.TRANSIENTS_DIR, "dapcache" ) ) ),
+                                      SizeParser.parse( EdasEnv.get( "dap.cache.size", "10G" ) ) ), int( EdasEnv.get( "dap.fetch.threads", 8 ) ) )
@@ -0,0 +1,73 @@
+import numpy as np
+import dask
+import dask.array as da
+from typing import List, Optional, Tuple
+from edas.util.logging import EDASLogger
+
+class EofSolver:
+    # EOF analysis of a ( time x space ) matrix held as a chunked dask array, so the matrix is never loaded into one process.
+    # Columns with missing values are excluded ( their EOFs are NaN ), the time mean is removed if center is set, and the
+    # columns are multiplied by weights ( e.g. sqrt(cos(lat)) ) before the decomposition, as in eofs.standard.Eof.  The SVD is
+    # either randomized ( dask.array.linalg.svd_compressed: a few streaming passes over the matrix, with 'iterations' power
+    # iterations to sharpen the leading modes ) or exact ( 'tsqr': tall-and-skinny QR of the matrix, or of its transpose when
+    # there are fewer times than grid points, rechunked to a single chunk along the short axis, so into blocks of at least
+    # short x short values; above maxBlockBytes per block it falls back to the randomized SVD ).  Only the leading modes,
+    # the singular values and the total variance are computed: eofs are unscaled eigenvectors, pcs are unscaled ( U*S ),
+    # and variance fractions are relative to the total variance of the ( centered, weighted ) data.  Each EOF's sign is
+    # fixed so that its largest-magnitude element is positive.
+
+    Methods = [ "randomized", "tsqr" ]
+
+    def __init__( self, data: da.Array, nModes: int, center: bool = True, weights: Optional[np.ndarray] = None, method: str = "randomized", iterations: int = 2, seed: int = 0,
+                  maxBlockBytes: Optional[float] = None ):
+        assert method in self.Methods, f"Unrecognised EOF method '{method}', expecting one of {self.Methods}"
+        self.logger = EDASLogger.getLogger()
+        data = da.asarray( data ).astype( np.float64 )
+        nTimes, nPoints = data.shape
+        self.nModes = min( nModes, nTimes, nPoints )
+        missing = da.isnan( data ).any( axis=0 )
+        anomalies = da.where( missing, 0.0, data )
+        if center: anomalies = anomalies - anomalies.mean( axis=0 )
+        if weights is not None: anomalies = anomalies * da.from_array( np.asarray( weights, dtype=np.float64 ) )
+        total = ( anomalies * anomalies ).sum()
+        if method == "tsqr" and maxBlockBytes and self.blockBytes( anomalies ) > maxBlockBytes:
+            self.logger.warning( f"EofSolver: tsqr blocks of {self.blockBytes( anomalies )/1e6:.0f} MB exceed {maxBlockBytes/1e6:.0f} MB, using the randomized SVD" )
+            method = "randomized"
+        self.method = method
+        u, s, v = self.svd( anomalies, method, iterations, seed )
+        self.logger.info( f"EofSolver: {method} SVD of a {nTimes} x {nPoints} matrix with chunks {data.chunksize}, {self.nModes} modes" )
+        u, s, v, total, missing = dask.compute( u[:, :self.nModes], s[:self.nModes], v[:self.nModes], total, missing )
+        signs = np.sign( v[ np.arange( self.nModes ), np.abs( v ).argmax( axis=1 ) ] )
+        signs[ signs == 0 ] = 1.0
+        self._eofs = np.where( missing, np.nan, v * signs[:,None] )
+        self._pcs = u * ( s * signs )
+        self._eigenvalues = s * s / max( nTimes - 1, 1 )
+        self._fractions = s * s / total if total > 0 else np.full( self.nModes, np.nan )
+
+    @staticmethod
+    def blockBytes( anomalies: da.Array ) -> int:
+        # Size of the largest block of the tsqr rechunking: the full short axis by at least as many rows along the long axis.
+        short, long = sorted( anomalies.shape )
+        chunk = anomalies.chunksize[ 1 if anomalies.shape[0] < anomalies.shape[1] else 0 ]
+        return min( max( chunk, short ), long ) * short * anomalies.dtype.itemsize
+
+    def svd( self, anomalies: da.Array, method: str, iterations: int, seed: int ) -> Tuple[da.Array,da.Array,da.Array]:
+        if method == "randomized":
+            return da.linalg.svd_compressed( anomalies, self.nModes, n_power_iter=iterations, seed=seed )
+        transpose = anomalies.shape[0] < anomalies.shape[1]
+        tall = anomalies.T if transpose else anomalies
+        tall = tall.rechunk( { 0: max( tall.chunksize[0], tall.shape[1] ), 1: -1 } )      # QR blocks must be at least as tall as they are wide
+        u, s, v = da.linalg.svd( tall )
+        return ( v.T, s, u.T ) if transpose else ( u, s, v )
+
+    def eofs( self ) -> np.ndarray:
+        return self._eofs
+
+    def pcs( self ) -> np.ndarray:
+        return self._pcs
+
+    def eigenvalues( self ) -> np.ndarray:
+        return self._eigenvalues
+
+    def varianceFraction( self ) -> np.ndarray:
+        return self._fractions
@@ -0,0 +1,153 @@
+import os, threading
+import netCDF4
+import xarray as xr
+from contextlib import contextmanager, nullcontext
+from collections import OrderedDict, deque
+from typing import Dict, List, Iterator, Any, Optional, Iterable
+from xarray.backends import NetCDF4DataStore, BackendEntrypoint
+from xarray.backends.netCDF4_ import NETCDF4_PYTHON_LOCK
+from xarray.backends.store import StoreBackendEntrypoint
+from xarray.backends.file_manager import FileManager
+from xarray.backends.locks import HDF5_LOCK
+from edas.config import EdasEnv
+from edas.util.logging import EDASLogger
+
+class HandlePool:
+    # Per-process (i.e. per dask worker) LRU pool of open netCDF4 datasets, keyed by path and invalidated when the file's
+    # mtime changes.  Handles are reference counted: an evicted or invalidated handle is closed when its last user releases it.
+    # The pool's bookkeeping has its own lock; HDF5 calls ( open/close here, reads in the callers, see readLock ) take
+    # xarray's HDF5 lock, since HDF5 builds are usually not thread-safe, unless handle.pool.lock is false ( thread-safe
+    # HDF5 builds ), in which case reads in a process run concurrently.
+    # The xarray read paths ( open_mfdataset / open_dataset with engine=PooledNetCDF4Backend ) take their handles from the
+    # pool too, through PooledFile, so datasets opened by successive requests share the process's handles.
+
+    def __init__( self, maxHandles: int, lock: bool = True ):
+        self.logger = EDASLogger.getLogger()
+        self.maxHandles = maxHandles
+        self.readLock = HDF5_LOCK if lock else nullcontext()
+        self._lock = threading.Lock()
+        self._handles: "OrderedDict[str,List]" = OrderedDict()      # path -> [ mtime, dataset, references ]
+        self._deferred: deque = deque()                              # references dropped by garbage collected PooledFiles
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def acquire( self, path: str ) -> List:
+        # The pool entry of the file ( opened if needed ), with a reference for the caller, to be dropped by release.
+        mtime = os.stat( path ).st_mtime_ns
+        with self._lock:
+            self._releaseDeferred()
+            entry = self._handles.get( path )
+            if entry is not None and entry[0] != mtime:
+                self._release( self._handles.pop( path ) )
+                self.invalidations += 1
+                entry = None
+            if entry is not None:
+                self.hits += 1
+                self._handles.move_to_end( path )
+                entry[2] += 1
+        if entry is None:
+            with self.readLock: dataset = netCDF4.Dataset( path )
+            entry = [ mtime, dataset, 1 ]
+            with self._lock:
+                self.misses += 1
+                if self.maxHandles > 0 and path not in self._handles:
+                    self._handles[path] = entry
+                    entry[2] += 1
+                while len( self._handles ) > max( self.maxHandles, 0 ):
+                    self._release( self._handles.popitem( last=False )[1] )
+                    self.evictions += 1
+        return entry
+
+    def release( self, entry: List ):
+        with self._lock: self._release( entry )
+
+    def defer( self, entry: List ):
+        # Drops a reference without taking any lock ( from __del__ ): it is released by the next acquire.
+        self._deferred.append( entry )
+
+    @contextmanager
+    def open( self, path: str ) -> Iterator[netCDF4.Dataset]:
+        entry = self.acquire( path )
+        try:
+            yield entry[1]
+        finally:
+            self.release( entry )
+
+    def _release( self, entry: List ):
+        # Drops a reference ( the pool's or a user's, with the pool lock held ) and closes the handle after the last one.
+        entry[2] -= 1
+        if entry[2] == 0:
+            try:
+                with self.readLock: entry[1].close()
+            except Exception as err: self.logger.warning( f"Error closing pooled handle: {err}" )
+
+    def _releaseDeferred(self):
+        while self._deferred: self._release( self._deferred.popleft() )
+
+    def clear(self):
+        with self._lock:
+            self._releaseDeferred()
+            while self._handles: self._release( self._handles.popitem()[1] )
+
+    def stats(self) -> Dict[str,Any]:
+        requests = self.hits + self.misses
+        return dict( pid=os.getpid(), handles=len(self._handles), maxHandles=self.maxHandles, hits=self.hits, misses=self.misses,
+                     invalidations=self.invalidations, evictions=self.evictions, hitRate=( self.hits / requests if requests else 0.0 ) )
+
+HandlePoolMgr = HandlePool( int( EdasEnv.get( "handle.pool.size", 128 ) ), EdasEnv.getBool( "handle.pool.lock", True ) )
+
+class PooledFile( FileManager ):
+    # xarray file manager of a netCDF file whose handle comes from the HandlePool of the process it is used in.  The handle
+    # is checked out of the pool on first use, and again once the file is modified; the manager keeps its reference until
+    # then, or until it is closed or garbage collected, so the pool doesn't close a handle in use.  Pickled by path: on a
+    # worker it uses the worker's pool.
+
+    def __init__( self, path: str ):
+        self.path = path
+        self._entry: Optional[List] = None
+        self._lock = threading.Lock()
+
+    def acquire( self, needs_lock: bool = True ) -> netCDF4.Dataset:
+        entry = self._entry
+        if entry is not None and entry[0] == os.stat( self.path ).st_mtime_ns: return entry[1]
+        entry = HandlePoolMgr.acquire( self.path )
+        with self._lock: previous, self._entry = self._entry, entry
+        if previous is not None: HandlePoolMgr.release( previous )
+        return entry[1]
+
+    @contextmanager
+    def acquire_context( self, needs_lock: bool = True ) -> Iterator[netCDF4.Dataset]:
+        yield self.acquire( needs_lock )
+
+    def close( self, needs_lock: bool = True ):
+        with self._lock: entry, self._entry = self._entry, None
+        if entry is not None: HandlePoolMgr.release( entry )
+
+    def __del__(self):
+        if self._entry is not None: HandlePoolMgr.defer( self._entry )
+
+    def __getstate__(self): return self.path
+    def __setstate__( self, path: str ): self.__init__( path )
+
+class PooledNetCDF4Backend( BackendEntrypoint ):
+    # The netCDF4 backend reading through the HandlePool ( see PooledFile ): xr.open_mfdataset( paths, engine=PooledNetCDF4Backend ).
+
+    description = "netCDF4 files read through the EDAS handle pool"
+    open_dataset_parameters = ( "filename_or_obj", "mask_and_scale", "decode_times", "concat_characters", "decode_coords", "drop_variables", "use_cftime", "decode_timedelta", "group" )
+
+    def open_dataset( self, filename_or_obj, *, mask_and_scale=True, decode_times=True, concat_characters=True, decode_coords=True,
+                      drop_variables: Optional[Iterable[str]] = None, use_cftime=None, decode_timedelta=None, group: Optional[str] = None ) -> xr.Dataset:
+        path = os.path.abspath( os.fspath( filename_or_obj ) )
+        store = NetCDF4DataStore( PooledFile( path ), group=group, mode="r", lock=NETCDF4_PYTHON_LOCK if HandlePoolMgr.readLock is HDF5_LOCK else False )
+        try:
+            return StoreBackendEntrypoint().open_dataset( store, mask_and_scale=mask_and_scale, decode_times=decode_times, concat_characters=concat_characters,
+                                                          decode_coords=decode_coords, drop_variables=drop_variables, use_cftime=use_cftime, decode_timedelta=decode_timedelta )
+        except Exception:
+            store.close()
+            raise
+
+def handlePoolStats() -> Dict[str,Any]:
+    # Usable with distributed Client.run to collect the stats of each worker's pool.
+    return HandlePoolMgr.stats()
@@ -0,0 +1,148 @@
+import os, time, json, hashlib, threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+from edas.config import EdasEnv
+from edas.portal.parsers import SizeParser
+from edas.collection.agg import Collection
+from edas.process.source import SourceType
+from edas.process.operation import WorkflowNode, SourceNode, OpNode, MasterNode
+from edas.process.task import TaskRequest
+from edas.workflow.data import EDASDataset, EDASDatasetCollection
+from edas.util.logging import EDASLogger
+
+class ResultMemo:
+    # Cross-request, content-addressed cache of sub-workflow results.  The key of an operation node hashes its kernel name,
+    # parameters ( including axes ), domain bounds, connectors ( whose names become the result array names ) and inputs;
+    # the key of a source node hashes the data source, variable names, domain bounds and offset.  Subtrees reading cached
+    # inputs are not memoized.  The catalog and data files that a subtree reads ( collection spec and .ag1 files, file and
+    # zarr sources ) are stat'ed on lookup, so results are invalidated when an aggregation changes.  Results are only stored
+    # ( and persisted ) for keys computed before: the first time a subtree runs, only its key is recorded.  Entries expire
+    # after 'memo.ttl' seconds and the least recently used are evicted beyond 'memo.size.max' bytes ( default 0: disabled ).
+
+    LocalParms = { "input", "result", "name", "id", "domain", "epa" }
+    MaxSeen = 10000         # keys recorded for subtrees computed once
+
+    def __init__( self, maxSize: int, ttl: float ):
+        self.logger = EDASLogger.getLogger()
+        self.maxSize = maxSize
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[str,Dict[str,Any]]" = OrderedDict()
+        self._seen: "OrderedDict[str,None]" = OrderedDict()
+        self.currentSize = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxSize > 0
+
+    @classmethod
+    def parms( cls, node: WorkflowNode ) -> Dict[str,str]:
+        return { key: str(value) for key, value in node.metadata.items() if key not in cls.LocalParms }
+
+    @staticmethod
+    def domain( request: TaskRequest, name: Optional[str] ) -> str:
+        domain = request.operationManager.domains.domains.get( name ) if name else None
+        return domain.signature if domain is not None else ""
+
+    def describe( self, request: TaskRequest, node: WorkflowNode, paths: List[str] ) -> Optional[Dict[str,Any]]:
+        # Canonical description of the subtree rooted at node ( None if it can't be memoized ); adds the files it depends on to paths.
+        if isinstance( node, SourceNode ):
+            if node.metadata.get( "cache" ): return None
+            source = node.varSource.dataSource
+            if source.type == SourceType.collection:
+                collection = Collection.new( source.address )
+                paths.append( collection.spec )
+                for aggId in { collection.getAggId( name ) for name in node.varSource.names() }:
+                    if aggId: paths.append( os.path.join( Collection.baseDir, aggId + ".ag1" ) )
+            elif source.type in [ SourceType.file, SourceType.zarr ]: paths.append( source.address )
+            elif source.type != SourceType.dap: return None
+            return dict( source=[ source.type.name, source.address, source.auth ], vars=node.varSource.names(), domain=self.domain( request, node.domain ),
+                         offset=str( node.offset ), parms=self.parms( node ), outputs=node.outputs )
+        if isinstance( node, MasterNode ) or not isinstance( node, OpNode ): return None
+        inputs = [ self.describe( request, inputNode, paths ) for inputNode in node.inputNodes ]
+        if any( input is None for input in inputs ): return None
+        connectors = [ [ connector.output, list( connector.inputs ) ] for connector in node.connectors ]
+        return dict( kernel=node.name, parms=self.parms( node ), domain=self.domain( request, node.domain ), connectors=connectors,
+                     inputs=sorted( inputs, key=lambda input: json.dumps( input, sort_keys=True, default=str ) ) )
+
+    def key( self, request: TaskRequest, node: WorkflowNode ) -> Tuple[Optional[str],List[str]]:
+        # Content hash of the subtree rooted at node, and the files it depends on.
+        if not self.enabled: return None, []
+        paths: List[str] = []
+        description = self.describe( request, node, paths )
+        if description is None: return None, []
+        return hashlib.sha1( json.dumps( description, sort_keys=True, default=str ).encode() ).hexdigest(), sorted( set( paths ) )
+
+    @staticmethod
+    def stamps( paths: List[str] ) -> List[Optional[Tuple[int,int]]]:
+        stamps = []
+        for path in paths:
+            try:
+                stat = os.stat( path )
+                stamps.append( ( stat.st_mtime_ns, stat.st_size ) )
+            except OSError: stamps.append( None )
+        return stamps
+
+    def get( self, key: Optional[str], paths: List[str], request: TaskRequest ) -> Optional[EDASDatasetCollection]:
+        if key is None: return None
+        with self._lock:
+            entry = self._entries.get( key )
+            if entry is None:
+                self.misses += 1
+                return None
+            if ( time.time() - entry["created"] > self.ttl ) or ( entry["stamps"] != self.stamps( paths ) ):
+                self._remove( key )
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end( key )
+            self.hits += 1
+        results = EDASDatasetCollection( "ResultMemo-" + key[:8] )
+        for dsKey, dset in entry["results"].items():
+            results[dsKey] = EDASDataset( OrderedDict( dset.arrayMap ), { **dset.attrs, "proj": request.project, "exp": request.experiment, "uid": str( request.uid ) } )
+        self.logger.info( f"ResultMemo: reusing results {results.arrayIds} ( key {key[:8]}, {entry['nbytes']} bytes )" )
+        return results
+
+    def put( self, key: Optional[str], paths: List[str], results: EDASDatasetCollection ):
+        if key is None: return
+        nbytes = sum( array.bsize for array in results.arrays )
+        if nbytes > self.maxSize or not self.seen( key ): return
+        stamps = self.stamps( paths )
+        for dsKey, dset in results.items(): dset.persist()
+        with self._lock:
+            if key in self._entries: self._remove( key )
+            for oldKey in list( self._entries.keys() ):
+                if self.currentSize + nbytes <= self.maxSize: break
+                self._remove( oldKey )
+                self.evictions += 1
+            self._entries[key] = dict( results=OrderedDict( results.items() ), stamps=stamps, created=time.time(), nbytes=nbytes )
+            self.currentSize += nbytes
+
+    def seen( self, key: str ) -> bool:
+        # Records the key, returning whether it had been recorded before.
+        with self._lock:
+            seen = key in self._seen
+            self._seen[key] = None
+            self._seen.move_to_end( key )
+            if len( self._seen ) > self.MaxSeen: self._seen.popitem( last=False )
+            return seen
+
+    def _remove( self, key: str ):
+        self.currentSize -= self._entries.pop( key )["nbytes"]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._seen.clear()
+            self.currentSize = 0
+
+    def stats(self) -> Dict[str,Any]:
+        with self._lock:
+            return dict( entries=len(self._entries), nbytes=self.currentSize, maxSize=self.maxSize, hits=self.hits, misses=self.misses,
+                         evictions=self.evictions, invalidations=self.invalidations )
+
+ResultMemoMgr = ResultMemo( SizeParser.parse( EdasEnv.get( "memo.size.max", "0" ) ), float( EdasEnv.get( "memo.ttl", 600 ) ) )
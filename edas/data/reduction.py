@@ -0,0 +1,416 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+import dask.array as da
+from typing import Dict, List, Any, Optional, Tuple, Sequence
+from edas.util.logging import EDASLogger
+
+class GroupedStats:
+    # Fused grouped reduction over the time axis: any subset of the partials count ( of non-NaN values ), sum, M2 ( sum of
+    # squared deviations from the mean ), min and max is computed for every group in one pass over each time chunk, the
+    # per-chunk partials are combined across chunks ( tree reduction, with dask inputs; M2 with the Moments merge ), and the
+    # requested statistics are derived from them, so all statistics of an operation list share a single graph.  NaNs are
+    # skipped; bins without time steps ( resampling gaps ) are NaN, as in xarray.  Partials are accumulated in float64; std
+    # and var are population statistics ( ddof = 0 ), as xarray's defaults.
+
+    Partials = [ "count", "sum", "M2", "min", "max" ]
+    Requires = { "mean": { "count", "sum" }, "ave": { "count", "sum" }, "sum": { "sum" }, "count": { "count" }, "min": { "min", "count" }, "max": { "max", "count" },
+                 "std": { "count", "sum", "M2" }, "var": { "count", "sum", "M2" } }
+
+    def __init__( self, stats: List[str] ):
+        self.logger = EDASLogger.getLogger()
+        for stat in stats: assert stat in self.Requires, f"Unrecognised statistic: {stat}, supported statistics: {list(self.Requires.keys())}"
+        self.stats = stats
+        self.partials = [ partial for partial in self.Partials if any( partial in self.Requires[stat] for stat in stats ) ]
+
+    def chunkPartials( self, data: np.ndarray, codes: np.ndarray, ngroups: int ) -> np.ndarray:
+        # Partials ( shape: partial, group, *data.shape[1:] ) of one time chunk ( leading axis ); codes are the group index of
+        # each time step.  Each group's time steps are reduced as one contiguous slab ( time steps are reordered only if the
+        # groups aren't contiguous in the chunk, e.g. climatologies ).
+        result = np.empty( ( len(self.partials), ngroups ) + data.shape[1:], dtype=np.float64 )
+        for index, partial in enumerate( self.partials ): result[index] = self.identity( partial )
+        data = np.asarray( data )
+        member = codes >= 0
+        if not member.all(): data, codes = data[member], codes[member]
+        if len( codes ) == 0: return result
+        if np.any( np.diff( codes ) < 0 ):
+            order = np.argsort( codes, kind="stable" )
+            data, codes = data[order], codes[order]
+        starts = np.flatnonzero( np.diff( codes, prepend=-1 ) )
+        ends = np.append( starts[1:], len( codes ) )
+        lengths = ends - starts
+        run = np.flatnonzero( lengths == lengths.max() )
+        if len( run ) > 1 and run[-1] - run[0] + 1 == len( run ):
+            # A run of equal length groups ( e.g. the whole days of an hourly chunk ) is reduced in one reshaped slab.
+            start, end, length = starts[run[0]], ends[run[-1]], lengths[run[0]]
+            self.reduceSlab( result, data[start:end].reshape( ( len( run ), length ) + data.shape[1:] ), codes[ starts[run] ], axis=1 )
+            starts, ends = np.delete( starts, run ), np.delete( ends, run )
+        for start, end in zip( starts, ends ):
+            self.reduceSlab( result, data[start:end], codes[start], axis=0 )
+        return result
+
+    def reduceSlab( self, result: np.ndarray, slab: np.ndarray, groups: Any, axis: int ):
+        # Reduces slab along axis into the partials of groups; the NaN-skipping path is taken only for slabs with NaNs.
+        valid = None
+        if np.issubdtype( slab.dtype, np.floating ) and np.isnan( slab ).any():
+            valid = ~np.isnan( slab )
+            count, zeroed = valid.sum( axis=axis ), np.where( valid, slab, 0 )
+        else: count, zeroed = slab.shape[axis], slab
+        total = zeroed.sum( axis=axis, dtype=np.float64 )
+        for index, partial in enumerate( self.partials ):
+            if partial == "count":   result[index, groups] = count
+            elif partial == "sum":   result[index, groups] = total
+            elif partial == "M2":
+                with np.errstate( invalid="ignore", divide="ignore" ):
+                    deviation = slab.astype( np.float64 ) - np.expand_dims( np.where( count > 0, total / count, 0.0 ), axis )
+                if valid is not None: deviation = np.where( valid, deviation, 0.0 )
+                result[index, groups] = np.einsum( "i...,i...->...", deviation, deviation ) if axis == 0 else np.einsum( "gi...,gi...->g...", deviation, deviation )
+            elif partial == "min":   result[index, groups] = np.nan_to_num( np.fmin.reduce( slab, axis=axis ), nan=np.inf, posinf=np.inf, neginf=-np.inf )
+            else:                    result[index, groups] = np.nan_to_num( np.fmax.reduce( slab, axis=axis ), nan=-np.inf, posinf=np.inf, neginf=-np.inf )
+
+    def identity( self, partial: str ) -> float:
+        return np.inf if partial == "min" else ( -np.inf if partial == "max" else 0.0 )
+
+    def combine( self, pieces: Dict[str,List[da.Array]] ) -> Dict[str,da.Array]:
+        # Combines the partials of the chunks overlapping a range of groups.
+        if len( pieces[ self.partials[0] ] ) == 1: return { partial: values[0] for partial, values in pieces.items() }
+        stacked = { partial: da.stack( values ).rechunk( { 0: -1 } ) for partial, values in pieces.items() }
+        combined = {}
+        for partial, values in stacked.items():
+            if partial == "min":  combined[partial] = values.min( axis=0 )
+            elif partial == "max": combined[partial] = values.max( axis=0 )
+            elif partial == "M2": combined[partial] = da.map_blocks( self.mergeM2, stacked["count"], stacked["sum"], values, drop_axis=0, dtype=np.float64 )
+            else:                 combined[partial] = values.sum( axis=0 )
+        return combined
+
+    @staticmethod
+    def mergeM2( counts: np.ndarray, sums: np.ndarray, M2s: np.ndarray ) -> np.ndarray:
+        # M2 of the union of the stacked parts ( leading axis ), see Moments.merge.
+        with np.errstate( invalid="ignore", divide="ignore" ):
+            means = np.where( counts > 0, sums / counts, 0.0 )
+        return Moments( 2 ).merge( [ dict( n=n, mean=mean, M2=M2 ) for n, mean, M2 in zip( counts, means, M2s ) ] )["M2"]
+
+    def reduce( self, data: Any, codes: np.ndarray, ngroups: int ) -> Dict[str,Any]:
+        # Partials over the leading axis of a numpy or dask array, by partial name.  Each time chunk only produces the partials of
+        # the range of groups it touches; the group axis is then assembled from intervals, combining the chunks that overlap each.
+        if not isinstance( data, da.Array ): return dict( zip( self.partials, self.chunkPartials( np.asarray( data ), codes, ngroups ) ) )
+        bounds = np.cumsum( ( 0, ) + data.chunks[0] )
+        ranges = []
+        for start, end in zip( bounds[:-1], bounds[1:] ):
+            chunkCodes = codes[start:end][ codes[start:end] >= 0 ]
+            ranges.append( ( chunkCodes.min(), chunkCodes.max() + 1 ) if len( chunkCodes ) else ( 0, 1 ) )
+        def blockPartials( block: np.ndarray, block_info=None ) -> np.ndarray:
+            iChunk = block_info[0]["chunk-location"][0]
+            start, end = block_info[0]["array-location"][0]
+            chunkCodes = codes[start:end]
+            lo, hi = ranges[iChunk]
+            return self.chunkPartials( block, np.where( chunkCodes >= 0, chunkCodes - lo, -1 ), hi - lo )
+        sizes = tuple( int( hi - lo ) for lo, hi in ranges )
+        partials = data.map_blocks( blockPartials, new_axis=0, chunks=( ( len(self.partials), ), sizes ) + data.chunks[1:], dtype=np.float64, meta=np.array( (), dtype=np.float64 ) )
+        offsets = np.cumsum( ( 0, ) + sizes )
+        members = [ iChunk for iChunk, ( start, end ) in enumerate( zip( bounds[:-1], bounds[1:] ) ) if ( codes[start:end] >= 0 ).any() ]
+        edges = sorted( { 0, ngroups } | { int( ranges[iChunk][0] ) for iChunk in members } | { int( ranges[iChunk][1] ) for iChunk in members } )
+        result = { partial: [] for partial in self.partials }
+        for lo, hi in zip( edges[:-1], edges[1:] ):
+            overlapping = [ iChunk for iChunk in members if ranges[iChunk][0] <= lo and hi <= ranges[iChunk][1] ]
+            pieces = {}
+            for index, partial in enumerate( self.partials ):
+                if len( overlapping ) == 0:
+                    pieces[partial] = [ da.full( ( hi - lo, ) + data.shape[1:], self.identity( partial ), chunks=( hi - lo, ) + data.chunks[1:], dtype=np.float64 ) ]
+                else:
+                    pieces[partial] = [ partials[ index, offsets[iChunk] + lo - ranges[iChunk][0]: offsets[iChunk] + hi - ranges[iChunk][0] ] for iChunk in overlapping ]
+            for partial, combined in self.combine( pieces ).items(): result[partial].append( combined )
+        return { partial: da.concatenate( pieces, axis=0 ) for partial, pieces in result.items() }
+
+    def derive( self, partials: Dict[str,Any], members: np.ndarray, dtype: np.dtype ) -> Dict[str,Any]:
+        # Statistics from the combined partials, evaluated block by block; members is the number of time steps in each group.
+        first = partials[ self.partials[0] ]
+        empty = ( members == 0 ).reshape( ( -1, ) + ( 1, ) * ( first.ndim - 1 ) )
+        outDtype = dtype if np.issubdtype( dtype, np.floating ) else np.float64
+        values = [ partials[partial] for partial in self.partials ]
+        results = {}
+        for stat in self.stats:
+            resultDtype = np.float64 if stat == "count" else outDtype
+            if isinstance( first, da.Array ):
+                emptyBlocks = da.from_array( empty, chunks=( first.chunks[0], ) + ( 1, ) * ( first.ndim - 1 ) )
+                results[stat] = da.map_blocks( self.evaluate, emptyBlocks, *values, stat=stat, outDtype=resultDtype, chunks=first.chunks, dtype=resultDtype )
+            else: results[stat] = self.evaluate( empty, *values, stat=stat, outDtype=resultDtype )
+        return results
+
+    def evaluate( self, empty: np.ndarray, *values: np.ndarray, stat: str, outDtype: np.dtype ) -> np.ndarray:
+        # A statistic from one block of the partials ( in the order of self.partials ).
+        partials = dict( zip( self.partials, values ) )
+        count = partials.get( "count" )
+        with np.errstate( invalid="ignore", divide="ignore" ):
+            if stat in [ "mean", "ave" ]:    result = partials["sum"] / count
+            elif stat in [ "sum", "count" ]: result = partials[stat]
+            elif stat in [ "min", "max" ]:   result = np.where( count > 0, partials[stat], np.nan )
+            else:
+                var = partials["M2"] / count
+                result = var if stat == "var" else np.sqrt( var )
+        return np.where( empty, np.nan, result ).astype( outDtype )
+
+    def apply( self, array: xr.DataArray, groupDim: str, groups: Tuple[np.ndarray,np.ndarray,np.ndarray] ) -> Dict[str,xr.DataArray]:
+        # Reduces the 'time' dimension of array over groups ( labels, codes, members, see TimeBins ), one result per statistic.
+        array = array.transpose( "time", *[ dim for dim in array.dims if dim != "time" ] )
+        labels, codes, members = groups
+        partials = self.reduce( array.data, codes, len( labels ) )
+        otherDims = list( array.dims[1:] )
+        coords = { name: coord for name, coord in array.coords.items() if "time" not in coord.dims and name != "time" }
+        coords[groupDim] = labels
+        return { stat: xr.DataArray( data, dims=[ groupDim ] + otherDims, coords=coords, attrs=array.attrs, name=array.name )
+                 for stat, data in self.derive( partials, members, array.dtype ).items() }
+
+class TimeBins:
+    # Time groups for GroupedStats, as ( labels, codes = group index of each time step or -1, members = time steps per group ).
+    # On a regular datetime64 axis ( constant step, e.g. MERRA2's 24 steps/day, or monthly: consecutive months at the same
+    # day of month and time of day, e.g. monthly means stamped at the 1st or the 15th ), hourly, daily, monthly and annual bins and
+    # the hour/day/month/year climatology groups are computed by index arithmetic on the truncated timestamps; calendar
+    # month lengths come out as the boundaries of the truncated values.  Other axes and frequencies fall back to pandas
+    # ( xarray resample/groupby index lists ).
+
+    Resolutions = { "h": "h", "1h": "h", "H": "h", "1H": "h", "hour": "h", "D": "D", "1D": "D", "day": "D", "MS": "M", "1MS": "M", "month": "M",
+                    "YS": "Y", "1YS": "Y", "AS": "Y", "1AS": "Y", "year": "Y" }
+    Periods = [ "hour", "day", "month", "year" ]
+
+    @staticmethod
+    def regular( times: np.ndarray ) -> bool:
+        if not np.issubdtype( times.dtype, np.datetime64 ): return False
+        if len( times ) < 2: return len( times ) == 1
+        times = times.astype( "datetime64[ns]" )
+        steps = np.diff( times.astype( np.int64 ) )
+        if steps[0] > 0 and ( steps == steps[0] ).all(): return True
+        months = times.astype( "datetime64[M]" )
+        offsets = times - months.astype( "datetime64[ns]" )
+        return bool( ( np.diff( months.astype( np.int64 ) ) == 1 ).all() and ( offsets == offsets[0] ).all() )
+
+    @classmethod
+    def resample( cls, array: xr.DataArray, freq: str ) -> Tuple[np.ndarray,np.ndarray,np.ndarray]:
+        times = array.time.values
+        unit = cls.Resolutions.get( freq )
+        if unit is None or not cls.regular( times ):
+            resampled = array.resample( time=freq )
+            return cls.groups( resampled, len( times ), cls.resampleLabels( times, freq ) )
+        bins = times.astype( f"datetime64[{unit}]" )
+        codes = ( bins - bins[0] ).astype( np.int64 )
+        labels = ( bins[0] + np.arange( codes[-1] + 1 ) ).astype( "datetime64[ns]" )        # including empty bins, as pandas
+        return labels, codes, np.bincount( codes, minlength=len( labels ) )
+
+    @classmethod
+    def groupby( cls, array: xr.DataArray, period: str ) -> Tuple[np.ndarray,np.ndarray,np.ndarray]:
+        times = array.time.values
+        if period not in cls.Periods or not cls.regular( times ):
+            return cls.groups( array.groupby( "time." + period ), len( times ) )
+        if period == "year":    values = times.astype( "datetime64[Y]" ).astype( np.int64 ) + 1970
+        elif period == "month": values = times.astype( "datetime64[M]" ).astype( np.int64 ) % 12 + 1
+        elif period == "day":   values = ( times.astype( "datetime64[D]" ) - times.astype( "datetime64[M]" ) ).astype( np.int64 ) + 1
+        else:                   values = ( times.astype( "datetime64[h]" ) - times.astype( "datetime64[D]" ) ).astype( np.int64 )
+        offset = values.min()
+        counts = np.bincount( values - offset )
+        present = np.flatnonzero( counts )
+        lookup = np.full( len( counts ), -1, dtype=np.int64 )
+        lookup[ present ] = np.arange( len( present ) )
+        return present + offset, lookup[ values - offset ], counts[ present ]
+
+    @staticmethod
+    def groups( grouped: Any, size: int, fullLabels: Optional[np.ndarray] = None ) -> Tuple[np.ndarray,np.ndarray,np.ndarray]:
+        # Groups of an xarray groupby/resample object.
+        normalize = lambda label: pd.Timestamp( label ) if isinstance( label, np.datetime64 ) else label      # datetime64 units may differ
+        labels = list( grouped.groups.keys() ) if fullLabels is None else list( fullLabels )
+        position = { normalize( label ): index for index, label in enumerate( labels ) }
+        codes = np.full( size, -1, dtype=np.int64 )
+        for label, indices in grouped.groups.items(): codes[ indices ] = position[ normalize( label ) ]
+        members = np.bincount( codes[ codes >= 0 ], minlength=len( labels ) )
+        return np.asarray( labels ), codes, members
+
+    @staticmethod
+    def resampleLabels( times: np.ndarray, freq: str ) -> Optional[np.ndarray]:
+        # All bin labels of a resampling, including empty bins ( None for non-standard calendars ).
+        try: return pd.Series( np.zeros( len( times ) ), index=pd.DatetimeIndex( times ) ).resample( freq ).size().index.values
+        except ( TypeError, ValueError ): return None
+
+class Moments:
+    # Mergeable streaming moment accumulators: the count, mean and central moment sums M2 ( and M3, M4 for skewness and
+    # kurtosis ) of the non-NaN values of each chunk, computed in float64 with an exact two-pass over the chunk, then merged
+    # across chunks in dask's tree reduction with the pairwise update formulas of Chan et al. and Pebay ( generalised to any
+    # number of parts ).  Only accumulators are held in memory, so var/std/norm/anomaly stream over inputs that don't fit in
+    # the cluster.  Statistics are population statistics ( ddof = 0, as xarray ) unless ddof is given.
+
+    Names = [ "n", "mean", "M2", "M3", "M4" ]
+
+    def __init__( self, order: int = 2 ):
+        assert 2 <= order <= 4, f"Unsupported moment order: {order}"
+        self.order = order
+        self.names = self.Names[ : order + 1 ]
+
+    def chunk( self, x: np.ndarray, axis: Tuple[int,...], keepdims: bool = True, computing_meta: bool = False ) -> Dict[str,np.ndarray]:
+        if computing_meta: return x
+        x = np.asarray( x, dtype=np.float64 )
+        valid = ~np.isnan( x )
+        n = valid.sum( axis=axis, keepdims=True ).astype( np.float64 )
+        with np.errstate( invalid="ignore", divide="ignore" ):
+            mean = np.where( n > 0, np.where( valid, x, 0.0 ).sum( axis=axis, keepdims=True ) / n, 0.0 )
+        deviation = np.where( valid, x - mean, 0.0 )
+        accumulators = dict( n=n, mean=mean )
+        power = deviation * deviation
+        for order in range( 2, self.order + 1 ):
+            if order > 2: power = power * deviation
+            accumulators[ f"M{order}" ] = power.sum( axis=axis, keepdims=True )
+        return accumulators
+
+    @classmethod
+    def flatten( cls, parts: Any ) -> List[Dict[str,np.ndarray]]:
+        return [ part for item in parts for part in cls.flatten( item ) ] if isinstance( parts, list ) else [ parts ]
+
+    def merge( self, parts: Any, axis: Tuple[int,...] = (), keepdims: bool = True ) -> Dict[str,np.ndarray]:
+        # Merges any number of accumulator sets ( a nested list, as passed by dask's tree reduction ) into one.
+        parts = self.flatten( parts )
+        if len( parts ) == 1: return parts[0]
+        stacked = { name: np.stack( [ part[name] for part in parts ] ) for name in self.names }
+        ns = stacked["n"]
+        n = ns.sum( axis=0 )
+        with np.errstate( invalid="ignore", divide="ignore" ):
+            mean = np.where( n > 0, ( ns * stacked["mean"] ).sum( axis=0 ) / n, 0.0 )
+        delta = np.where( ns > 0, stacked["mean"] - mean, 0.0 )
+        merged = dict( n=n, mean=mean, M2=( stacked["M2"] + ns * delta**2 ).sum( axis=0 ) )
+        if self.order >= 3: merged["M3"] = ( stacked["M3"] + 3 * delta * stacked["M2"] + ns * delta**3 ).sum( axis=0 )
+        if self.order >= 4: merged["M4"] = ( stacked["M4"] + 4 * delta * stacked["M3"] + 6 * delta**2 * stacked["M2"] + ns * delta**4 ).sum( axis=0 )
+        return merged
+
+    def aggregate( self, parts: Any, axis: Tuple[int,...], keepdims: bool = True ) -> np.ndarray:
+        # The merged accumulators, packed along the ( single ) reduced axis.
+        merged = self.merge( parts )
+        return np.concatenate( [ merged[name] for name in self.names ], axis=axis[0] )
+
+    def accumulate( self, data: Any, axes: Sequence[int] ) -> Dict[str,Any]:
+        # Accumulators over axes of a numpy or dask array ( reduced axes removed ), by name.
+        axes = sorted( axis % data.ndim for axis in axes )
+        if not isinstance( data, da.Array ):
+            return { name: np.squeeze( value, axis=tuple( axes ) ) for name, value in self.chunk( data, tuple( axes ) ).items() }
+        if len( axes ) > 1:
+            data = da.moveaxis( data, axes, list( range( data.ndim - len( axes ), data.ndim ) ) )
+            data = data.reshape( data.shape[ : data.ndim - len( axes ) ] + ( -1, ) )
+            axes = [ data.ndim - 1 ]
+        packed = da.reduction( data, self.chunk, self.aggregate, combine=self.merge, axis=axes[0], keepdims=True, concatenate=False,
+                               output_size=len( self.names ), dtype=np.float64, meta=np.array( (), dtype=np.float64 ) )
+        return { name: da.take( packed, index, axis=axes[0] ) for index, name in enumerate( self.names ) }
+
+    Stats = [ "mean", "var", "std", "skew", "kurt" ]
+
+    @classmethod
+    def stat( cls, accumulators: Dict[str,Any], stat: str, ddof: int = 0 ) -> Any:
+        # A statistic of the accumulators, evaluated block by block for dask accumulators.
+        if stat not in cls.Stats: raise Exception( "Unrecognised moment statistic: " + stat )
+        names = [ name for name in cls.Names if name in accumulators ]
+        values = [ accumulators[name] for name in names ]
+        if isinstance( accumulators["n"], da.Array ): return da.map_blocks( cls.evaluate, *values, names=names, stat=stat, ddof=ddof, dtype=np.float64 )
+        return cls.evaluate( *values, names=names, stat=stat, ddof=ddof )
+
+    @staticmethod
+    def evaluate( *values: np.ndarray, names: List[str], stat: str, ddof: int ) -> np.ndarray:
+        accumulators = dict( zip( names, values ) )
+        n = accumulators["n"]
+        with np.errstate( invalid="ignore", divide="ignore" ):
+            if stat == "mean": return np.where( n > 0, accumulators["mean"], np.nan )
+            if stat in [ "var", "std" ]:
+                var = np.where( n - ddof > 0, accumulators["M2"] / ( n - ddof ), np.nan )
+                return var if stat == "var" else np.sqrt( var )
+            m2 = accumulators["M2"] / n
+            if stat == "skew": return np.where( m2 > 0, ( accumulators["M3"] / n ) / m2**1.5, np.nan )
+            return np.where( m2 > 0, ( accumulators["M4"] / n ) / m2**2 - 3.0, np.nan )
+
+class QuantileSketch:
+    # Mergeable per-cell quantile sketches ( a t-digest with a uniform scale function ): the non-NaN values of each grid cell
+    # are summarised by at most 'size' weighted centroids of consecutive ranks, plus the exact min and max.  Chunks are
+    # sketched independently and merged in dask's tree reduction by re-binning the concatenated centroids by cumulative
+    # weight; quantiles interpolate between centroid centres.  Each centroid holds about 1/size of the cell's values, so the
+    # rank error of a quantile is of the order of error = 1/size.  Cells with at most 'size' values are summarised exactly,
+    # and then agree with numpy's ( linear ) quantiles.  A sketch holds no more centroids than its most populated cell has
+    # values, so blocks shorter than 'size' along the reduced axes are not padded out to 'size' centroids per cell.
+
+    def __init__( self, quantiles: Sequence[float], error: float = 0.01 ):
+        assert all( 0.0 <= q <= 1.0 for q in quantiles ), f"Quantiles must lie in [0,1]: {list(quantiles)}"
+        assert 0.0 < error < 1.0, f"Quantile error bound must lie in (0,1): {error}"
+        self.quantiles = np.asarray( quantiles, dtype=np.float64 )
+        self.size = max( int( np.ceil( 1.0 / error ) ), 2 )
+
+    def compress( self, values: np.ndarray, weights: Optional[np.ndarray] = None ) -> Tuple[np.ndarray,np.ndarray]:
+        # Re-bins weighted values ( along the last axis, unit weights for non-NaN values if weights is None ) into at most
+        # 'size' centroids of equal cumulative weight.  Empty values are binned into a discarded overflow bin.  Fewer values
+        # than 'size' ( in the fullest cell, or in total for merged parts, which are then all exact ) keep one centroid each.
+        cells = int( np.prod( values.shape[:-1] ) )
+        with np.errstate( invalid="ignore", divide="ignore" ):
+            if weights is None:
+                values = np.sort( values, axis=-1 )
+                count = ( ~np.isnan( values ) ).sum( axis=-1, keepdims=True )
+                width = max( min( self.size, int( count.max( initial=0 ) ) ), 1 )
+                centres = np.arange( values.shape[-1] ) + 0.5
+                keep = centres < count
+                bins = centres * ( width / np.maximum( count, 1 ) )
+            else:
+                width = min( self.size, values.shape[-1] )
+                order = np.argsort( values, axis=-1, kind="stable" )          # merges the sorted runs of the parts' centroids
+                values = np.take_along_axis( values, order, axis=-1 )
+                weights = np.take_along_axis( weights, order, axis=-1 )
+                cumulative = np.cumsum( weights, axis=-1 )
+                keep = weights > 0
+                bins = ( cumulative - weights / 2 ) * ( width / cumulative[ ..., -1: ] )
+            index = np.where( keep, np.arange( cells ).reshape( values.shape[:-1] + (1,) ) * width + np.minimum( bins.astype( np.int64 ), width - 1 ), cells * width ).ravel()
+            shape = values.shape[:-1] + ( width, )
+            wsum = np.bincount( index, weights=None if weights is None else weights.ravel(), minlength=cells * width + 1 )[:-1].reshape( shape ).astype( np.float64 )
+            vsum = np.bincount( index, weights=( values if weights is None else weights * values ).ravel(), minlength=cells * width + 1 )[:-1].reshape( shape )
+            return np.where( wsum > 0, vsum / wsum, np.nan ), wsum
+
+    def chunk( self, x: np.ndarray, axis: Tuple[int,...], keepdims: bool = True, computing_meta: bool = False ) -> Dict[str,np.ndarray]:
+        # Sketch of the values of a block along axis ( removed from the sketch arrays ).
+        if computing_meta: return x
+        x = np.asarray( x, dtype=np.float64 )
+        axes = sorted( a % x.ndim for a in axis )
+        x = np.moveaxis( x, axes, list( range( x.ndim - len( axes ), x.ndim ) ) )
+        x = np.ascontiguousarray( x.reshape( x.shape[ : x.ndim - len( axes ) ] + ( -1, ) ) )
+        means, weights = self.compress( x )
+        valid = ~np.isnan( x )
+        return dict( means=means, weights=weights, min=np.where( valid, x, np.inf ).min( axis=-1 ), max=np.where( valid, x, -np.inf ).max( axis=-1 ) )
+
+    def merge( self, parts: Any, axis: Tuple[int,...] = (), keepdims: bool = True ) -> Dict[str,np.ndarray]:
+        parts = Moments.flatten( parts )
+        if len( parts ) == 1: return parts[0]
+        means, weights = self.compress( np.concatenate( [ part["means"] for part in parts ], axis=-1 ), np.concatenate( [ part["weights"] for part in parts ], axis=-1 ) )
+        return dict( means=means, weights=weights, min=np.min( [ part["min"] for part in parts ], axis=0 ), max=np.max( [ part["max"] for part in parts ], axis=0 ) )
+
+    def query( self, sketch: Dict[str,np.ndarray] ) -> np.ndarray:
+        # Quantiles of each cell, along a new last axis: linear interpolation of rank between the min ( rank 0 ), the centroid
+        # centres and the max ( rank n ), at rank q*(n-1)+1/2, which reproduces numpy's linear quantiles for unit-weight centroids.
+        order = np.argsort( sketch["weights"] == 0, axis=-1, kind="stable" )
+        weights = np.take_along_axis( sketch["weights"], order, axis=-1 )
+        total = weights.sum( axis=-1, keepdims=True )
+        empty = weights == 0
+        centres = np.where( empty, total, np.cumsum( weights, axis=-1 ) - weights / 2 )
+        means = np.where( empty, sketch["max"][...,None], np.take_along_axis( sketch["means"], order, axis=-1 ) )
+        ranks = np.concatenate( [ np.zeros_like( total ), centres, total ], axis=-1 )
+        values = np.concatenate( [ sketch["min"][...,None], means, sketch["max"][...,None] ], axis=-1 )
+        targets = self.quantiles * np.maximum( total - 1, 0 ) + 0.5
+        upper = np.clip( ( ranks[...,None,:] <= targets[...,:,None] ).sum( axis=-1 ), 1, ranks.shape[-1] - 1 )
+        r0, r1 = np.take_along_axis( ranks, upper - 1, axis=-1 ), np.take_along_axis( ranks, upper, axis=-1 )
+        v0, v1 = np.take_along_axis( values, upper - 1, axis=-1 ), np.take_along_axis( values, upper, axis=-1 )
+        with np.errstate( invalid="ignore", divide="ignore" ):
+            fraction = np.where( r1 > r0, np.clip( ( targets - r0 ) / ( r1 - r0 ), 0.0, 1.0 ), 0.0 )
+            return np.where( total > 0, v0 + fraction * ( v1 - v0 ), np.nan )
+
+    def aggregate( self, parts: Any, axis: Tuple[int,...], keepdims: bool = True ) -> np.ndarray:
+        # The quantiles of the merged sketch, packed along the ( single ) reduced axis.
+        return np.moveaxis( self.query( self.merge( parts ) ), -1, axis[0] )
+
+    def apply( self, data: Any, axes: Sequence[int] ) -> List[Any]:
+        # Approximate quantiles over axes of a numpy or dask array ( reduced axes removed ), in the order of self.quantiles.
+        axes = sorted( axis % data.ndim for axis in axes )
+        if not isinstance( data, da.Array ):
+            result = self.query( self.chunk( data, tuple( axes ) ) )
+            return [ result[...,index] for index in range( len( self.quantiles ) ) ]
+        if len( axes ) > 1:
+            data = da.moveaxis( data, axes, list( range( data.ndim - len( axes ), data.ndim ) ) )
+            data = data.reshape( data.shape[ : data.ndim - len( axes ) ] + ( -1, ) )
+            axes = [ data.ndim - 1 ]
+        packed = da.reduction( data, self.chunk, self.aggregate, combine=self.merge, axis=axes[0], keepdims=True, concatenate=False,
+                               output_size=len( self.quantiles ), dtype=np.float64, meta=np.array( (), dtype=np.float64 ) )
+        return [ da.take( packed, index, axis=axes[0] ) for index in range( len( self.quantiles ) ) ]
@@ -93,6 +93,9 @@ class EDASapp(EDASPortal):
             mtype = utilSpec[1].lower()
             health = self.processManager.getHealth(mtype)
             return Message( "health", mtype, health )
+        if uType.startswith( "cache" ):
+            info = edasOpManager.execCacheUtility( utilSpec )
+            return Message( "cache", self.elem( utilSpec, 1, "stats" ), json.dumps( info, default=str ) )
         return Message("","","")
 
     def getRunArgs( self, taskSpec: Sequence[str] )-> Dict[str,str]:
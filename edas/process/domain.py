@@ -285,6 +285,11 @@ class Domain:
     def slice( cls, axis: Axis, bounds: AxisBounds ) -> Tuple[str,slice]:
          return ( bounds.name if axis == Axis.UNKNOWN else axis.name.lower(), bounds.slice() )
 
+    @property
+    def signature(self) -> str:
+        # The bounds, independent of the domain's (request local) name.
+        return "; ".join( sorted( [ "{}:{}:{}:{}:{}".format( axis.name, b.start, b.end, b.step, b.system ) for axis, b in self.axisBounds.items() ] ) )
+
     def __str__(self):
         return "D({})[ {} ]".format( self.name, "; ".join( [ str(b) for b in self.axisBounds.values()] ) )
 
@@ -3,6 +3,8 @@ import zmq, traceback, time, logging, xml, socket, abc, dask, threading, request
 from edas.workflow.module import edasOpManager
 from edas.process.task import Job
 from edas.workflow.data import EDASDataset
+from edas.data.cache import EDASKCacheMgr
+from edas.collection.staging import StagingCacheMgr
 from dask.distributed import Client, Future, LocalCluster
 from stratus_endpoint.handler.base import Status
 from dask_jobqueue import SLURMCluster
@@ -68,6 +70,9 @@ class SubmissionThread(Thread):
             self.logger.error( "Execution error: " + str(err))
             self.logger.error( traceback.format_exc() )
             self.processFailure(err)
+        finally:
+            EDASKCacheMgr.release( self.job.requestId )
+            StagingCacheMgr.release( self.job.requestId )
 
 class ExecHandler(ExecHandlerBase):
 
@@ -408,6 +413,9 @@ class ProcessManager(GenericProcessManager):
     except Exception as err:
         self.logger.error( "Execution error: " + str(err))
         traceback.print_exc()
+    finally:
+        EDASKCacheMgr.release( job.requestId )
+        StagingCacheMgr.release( job.requestId )
 
 
   def submitProcess(self, service: str, job: Job, resultHandler: ExecHandler):
@@ -34,6 +34,11 @@ class Node:
         found = [value for id, value in self.metadata.items() if re.match(idmatch,id) ]
         return found[0] if len(found) else default
 
+    def getBool( self, key: str, default: bool ) -> bool:
+        rv = self.getParm( key )
+        if rv is None: return default
+        return str(rv).lower().startswith("t")
+
     def getParms(self, keys: List[str] ) -> Dict[str,Any]:
         return dict( filter( lambda item: item[0] in keys, self.metadata.items() ) )
 
@@ -12,6 +12,7 @@ class SourceType(Enum):
     dap = auto()
     file = auto()
     archive = auto()
+    zarr = auto()
 
 class DataSource:
 
@@ -62,6 +63,9 @@ class DataSource:
             elif scheme == "archive":
                 self.type = SourceType.archive
                 self.address = path
+            elif scheme == "zarr":
+                self.type = SourceType.zarr
+                self.address = path
             else:
                 raise Exception( "Unrecognized scheme '{}' in url: {}".format(scheme,_address) )
         else:
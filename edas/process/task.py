@@ -121,6 +121,14 @@ class TaskRequest:
       self._resultCache[ key ] = result
       return self
 
+  def withDomain( self, domain: Domain ) -> "TaskRequest":
+      # A view of the request that also knows domain, leaving the request's own domains unchanged.
+      operationManager = copy.copy( self.operationManager )
+      operationManager.domains = DomainManager( { **self.operationManager.domains.domains, domain.name: domain } )
+      request = copy.copy( self )
+      request.operationManager = operationManager
+      return request
+
   def intersectDomains(self, domainIds = Set[str], allow_broadcast: bool = True  ) -> str:
       return self.operationManager.domains.intersectDomains( domainIds, allow_broadcast )
 
@@ -133,18 +141,25 @@ class TaskRequest:
       return new_domain
 
   def cropBounds( self, axis: Axis, bound: AxisBounds, inputs: Iterable[EDASArray] ) -> AxisBounds:
+      # Crops the bounds to each input's coordinates: those of its coordinate window ( see edas.collection.coords ), if
+      # it has one for this axis, else the array's own coordinate.
       new_bounds: AxisBounds = bound
       for input in inputs:
-        coord: xa.DataArray = input.coord(axis)
-        if coord is not None and len( coord.shape ) > 0:
-            if (axis == Axis.T) and bound.isValueType and bound.start == bound.end:
-                index: pd.DatetimeIndex = coord.get_index("t")
-                loc = index.get_loc( bound.start, method="nearest" )
-                new_bounds = AxisBounds( "t", loc, loc+1, bound.step, "index", bound.metadata, bound._timeDelta )
-            else:
-                assert len( coord.shape ) == 1, f"Not currently supporting multi-dimensional axes: {coord.name}, shape: {coord.shape}"
-                values = coord.values
-                new_bounds = new_bounds.crop( axis, 0, len(coord.values)-1 ) if new_bounds.system.startswith("ind") else new_bounds.crop( axis, values[0], values[-1] )
+        window = input.coordWindow
+        if window is not None and window.has( axis.name.lower() ):
+            values = window.values( axis.name.lower() )
+            index: pd.Index = window.index( axis.name.lower() )
+        else:
+            coord: xa.DataArray = input.coord(axis)
+            if coord is None or len( coord.shape ) == 0: continue
+            assert len( coord.shape ) == 1, f"Not currently supporting multi-dimensional axes: {coord.name}, shape: {coord.shape}"
+            values = coord.values
+            index = coord.to_index()
+        if (axis == Axis.T) and bound.isValueType and bound.start == bound.end:
+            loc = int( index.get_indexer( [ pd.Timestamp( bound.start ) ], method="nearest" )[0] )
+            new_bounds = AxisBounds( "t", loc, loc+1, bound.step, "index", bound.metadata, bound._timeDelta )
+        else:
+            new_bounds = new_bounds.crop( axis, 0, len(values)-1 ) if new_bounds.system.startswith("ind") else new_bounds.crop( axis, values[0], values[-1] )
       return new_bounds
 
   def linkWorkflow(self) -> List[WorkflowNode]:
@@ -67,6 +67,9 @@ class EDASEndpoint(Endpoint):
         if uType.startswith( "var" ):
             if len( utilSpec ) <= 2: raise Exception( "Missing parameter(s) to getVariableSpec" )
             return self.getVariableSpec( utilSpec[1], utilSpec[2]  )
+        if uType.startswith( "cache" ):
+            info = edasOpManager.execCacheUtility( utilSpec )
+            return Message( "cache", self.elem( utilSpec, 1, "stats" ), json.dumps( info, default=str ) ).dict()
         return Message("","","").dict()
 
     def addHandler(self, submissionId, handler ):
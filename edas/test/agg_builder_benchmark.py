@@ -0,0 +1,41 @@
+import os, time, tempfile, shutil
+import netCDF4
+from edas.config import EdasEnv
+from edas.collection.agg import Aggregation
+from edas.collection.index import AggIndex
+from edas.collection.builder import AggBuilder
+from edas.collection.virtual import VirtualDataset
+from edas.test.file_aligned_chunks_benchmark import write_synthetic_collection, NFILES
+
+def add_day( work_dir: str, relpath: str ) -> str:
+    # Copies the last file of the collection, shifted forward by one day.
+    newpath = relpath.replace( ".nc", ".next.nc" )
+    shutil.copyfile( os.path.join( work_dir, relpath ), os.path.join( work_dir, newpath ) )
+    with netCDF4.Dataset( os.path.join( work_dir, newpath ), "a" ) as ds: ds.variables["time"][:] = ds.variables["time"][:] + 1440.0
+    return newpath
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    try:
+        EdasEnv.update( { "agg.index.dir": os.path.join( work_dir, "index" ) } )
+        reference = write_synthetic_collection( work_dir )
+        header, expected = AggIndex.parseFileRecords( reference )
+        agg_file = os.path.join( work_dir, "built.ag1" )
+        for nProcs in [ 1, 8 ]:
+            t0 = time.time()
+            AggBuilder( agg_file, work_dir, "*.nc", nProcs ).build()
+            print( f" Full build of {NFILES} files, {nProcs} procs: time = {time.time()-t0:.3f} sec" )
+        header, built = AggIndex.parseFileRecords( agg_file )
+        assert sorted( built.values() ) == sorted( expected.values() ), "Built file records don't match the reference aggregation"
+        last = max( built.values() )[2].decode()
+        add_day( work_dir, last )
+        t0 = time.time()
+        nAdded = AggBuilder( agg_file, work_dir, "*.nc", 8 ).build( incremental=True )
+        print( f" Incremental build: added {nAdded} files, time = {time.time()-t0:.3f} sec" )
+        assert nAdded == 1
+        agg = Aggregation( "bench", agg_file )
+        dset = VirtualDataset( agg ).open( ["tas"] )
+        print( f" Aggregation: {agg.nFiles} files, tas shape = {dict(dset.tas.sizes)}, time range = {dset.time.values[0]} - {dset.time.values[-1]}" )
+        assert agg.nFiles == NFILES + 1 and dset.tas.shape[0] == agg.getAxis("T").length
+    finally:
+        shutil.rmtree( work_dir )
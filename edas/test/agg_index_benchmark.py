@@ -0,0 +1,53 @@
+import os, time, tempfile, shutil
+from datetime import datetime, timezone
+from edas.config import EdasEnv
+from edas.collection.agg import Aggregation
+from edas.collection.index import AggIndex
+
+NFILES = 200000
+START_MINUTES = int( datetime( 1980, 1, 1, tzinfo=timezone.utc ).timestamp() / 60 )
+
+def write_synthetic_agg( agg_file: str, nfiles: int ):
+    with open( agg_file, "w" ) as f:
+        f.write( "P; base.path; /dass/pubrepo/MERRA2/hourly\n" )
+        f.write( "P; time.units; minutes since 1970-01-01T00:00:00Z\n" )
+        f.write( "A; time; time; T; {}; minutes since 1970-01-01T00:00:00Z; {}; {}\n".format( nfiles, START_MINUTES, START_MINUTES + 60 * (nfiles-1) ) )
+        f.write( "A; lat; latitude; Y; 361; degrees_north; -90.0; 90.0\n" )
+        f.write( "A; lon; longitude; X; 576; degrees_east; -180.0; 179.375\n" )
+        f.write( "C; time; {}\nC; lat; 361\nC; lon; 576\n".format( nfiles ) )
+        f.write( "V; tas; Surface air temperature; tas; Near-Surface Air Temperature; {},361,576; time:60.0,lat:0.5,lon:0.625; time lat lon; K\n".format( nfiles ) )
+        for iFile in range( nfiles ):
+            t = START_MINUTES + 60 * iFile
+            date = datetime.fromtimestamp( t*60, tz=timezone.utc )
+            f.write( "F; {}; 1; {}/MERRA2.tavg1_2d_slv_Nx.{}.nc4\n".format( t, date.strftime("%Y/%m"), date.strftime("%Y%m%d%H") ) )
+
+def timed( label: str, func ):
+    t0 = time.time()
+    result = func()
+    print( f" {label}: {time.time()-t0:.3f} sec" )
+    return result
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    try:
+        EdasEnv.update( { "agg.index.dir": os.path.join( work_dir, "index" ) } )
+        agg_file = os.path.join( work_dir, "merra2_tas_hourly.ag1" )
+        write_synthetic_agg( agg_file, NFILES )
+        print( f"Synthetic aggregation: {NFILES} files, {os.path.getsize(agg_file)/1.0e6:.1f} MB" )
+        start, end = datetime( 2000, 6, 1, tzinfo=timezone.utc ), datetime( 2000, 6, 30, tzinfo=timezone.utc )
+
+        EdasEnv.update( { "agg.index": "false" } )
+        agg = timed( "Text parse (File objects)", lambda: Aggregation( "bench", agg_file ) )
+        legacy_paths = timed( "   periodPathList (text)", lambda: agg.periodPathList( start, end ) )
+
+        EdasEnv.update( { "agg.index": "true" } )
+        timed( "Index build (cold)", lambda: AggIndex.build( agg_file ) )
+        agg = timed( "Index load (warm, mmap)", lambda: Aggregation( "bench", agg_file ) )
+        paths = timed( "   periodPathList (index)", lambda: agg.periodPathList( start, end ) )
+        timed( "   pathList (index)", lambda: agg.pathList() )
+        timed( "   getChunkSize (index)", lambda: agg.getChunkSize( 250, len(paths) ) )
+        assert paths == legacy_paths, "Index and text parse produce different path lists"
+        inner = agg.periodPathList( datetime( 2000, 6, 1, 0, 10, tzinfo=timezone.utc ), datetime( 2000, 6, 1, 0, 40, tzinfo=timezone.utc ) )
+        assert len( inner ) == 1, "A window inside a single file should select that file"
+    finally:
+        shutil.rmtree( work_dir )
@@ -0,0 +1,105 @@
+import time, random, threading, tempfile, shutil
+import numpy as np
+import xarray as xr
+from edas.workflow.data import EDASArray
+from edas.data.cache import CacheManager, SpillCache
+from edas.process.domain import Domain
+
+NTHREADS, NOPS, NKEYS = 8, 20000, 64
+
+def newArray( name: str, dtype, size: int ) -> EDASArray:
+    return EDASArray( name, None, xr.DataArray( np.zeros( size, dtype=dtype ), dims=["x"] ) )
+
+def check( cache: CacheManager ):
+    assert cache.currentSize == sum( array.bsize for array in cache.arrayCache.values() ), "Cache size accounting is inconsistent"
+    assert cache.currentSize <= cache.maxSize, "Cache exceeds its max size"
+
+if __name__ == "__main__":
+    cache = CacheManager()
+    cache.maxSize = 1000000
+    for dtype, expected in [ ( np.float64, 800000 ), ( np.float32, 400000 ), ( np.int16, 200000 ) ]:
+        assert newArray( "a", dtype, 100000 ).bsize == expected, f"Wrong size for {dtype}"
+
+    # LRU order follows access, and pinned entries are not evicted.
+    for key in "abcd": cache.cache( key, newArray( key, np.float64, 25000 ) )      # 200 KB each
+    cache.get( "a" )
+    cache.get( "b", owner="request-1" )
+    cache.cache( "e", newArray( "e", np.float64, 50000 ) )                          # 400 KB: evicts c
+    assert sorted( cache.arrayCache.keys() ) == [ "a", "b", "d", "e" ], f"Unexpected LRU evictions: {list(cache.arrayCache.keys())}"
+    cache.cache( "f", newArray( "f", np.float64, 50000 ) )                          # evicts d, a ( b is pinned )
+    assert sorted( cache.arrayCache.keys() ) == [ "b", "e", "f" ], f"Pinned entry evicted: {list(cache.arrayCache.keys())}"
+    cache.release( "request-1" )
+    cache.cache( "g", newArray( "g", np.float64, 25000 ) )                          # evicts b
+    assert "b" not in cache, "Released entry should be evictable"
+    check( cache )
+
+    # Arrays cached under a bare id ( no domain ) serve requests for any domain of that id.
+    domain = Domain.new( dict( name="d1", lat=dict( start=10, end=20, system="values" ) ) )
+    variable, missing = cache.findRegion( "g", domain )
+    assert variable is not None and missing is None, "Bare id fallback failed"
+
+    # Concurrent cache / get / delete from several request threads.
+    cache = CacheManager()
+    cache.maxSize = 4000000
+    errors = []
+    def worker( index: int ):
+        rand = random.Random( index )
+        try:
+            for iOp in range( NOPS ):
+                key = str( rand.randrange( NKEYS ) )
+                op = rand.random()
+                if op < 0.3: cache.cache( key, newArray( key, rand.choice( [ np.float32, np.float64 ] ), rand.randrange( 1000, 100000 ) ) )
+                elif op < 0.95: cache.get( key, owner=f"request-{index}" if op < 0.4 else None )
+                else:
+                    try: del cache[key]
+                    except KeyError: pass
+                if iOp % 20 == 0: cache.release( f"request-{index}" )
+            cache.release( f"request-{index}" )
+        except Exception as err: errors.append( err )
+    t0 = time.time()
+    threads = [ threading.Thread( target=worker, args=(index,) ) for index in range( NTHREADS ) ]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert not errors, f"Errors in worker threads: {errors}"
+    check( cache )
+    print( f" {NTHREADS} threads x {NOPS} ops: {time.time()-t0:.3f} sec, stats = {cache.stats()}" )
+
+    # Disk tier: evicted arrays are spilled and faulted back in lazily, also after a restart ( new CacheManager ).
+    spill_dir = tempfile.mkdtemp()
+    try:
+        cache = CacheManager()
+        cache.maxSize = 2000000
+        cache.spillCache = SpillCache( spill_dir, 3000000 )
+        times = np.arange( "2000-01-01", "2000-01-11", dtype="datetime64[D]" ).astype( "datetime64[ns]" )
+        arrays = { f"roi{index}": EDASArray( f"tas{index}", "d0", xr.DataArray( np.random.rand( 10, 100, 100 ), dims=["t","y","x"], coords=dict( t=times, y=np.arange(100.0), x=np.arange(100.0) ) ) ) for index in range( 6 ) }
+        for key, array in arrays.items(): cache.cache( key, array )       # 800 KB each: roi0 .. roi3 are spilled, compressed on disk
+        check( cache )
+        cache.waitForSpills()
+        assert cache.spillCache.stats()["spills"] == 4, f"Unexpected spills: {cache.spillCache.stats()}"
+        for restart in [ False, True ]:
+            if restart:
+                cache.spillCache.flush()        # as at exit
+                cache = CacheManager()
+                cache.spillCache = SpillCache( spill_dir, 3000000 )
+            t0 = time.time()
+            for key, array in arrays.items():
+                cached = cache.get( key )
+                if cached is None: continue
+                assert cached.xr.equals( array.xr ), f"Spilled array {key} doesn't match the original"
+            if not restart: assert cache.spillCache._dirty, "Spill index rewritten on every hit"
+            print( f" Spill tier{' after restart' if restart else ''}: faulted in {cache.spillCache.hits} arrays, time = {time.time()-t0:.3f} sec, stats = {cache.spillCache.stats()}" )
+        assert cache.spillCache.currentSize <= cache.spillCache.maxSize, "Spill tier exceeds its quota"
+
+        # The regions of spilled arrays are saved with the spill index, so sub-regions are still served after a restart.
+        bounds = lambda name, lo, hi: Domain.new( dict( name=name, lat=dict( start=lo, end=hi, system="values" ), lon=dict( start=lo, end=hi, system="values" ) ) )
+        cache.maxSize = 2000000
+        cache.cacheRegion( "tas", bounds( "d2", 0, 99 ), arrays["roi0"] )
+        for key in [ "roi4", "roi5" ]: cache.cache( key, arrays[key] )       # spills the region
+        cache.waitForSpills()
+        cache.spillCache.flush()
+        cache = CacheManager()
+        cache.spillCache = SpillCache( spill_dir, 3000000 )
+        variable, missing = cache.findRegion( "tas", bounds( "d3", 10, 20 ) )
+        assert variable is not None and missing is None and variable.xr.equals( arrays["roi0"].xr ), "Spilled region not restored"
+    finally:
+        shutil.rmtree( spill_dir )
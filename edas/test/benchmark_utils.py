@@ -0,0 +1,25 @@
+import time, resource
+import numpy as np
+import pandas as pd
+import xarray as xr
+import dask.array as da
+
+# Scaffolding shared by the reduction benchmarks: a lazily generated ( time x lat x lon ) float32 field, chunked along
+# time, and timing / peak memory helpers.  Peak RSS is per process, so benchmarks run the low-memory method first.
+
+def synthetic_input( nsteps: int, nlat: int, nlon: int, chunk: int, start: str = "1990-01-01", freq: str = "h", name: str = "tas",
+                     offset: float = 0.0, distribution: str = "normal", timeDim: str = "t" ) -> xr.DataArray:
+    random = da.random.RandomState( 0 )
+    shape, chunks = ( nsteps, nlat, nlon ), ( chunk, nlat, nlon )
+    data = random.gamma( 2.0, size=shape, chunks=chunks ) if distribution == "gamma" else random.standard_normal( shape, chunks=chunks )
+    coords = { timeDim: pd.date_range( start, periods=nsteps, freq=freq ), "y": np.linspace( -80.0, 80.0, nlat ), "x": np.linspace( -175.0, 175.0, nlon ) }
+    return xr.DataArray( data.astype( np.float32 ) + np.float32( offset ), dims=( timeDim, "y", "x" ), coords=coords, name=name )
+
+def peak_rss_mb() -> float:
+    return resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss / 1024.0
+
+def timed( function, *args, **kwargs ):
+    # The function's result and its run time in seconds.
+    t0 = time.time()
+    result = function( *args, **kwargs )
+    return result, time.time() - t0
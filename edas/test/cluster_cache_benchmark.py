@@ -0,0 +1,56 @@
+import time, multiprocessing
+import numpy as np
+import xarray as xr
+import dask.array as da
+from distributed import Client, LocalCluster
+from edas.workflow.data import EDASArray
+from edas.data.cache import ClusterCache
+
+NBYTES = 8 * 40 * 200 * 200
+
+def slowRead( block: np.ndarray ) -> np.ndarray:
+    time.sleep( 0.2 )      # stands in for reading the ROI from the archive
+    return block + 1.0
+
+def newRoi( index: int ) -> EDASArray:
+    data = da.zeros( ( 40, 200, 200 ), chunks=( 10, 200, 200 ) ).map_blocks( slowRead, dtype=np.float64 ) * index
+    return EDASArray( f"roi{index}", "d0", xr.DataArray( data, dims=["t","y","x"], name=f"roi{index}" ) )
+
+def otherEndpoint( address: str, results ):
+    # A second endpoint process connected to the same scheduler reuses the cached ROI.
+    with Client( address ):
+        cache = ClusterCache( True, 10 * NBYTES )
+        t0 = time.time()
+        array = cache.get( "roi1|d0" )
+        results.put( ( None if array is None else float( array.xr.mean().values ), time.time() - t0 ) )
+
+def workerKeys( client: Client ) -> int:
+    return sum( client.run( lambda dask_worker: len( dask_worker.data ) ).values() )
+
+if __name__ == "__main__":
+    with LocalCluster( n_workers=2, threads_per_worker=2 ) as cluster, Client( cluster ) as client:
+        cache = ClusterCache( True, 2 * NBYTES )
+        t0 = time.time()
+        expected = float( newRoi( 1 ).xr.mean().values )
+        print( f" Uncached ROI read: {time.time()-t0:.3f} sec" )
+        cache.cache( "roi1|d0", newRoi( 1 ) )
+        client.wait_for_workers( 2 )
+        time.sleep( 1.0 )
+        print( f" Published roi1, worker keys = {workerKeys(client)}" )
+
+        results = multiprocessing.get_context( "spawn" ).Queue()
+        process = multiprocessing.get_context( "spawn" ).Process( target=otherEndpoint, args=( cluster.scheduler_address, results ) )
+        process.start()
+        value, elapsed = results.get( timeout=120 )
+        process.join()
+        assert value is not None and abs( value - expected ) < 1.0e-9, f"Cached ROI from another process doesn't match: {value} vs {expected}"
+        print( f" Cached ROI read from another endpoint process: {elapsed:.3f} sec" )
+
+        for index in [ 2, 3 ]: cache.cache( f"roi{index}|d0", newRoi( index ) )      # evicts roi1
+        time.sleep( 1.0 )
+        assert cache.get( "roi1|d0" ) is None, "roi1 should have been evicted"
+        assert sorted( cache.keys() ) == [ "roi2|d0", "roi3|d0" ], f"Unexpected cached keys: {cache.keys()}"
+        print( f" After eviction: worker keys = {workerKeys(client)}, stats = {cache.stats()}" )
+        for key in cache.keys(): cache.remove( key )
+        time.sleep( 1.0 )
+        print( f" After removing all entries: worker keys = {workerKeys(client)}" )
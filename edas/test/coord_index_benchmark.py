@@ -0,0 +1,51 @@
+import os, time, tempfile, shutil
+import numpy as np
+import xarray as xr
+from edas.config import EdasEnv
+from edas.collection.agg import Aggregation
+from edas.collection.coords import CoordLookupMgr, CoordIndex
+from edas.process.domain import Domain, Axis
+from edas.process.task import TaskRequest
+from edas.workflow.data import EDASDataset
+from edas.test.file_aligned_chunks_benchmark import write_synthetic_collection
+from datetime import datetime, timezone
+
+NREPEATS = 20
+DOMAIN = { "name": "d0", "lat": { "start": 20.0, "end": 50.0, "system": "values" }, "lon": { "start": -120.0, "end": -60.0, "system": "values" },
+           "time": { "start": "1990-03-01T00:00:00", "end": "1990-06-30T23:00:00", "system": "values" } }
+
+def crop_and_subset( request: TaskRequest, dset: xr.Dataset, window, domainSpec: dict = DOMAIN ) -> xr.DataArray:
+    edset = EDASDataset.new( dset, { "tas": "d0" }, { "time": "t", "lat": "y", "lon": "x" } )
+    for array in edset.inputs:
+        if window is not None: assert window.fits( array.xr ), "Coordinate index doesn't match the dataset"
+        array.coordWindow = window
+    domain = Domain.new( domainSpec )
+    cropped = Domain( "d0", { axis: request.cropBounds( axis, bound, edset.inputs ) for axis, bound in domain.axisBounds.items() } )
+    return edset.subset( cropped ).inputs[0].xr
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    try:
+        EdasEnv.update( { "agg.index.dir": os.path.join( work_dir, "index" ) } )
+        agg = Aggregation( "bench", write_synthetic_collection( work_dir ) )
+        t0 = time.time()
+        CoordIndex.build( agg )
+        print( f" Coordinate index build: {time.time()-t0:.3f} sec" )
+        start, end = datetime( 1990, 3, 1, tzinfo=timezone.utc ), datetime( 1990, 6, 30, 23, tzinfo=timezone.utc )
+        iStart, iEnd = agg.periodRange( start, end )
+        dset = xr.open_mfdataset( agg.pathRange( iStart, iEnd ), engine='netcdf4', parallel=False )
+        request = TaskRequest( None, "bench", "bench", "bench", None, {} )
+        for label, getWindow in [ ( "dataset coords", lambda: None ), ( "coordinate index", lambda: CoordLookupMgr.window( agg, iStart, iEnd ) ) ]:
+            t0 = time.time()
+            for iRepeat in range( NREPEATS ): result = crop_and_subset( request, dset, getWindow() )
+            print( f" crop + subset with {label}: {(time.time()-t0)/NREPEATS*1000:.2f} ms, result shape = {result.shape}" )
+            if label == "dataset coords": reference = result
+        assert result.shape == reference.shape and np.array_equal( result.t.values, reference.t.values ) and np.array_equal( result.values, reference.values )
+        tslice, window = CoordLookupMgr.select( agg, iStart, iEnd, start, end )
+        trimmed = dset.isel( time=tslice )
+        assert np.array_equal( trimmed.time.values, dset.time.sel( time=slice( "1990-03-01", "1990-06-30T23" ) ).values ), "Time selection doesn't match xarray's sel"
+        result = crop_and_subset( request, trimmed, window )
+        print( f" crop + subset of the time selection: result shape = {result.shape}" )
+        assert np.array_equal( result.t.values, reference.t.values ) and np.array_equal( result.values, reference.values )
+    finally:
+        shutil.rmtree( work_dir )
@@ -0,0 +1,58 @@
+import os, time, tempfile, shutil, threading
+import numpy as np
+import xarray as xr
+from pydap.model import DatasetType, BaseType, GridType
+from pydap.handlers.lib import BaseHandler
+from pydap.server.devel import LocalTestServer
+from edas.data.dap import DapAccess, BlockCache
+
+NTIME, NLAT, NLON = 1460, 46, 72
+LATENCY = 0.05      # seconds added to each server request, to stand in for a remote THREDDS server
+CHUNKS = { "time": 146 }
+
+class CountingHandler( BaseHandler ):
+    # Local stand-in OPeNDAP server: counts the requests it serves, delays each one by LATENCY and sends the dataset's ETag.
+    requests = 0
+    etag = '"v1"'
+    def __call__( self, environ, start_response ):
+        with threading.Lock(): CountingHandler.requests += 1
+        time.sleep( LATENCY )
+        return super( CountingHandler, self ).__call__( environ, lambda status, headers, *args: start_response( status, headers + [ ( "ETag", CountingHandler.etag ) ], *args ) )
+
+def synthetic_dataset() -> DatasetType:
+    dataset = DatasetType( "synthetic", attributes={ "NC_GLOBAL": { "title": "Synthetic 6-hourly tas" } } )
+    dataset["time"] = BaseType( "time", 0.25 * np.arange( NTIME ), dimensions=("time",), attributes={ "units": "days since 1990-01-01 00:00:00", "calendar": "standard" } )
+    dataset["lat"] = BaseType( "lat", np.linspace( -90.0, 90.0, NLAT ), dimensions=("lat",), attributes={ "units": "degrees_north" } )
+    dataset["lon"] = BaseType( "lon", np.linspace( -180.0, 175.0, NLON ), dimensions=("lon",), attributes={ "units": "degrees_east" } )
+    data = ( 250.0 + 50.0 * np.random.rand( NTIME, NLAT, NLON ) ).astype( np.float32 )
+    tas = dataset["tas"] = GridType( "tas", attributes={ "units": "K", "long_name": "Surface air temperature" } )
+    tas["tas"] = BaseType( "tas", data, dimensions=("time","lat","lon"), attributes={ "units": "K", "long_name": "Surface air temperature" } )
+    for dim in ( "time", "lat", "lon" ): tas[dim] = BaseType( dim, dataset[dim].data, dimensions=(dim,), attributes=dataset[dim].attributes )
+    return dataset
+
+def request( access: DapAccess, url: str ) -> float:
+    dset = access.open( url, None, CHUNKS )
+    return float( dset.tas.sel( lat=slice(20,50), lon=slice(-120,-60) ).mean().values )
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    try:
+        source = synthetic_dataset()
+        expected = float( xr.DataArray( source["tas"].array.data, dims=("time","lat","lon"), coords=dict( lat=source["lat"].data, lon=source["lon"].data ) ).sel( lat=slice(20,50), lon=slice(-120,-60) ).mean().values )
+        with LocalTestServer( CountingHandler( source ) ) as server:
+            url = server.url
+            for label, nThreads, cacheSize in [ ( "serial fetches, no cache", 1, 0 ), ( "8 fetch threads, block cache", 8, 100000000 ) ]:
+                access = DapAccess( BlockCache( os.path.join( work_dir, f"cache{nThreads}" ), cacheSize ), nThreads, f"benchmark{nThreads}" )
+                for iRequest in range( 2 ):
+                    CountingHandler.requests = 0
+                    t0 = time.time()
+                    result = request( access, url )
+                    print( f" {label}, request {iRequest}: {time.time()-t0:.3f} sec, server requests = {CountingHandler.requests}, {access.blocks.stats()}" )
+                    assert abs( result - expected ) < 1.0e-3, f"Result {result} doesn't match source data {expected}"
+                assert len( access.sessions._sessions ) == 1, "Requests to one server should share a pooled session"
+                if cacheSize > 0:
+                    CountingHandler.etag, fetches = '"v2"', access.fetches
+                    request( access, url )
+                    assert access.fetches > fetches, "Blocks cached for a previous version of the dataset should not be hit"
+    finally:
+        shutil.rmtree( work_dir )
@@ -0,0 +1,74 @@
+import os, time, tempfile, shutil
+import numpy as np
+import netCDF4
+from datetime import datetime, timezone, timedelta
+from edas.config import EdasEnv
+from edas.collection.agg import Aggregation
+from edas.collection.virtual import VirtualDataset
+from edas.process.domain import Domain
+from edas.workflow.kernel import InputKernel
+
+NFILES, NSTEPS = 365, 30     # ~30 years of 30-day files with daily steps
+NLAT, NLON = 181, 360
+CHUNKS = ( 1, 46, 90 )
+BOX = { "lat": { "start": 40.0, "end": 41.0, "system": "values" }, "lon": { "start": -100.0, "end": -99.0, "system": "values" } }
+
+def write_synthetic_collection( work_dir: str ) -> str:
+    lat, lon = np.linspace( -90.0, 90.0, NLAT ), np.linspace( -180.0, 179.0, NLON )
+    t0 = datetime( 1980, 1, 1, tzinfo=timezone.utc )
+    records = []
+    for iFile in range( NFILES ):
+        date = t0 + timedelta( days=NSTEPS*iFile )
+        relpath = f"daily.{date.strftime('%Y%m%d')}.nc"
+        with netCDF4.Dataset( os.path.join( work_dir, relpath ), "w" ) as ds:
+            ds.createDimension( "time", None )
+            ds.createDimension( "lat", NLAT )
+            ds.createDimension( "lon", NLON )
+            tvar = ds.createVariable( "time", "f8", ("time",) )
+            tvar.units = "minutes since 1970-01-01 00:00:00"
+            tvar[:] = date.timestamp()/60 + 1440.0 * np.arange( NSTEPS )
+            ds.createVariable( "lat", "f8", ("lat",) )[:] = lat
+            ds.createVariable( "lon", "f8", ("lon",) )[:] = lon
+            var = ds.createVariable( "tas", "f4", ("time", "lat", "lon"), zlib=True, chunksizes=CHUNKS )
+            var[:] = 250.0 + 50.0 * np.random.rand( NSTEPS, NLAT, NLON )
+        records.append( "F; {}; {}; {}\n".format( int( date.timestamp()/60 ), NSTEPS, relpath ) )
+    agg_file = os.path.join( work_dir, "daily.ag1" )
+    ntime = NFILES * NSTEPS
+    t_end = int( ( t0 + timedelta( days=ntime-1 ) ).timestamp()/60 )
+    with open( agg_file, "w" ) as f:
+        f.write( f"P; base.path; {work_dir}\n" )
+        f.write( f"A; time; time; T; {ntime}; minutes since 1970-01-01T00:00:00Z; {int(t0.timestamp()/60)}; {t_end}\n" )
+        f.write( f"A; lat; latitude; Y; {NLAT}; degrees_north; -90.0; 90.0\n" )
+        f.write( f"A; lon; longitude; X; {NLON}; degrees_east; -180.0; 179.0\n" )
+        f.write( f"V; tas; tas; tas; Surface air temperature; {ntime},{NLAT},{NLON}; lat:1.0,lon:1.0; time lat lon; K\n" )
+        f.writelines( records )
+    return agg_file
+
+def bytes_read() -> int:
+    with open( "/proc/self/io" ) as f:
+        return next( int( line.split()[1] ) for line in f if line.startswith("rchar") )
+
+def measure( label: str, open_func ):
+    r0, t0 = bytes_read(), time.time()
+    dset = open_func()
+    box = dset.tas.sel( lat=slice(40.0,41.0), lon=slice(-100.0,-99.0) ).load()
+    nblocks = int( np.prod( dset.tas.data.numblocks ) )
+    print( f" {label}: dataset size = {dset.tas.nbytes/1.0e6:.1f} MB, blocks = {nblocks}, bytes read = {(bytes_read()-r0)/1.0e6:.2f} MB, time = {time.time()-t0:.3f} sec" )
+    return box
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    try:
+        EdasEnv.update( { "agg.index.dir": os.path.join( work_dir, "index" ) } )
+        agg = Aggregation( "bench", write_synthetic_collection( work_dir ) )
+        region = VirtualDataset( agg ).getRegion( Domain.new( BOX ) )
+        print( f"{NFILES} files of {NSTEPS} daily {NLAT}x{NLON} steps, 1x1 degree box, pushed-down region = {region}" )
+        kernel, paths = InputKernel(), agg.pathList()
+        results = [
+            measure( "virtual, full grid", lambda: VirtualDataset( agg ).open( ["tas"] ) ),
+            measure( "virtual, push-down", lambda: VirtualDataset( agg ).open( ["tas"], region=region ) ),
+            measure( "mfdataset, full grid", lambda: kernel.openMFDataset( paths, ["tas"], True ) ),
+            measure( "mfdataset, push-down", lambda: kernel.openMFDataset( paths, ["tas"], True, region, chunks=VirtualDataset( agg ).regionChunks( region ) ) ) ]
+        for result in results[1:]: assert np.array_equal( result.values, results[0].values )
+    finally:
+        shutil.rmtree( work_dir )
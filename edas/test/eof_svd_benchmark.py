@@ -0,0 +1,36 @@
+import numpy as np
+import xarray as xr
+import dask.array as da
+from eofs.xarray import Eof
+from edas.data.decomposition import EofSolver
+from edas.test.benchmark_utils import peak_rss_mb, timed
+
+# EOF analysis of a synthetic ( time x space ) field with a few planted modes plus noise, generated lazily in monthly
+# chunks: the randomized and exact ( TSQR ) chunked SVDs of edas.data.decomposition.EofSolver versus eofs.xarray.Eof,
+# which loads the whole matrix.  eofs runs last, since peak RSS is per process.
+
+NDAYS, NLAT, NLON, NMODES = 365 * 12, 45, 90, 8
+
+def synthetic_modes() -> da.Array:
+    rs = np.random.RandomState( 0 )
+    patterns = rs.standard_normal( ( NMODES, NLAT * NLON ) )
+    amplitudes = da.random.RandomState( 1 ).standard_normal( ( NDAYS, NMODES ), chunks=( 30, NMODES ) ) * ( 10.0 / ( 1 + np.arange( NMODES ) ) )
+    noise = da.random.RandomState( 2 ).standard_normal( ( NDAYS, NLAT * NLON ), chunks=( 30, NLAT * NLON ) )
+    return amplitudes.dot( patterns ) + noise + 280.0
+
+def compare( name: str, eofs: np.ndarray, fractions: np.ndarray, reference ):
+    signs = np.sign( ( eofs * reference[0] ).sum( axis=1 ) )
+    print( f"   {name} vs eofs: max eof difference = {np.abs( eofs - signs[:,None] * reference[0] ).max():.2e}, max variance fraction difference = {np.abs( fractions - reference[1] ).max():.2e}" )
+
+if __name__ == "__main__":
+    data = synthetic_modes()
+    print( f"Input: {data.shape} float64, {data.nbytes/1e9:.2f} GB ( lazy ), {len(data.chunks[0])} time chunks, {NMODES} modes, tsqr blocks of {EofSolver.blockBytes( data )/1e6:.0f} MB" )
+    solutions = {}
+    for method in EofSolver.Methods:
+        solver, seconds = timed( EofSolver, data, NMODES, method=method )
+        solutions[method] = ( solver.eofs(), solver.varianceFraction() )
+        print( f"EofSolver ( {method} ): compute time = {seconds:.2f} sec, peak RSS = {peak_rss_mb():.0f} MB" )
+    solver, seconds = timed( lambda: Eof( xr.DataArray( data.compute(), dims=( "time", "s" ) ), center=True ) )
+    reference = ( solver.eofs( neofs=NMODES ).values, solver.varianceFraction( neigs=NMODES ).values )
+    print( f"eofs.xarray.Eof: compute time = {seconds:.2f} sec, peak RSS = {peak_rss_mb():.0f} MB" )
+    for method, ( eofs, fractions ) in solutions.items(): compare( method, eofs, fractions, reference )
@@ -0,0 +1,77 @@
+import os, time, tempfile, shutil
+import numpy as np
+import netCDF4
+from datetime import datetime, timezone, timedelta
+from edas.config import EdasEnv
+from edas.collection.agg import Aggregation
+from edas.collection.virtual import VirtualDataset
+from edas.data.chunks import ChunkPlanner
+from edas.workflow.kernel import InputKernel
+
+NFILES, NSTEPS = 730, 24     # two years of daily files with hourly steps
+NLAT, NLON = 46, 72
+CHUNK_BYTES = 16000000
+
+class CountingDataset( netCDF4.Dataset ):
+    opens = 0
+    def __init__( self, *args, **kwargs ):
+        CountingDataset.opens += 1
+        super( CountingDataset, self ).__init__( *args, **kwargs )
+
+def write_synthetic_collection( work_dir: str, nfiles: int = NFILES, nsteps: int = NSTEPS ) -> str:
+    lat, lon = np.linspace( -90.0, 90.0, NLAT ), np.linspace( -180.0, 175.0, NLON )
+    t0 = datetime( 1990, 1, 1, tzinfo=timezone.utc )
+    records = []
+    for iFile in range( nfiles ):
+        date = t0 + timedelta( days=iFile )
+        relpath = f"hourly.{date.strftime('%Y%m%d')}.nc"
+        with netCDF4.Dataset( os.path.join( work_dir, relpath ), "w" ) as ds:
+            ds.createDimension( "time", None )
+            ds.createDimension( "lat", NLAT )
+            ds.createDimension( "lon", NLON )
+            tvar = ds.createVariable( "time", "f8", ("time",) )
+            tvar.units = "minutes since 1970-01-01 00:00:00"
+            tvar[:] = date.timestamp()/60 + 60.0 * np.arange( nsteps )
+            ds.createVariable( "lat", "f8", ("lat",) )[:] = lat
+            ds.createVariable( "lon", "f8", ("lon",) )[:] = lon
+            ds.createVariable( "tas", "f4", ("time", "lat", "lon") )[:] = 250.0 + 50.0 * np.random.rand( nsteps, NLAT, NLON )
+        records.append( "F; {}; {}; {}\n".format( int( date.timestamp()/60 ), nsteps, relpath ) )
+    agg_file = os.path.join( work_dir, "hourly.ag1" )
+    ntime = nfiles * nsteps
+    with open( agg_file, "w" ) as f:
+        f.write( f"P; base.path; {work_dir}\n" )
+        f.write( f"A; time; time; T; {ntime}; minutes since 1970-01-01T00:00:00Z; {int(t0.timestamp()/60)}; {int(t0.timestamp()/60) + 60*(ntime-1)}\n" )
+        f.write( f"A; lat; latitude; Y; {NLAT}; degrees_north; -90.0; 90.0\n" )
+        f.write( f"A; lon; longitude; X; {NLON}; degrees_east; -180.0; 175.0\n" )
+        f.write( f"V; tas; tas; tas; Surface air temperature; {ntime},{NLAT},{NLON}; lat:4.0,lon:5.0; time lat lon; K\n" )
+        f.writelines( records )
+    return agg_file
+
+def measure( label: str, open_func ):
+    CountingDataset.opens = 0
+    t0 = time.time()
+    dset = open_func()
+    ntasks = len( dset.tas.data.__dask_graph__() )
+    result = dset.tas.mean( "time" ).values
+    print( f" {label}: chunks = {len(dset.tas.data.chunks[0])}, tasks = {ntasks}, open calls = {CountingDataset.opens}, time = {time.time()-t0:.3f} sec" )
+    return result
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    try:
+        EdasEnv.update( { "agg.index.dir": os.path.join( work_dir, "index" ) } )
+        agg = Aggregation( "bench", write_synthetic_collection( work_dir ) )
+        netCDF4.Dataset = CountingDataset
+        kernel, paths = InputKernel(), agg.pathList()
+        chunks = ChunkPlanner( { "time": NFILES*NSTEPS, "lat": NLAT, "lon": NLON }, np.float32, [], "time", CHUNK_BYTES ).plan()
+        nchunks, fileSize = agg.getChunkSize( 250, NFILES )
+        print( f"{NFILES} files of {NSTEPS} steps, planned chunks = {chunks}" )
+        results = [
+            measure( "mfdataset, previous chunks={'time': nchunks}", lambda: kernel.openMFDataset( paths, ["tas"], True, chunks={ "time": nchunks } ) ),
+            measure( "mfdataset, rechunked to planned time chunks", lambda: kernel.openMFDataset( paths, ["tas"], True, chunks=chunks ).chunk( chunks ) ),
+            measure( "mfdataset, file-aligned chunks", lambda: kernel.openMFDataset( paths, ["tas"], True, chunks=kernel.alignFileChunks( agg, chunks ) ) ),
+            measure( "virtual, one chunk per file", lambda: VirtualDataset( agg ).open( ["tas"], chunks=chunks, alignFiles=False ) ),
+            measure( "virtual, file-aligned chunks", lambda: VirtualDataset( agg ).open( ["tas"], chunks=chunks ) ) ]
+        for result in results[1:]: assert np.allclose( result, results[0] )
+    finally:
+        shutil.rmtree( work_dir )
@@ -0,0 +1,48 @@
+import os, time, tempfile, shutil
+import numpy as np
+from edas.config import EdasEnv
+from edas.collection.agg import Aggregation
+from edas.collection.virtual import VirtualDataset
+from edas.data.handles import HandlePoolMgr
+from edas.workflow.kernel import InputKernel
+from edas.process.domain import Domain
+from edas.test.file_aligned_chunks_benchmark import write_synthetic_collection, NFILES
+
+NREQUESTS = 50
+NMFFILES, NMFREQUESTS = 60, 10        # open_mfdataset compares all the files' coordinates on each request, so a shorter period
+BOX = { "lat": { "start": 40.0, "end": 44.0, "system": "values" }, "lon": { "start": -100.0, "end": -95.0, "system": "values" } }
+
+def run_requests( open, nRequests: int ) -> np.ndarray:
+    latencies = []
+    for iRequest in range( nRequests ):
+        t0 = time.time()
+        open().tas.mean().values
+        latencies.append( time.time() - t0 )
+    return np.array( latencies )
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    try:
+        EdasEnv.update( { "agg.index.dir": os.path.join( work_dir, "index" ) } )
+        agg = Aggregation( "bench", write_synthetic_collection( work_dir ) )
+        region = VirtualDataset( agg ).getRegion( Domain.new( BOX ) )
+        paths = agg.pathList()
+        print( f"Requests for region {region}: {NMFREQUESTS} over {NMFFILES} files with open_mfdataset, {NREQUESTS} over {NFILES} files with the virtual dataset" )
+        paths_opened = { "open_mfdataset ( default )": ( lambda: InputKernel().openMFDataset( paths[:NMFFILES], ["tas"], False, region, chunks={} ), NMFREQUESTS ),
+                         "virtual": ( lambda: VirtualDataset( agg ).open( ["tas"], region=region ), NREQUESTS ) }
+        for name, ( open, nRequests ) in paths_opened.items():
+            for maxHandles in [ 0, NFILES ]:
+                HandlePoolMgr.clear()
+                HandlePoolMgr.maxHandles = maxHandles
+                HandlePoolMgr.hits = HandlePoolMgr.misses = 0
+                latencies = run_requests( open, nRequests )
+                stats = HandlePoolMgr.stats()
+                print( f" {name}, handle.pool.size={maxHandles}: first = {latencies[0]:.3f} sec, median = {np.median(latencies):.3f} sec, mean = {latencies.mean():.3f} sec, hit rate = {stats['hitRate']:.3f}" )
+            assert stats["misses"] <= NFILES, f"Handles should be reused across requests on the {name} path: {stats}"
+        path = paths[0]
+        invalidations = HandlePoolMgr.invalidations
+        os.utime( path, ns=( os.stat( path ).st_atime_ns, os.stat( path ).st_mtime_ns + 1000000000 ) )
+        InputKernel().openMFDataset( paths[:NMFFILES], ["tas"], False, region, chunks={} ).tas.mean().values
+        assert HandlePoolMgr.invalidations == invalidations + 1, "A modified file should invalidate its pooled handle"
+    finally:
+        shutil.rmtree( work_dir )
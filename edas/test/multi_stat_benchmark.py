@@ -0,0 +1,34 @@
+import numpy as np
+import xarray as xr
+import dask
+import dask.array as da
+from edas.workflow.data import EDASArray
+from edas.test.benchmark_utils import synthetic_input, timed
+
+# Hourly -> monthly reduction of several statistics over a synthetic global grid: one xarray resample reduction per
+# statistic ( the previous EDASArray.timeResample ) versus the fused single-pass reduction ( edas.data.reduction.GroupedStats ).
+
+NHOURS, NLAT, NLON = 24 * 365, 90, 180
+OPS = "mean,max,min,std"
+
+def separate_reductions( array: xr.DataArray ):
+    resampled = array.rename( { "t": "time" } ).resample( time="MS" )
+    return [ getattr( resampled, op )( "time" ) for op in OPS.split(",") ]
+
+def fused_reduction( array: xr.DataArray ):
+    return [ result.xr for result in EDASArray( "tas", "d0", array ).timeResample( "MS", OPS ) ]
+
+def run( name: str, build, array: xr.DataArray ):
+    results = build( array )
+    ntasks = len( dict( da.Array.__dask_graph__( da.stack( [ result.data.ravel() for result in results ] ) ) ) )
+    values, seconds = timed( dask.compute, *[ result.data for result in results ] )
+    print( f"{name}: {ntasks} tasks, compute time = {seconds:.3f} sec" )
+    return values
+
+if __name__ == "__main__":
+    array = synthetic_input( NHOURS, NLAT, NLON, 24 * 31, start="2000-01-01", offset=280.0 ).persist()
+    print( f"Input: {array.shape} {array.dtype}, {array.nbytes/1e6:.0f} MB, chunks = {array.chunks[0]}, statistics = {OPS}" )
+    reference = run( "Separate reductions", separate_reductions, array )
+    fused = run( "Fused reduction", fused_reduction, array )
+    for op, ref, result in zip( OPS.split(","), reference, fused ):
+        assert np.allclose( ref, result, rtol=1e-4, atol=1e-4 ), f"Fused {op} differs from the xarray reduction"
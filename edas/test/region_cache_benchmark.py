@@ -0,0 +1,49 @@
+import os, time, tempfile, shutil
+import numpy as np
+from edas.config import EdasEnv
+from edas.collection.agg import Collection
+from edas.process.task import TaskRequest
+from edas.workflow.module import edasOpManager
+from edas.data.cache import EDASKCacheMgr
+from edas.data.memo import ResultMemoMgr
+from edas.test.file_aligned_chunks_benchmark import write_synthetic_collection
+
+# Caches a North America ROI, then requests a Texas sub-region ( served by subsetting the cached array ) and a longer
+# time window over the same box ( the cached array extended with the missing months ), checking both against direct reads.
+
+TIME = { "start": "1990-01-01T00:00:00", "end": "1990-03-31T23:00:00", "system": "values" }
+NA = { "lat": { "start": 20.0, "end": 50.0, "system": "values" }, "lon": { "start": -120.0, "end": -60.0, "system": "values" } }
+TX = { "lat": { "start": 26.0, "end": 36.0, "system": "values" }, "lon": { "start": -106.0, "end": -94.0, "system": "values" } }
+
+def run( requestId: str, domain, variable, operation ):
+    request = TaskRequest.init( "bench", "bench", requestId, requestId, dict( domain=domain, variable=variable, operation=operation ) )
+    t0 = time.time()
+    results = edasOpManager.buildRequest( request )
+    arrays = [ array.xr.compute() for array in results[0].inputs ]
+    return time.time() - t0, arrays
+
+def compare( name: str, domain ):
+    cached = run( name + "-cached", domain, [ { "uri": "collection://bench", "name": "tas:na", "domain": "d1", "cache": "optional" } ], [ { "name": "edas.ave", "input": "na", "axes": "t" } ] )
+    direct = run( name + "-direct", domain, [ { "uri": "collection://bench", "name": "tas:v0", "domain": "d1" } ], [ { "name": "edas.ave", "input": "v0", "axes": "t" } ] )
+    assert np.allclose( cached[1][0].values, direct[1][0].values, equal_nan=True ), f"{name}: cached and direct results differ"
+    print( f"{name}: shape = {cached[1][0].shape}, cached time = {cached[0]:.3f} sec, direct read time = {direct[0]:.3f} sec" )
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    try:
+        EdasEnv.update( { "agg.index.dir": os.path.join( work_dir, "index" ) } )
+        agg_file = write_synthetic_collection( work_dir )
+        Collection.baseDir = work_dir
+        os.rename( agg_file, os.path.join( work_dir, "bench.ag1" ) )
+        with open( os.path.join( work_dir, "bench.csv" ), "w" ) as spec: spec.write( "tas,bench\n" )
+        ResultMemoMgr.maxSize = 0           # measure input access, not result reuse
+
+        t, arrays = run( "cache", [ dict( name="d0", time=TIME, **NA ) ], [ { "uri": "collection://bench", "name": "tas:v0", "domain": "d0" } ], [ { "name": "edas.cache", "input": "v0", "result": "na" } ] )
+        print( f"Cached North America ROI: {t:.3f} sec, cache = {EDASKCacheMgr.stats()}" )
+
+        compare( "Texas subset", [ dict( name="d1", time=TIME, **TX ) ] )
+        compare( "North America, extended time", [ dict( name="d1", time=dict( TIME, end="1990-06-30T23:00:00" ), **NA ) ] )
+        compare( "Texas, extended time", [ dict( name="d1", time=dict( TIME, start="1989-12-01T00:00:00" ), **TX ) ] )
+        print( f"Cache: {EDASKCacheMgr.stats()}" )
+    finally:
+        shutil.rmtree( work_dir, ignore_errors=True )
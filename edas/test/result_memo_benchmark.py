@@ -0,0 +1,40 @@
+import os, time, tempfile, shutil
+import numpy as np
+from edas.config import EdasEnv
+from edas.collection.agg import Collection
+from edas.process.task import TaskRequest
+from edas.workflow.module import edasOpManager
+from edas.data.memo import ResultMemoMgr
+from edas.test.file_aligned_chunks_benchmark import write_synthetic_collection
+
+DOMAINS = [ { "name": "d0", "lat": { "start": 20.0, "end": 50.0, "system": "values" }, "lon": { "start": -120.0, "end": -60.0, "system": "values" },
+              "time": { "start": "1990-01-01T00:00:00", "end": "1990-12-31T23:00:00", "system": "values" } } ]
+VARIABLES = [ { "uri": "collection://bench", "name": "tas:v0", "domain": "d0" } ]
+OPERATIONS = [ { "name": "edas.ave", "input": "v0", "axes": "xy", "result": "r0" } ]
+
+def dashboardRequest( index: int ) -> np.ndarray:
+    # The same request, as fired by a dashboard every few minutes.
+    request = TaskRequest.init( "bench", "bench", f"request{index}", "edas.ave", dict( domain=DOMAINS, variable=VARIABLES, operation=OPERATIONS ) )
+    results = edasOpManager.buildRequest( request )
+    return results[0].inputs[0].xr.values
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    try:
+        EdasEnv.update( { "agg.index.dir": os.path.join( work_dir, "index" ) } )
+        ResultMemoMgr.maxSize = 1000000000
+        agg_file = write_synthetic_collection( work_dir )
+        Collection.baseDir = work_dir
+        os.rename( agg_file, os.path.join( work_dir, "bench.ag1" ) )
+        with open( os.path.join( work_dir, "bench.csv" ), "w" ) as file: file.write( "tas,bench\n" )
+        reference = None
+        for label in [ "first request", "repeated request", "repeated request", "after aggregation update", "repeated request" ]:
+            if label == "after aggregation update": os.utime( os.path.join( work_dir, "bench.ag1" ) )
+            t0 = time.time()
+            result = dashboardRequest( 0 )             # results are stored by the second run, reused from the third
+            print( f" {label}: {time.time()-t0:.3f} sec, result shape = {result.shape}, memo = {ResultMemoMgr.stats()}" )
+            if reference is None: reference = result
+            assert np.array_equal( result, reference ), "Memoized result doesn't match the computed result"
+        assert ResultMemoMgr.hits == 2 and ResultMemoMgr.invalidations == 1, f"Unexpected memo stats: {ResultMemoMgr.stats()}"
+    finally:
+        shutil.rmtree( work_dir )
@@ -0,0 +1,39 @@
+import os, time, tempfile, shutil
+from edas.config import EdasEnv
+from edas.collection.agg import Aggregation
+from edas.collection.staging import StagingCache
+from edas.test.file_aligned_chunks_benchmark import write_synthetic_collection
+
+NREQUESTS = 5
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    try:
+        agg = Aggregation( "bench", write_synthetic_collection( work_dir ) )
+        paths = agg.pathList()
+        fileSize = os.stat( paths[0] ).st_size
+        cache = StagingCache( os.path.join( work_dir, "staging" ), fileSize * len(paths) // 2 )
+        for iRequest in range( NREQUESTS ):
+            t0 = time.time()
+            staged = cache.stage( paths[:len(paths)//4] )
+            nStaged = sum( path.startswith( cache.stagingDir ) for path in staged )
+            cache.wait()
+            print( f" request {iRequest}: {nStaged}/{len(staged)} paths redirected, stage time = {time.time()-t0:.3f} sec" )
+        assert all( cache.isStaged( path ) for path in paths[:len(paths)//4] ), "Requested files should be staged"
+        pinned = paths[:4]
+        cache.stage( pinned, "request-0" )
+        cache.stage( paths ); cache.wait()
+        assert all( cache.isStaged( path ) for path in pinned ), "Files pinned by a running request should not be evicted"
+        cache.release( "request-0" )
+        stats = cache.stats()
+        print( f" stats: {stats}" )
+        assert stats["nbytes"] <= cache.quota and stats["evictions"] > 0, "Staged files should be evicted down to the quota"
+        path = paths[-1]
+        os.utime( path, ns=( os.stat( path ).st_atime_ns, os.stat( path ).st_mtime_ns + 1000000000 ) )
+        assert not cache.isStaged( path ), "A modified source file should invalidate its staged copy"
+        EdasEnv.update( { "scheduler.address": "tcp://scheduler:8786" } )
+        assert cache.stage( paths[:4] ) == paths[:4], "Paths should not be redirected to a staging dir the remote workers can't read"
+        cache.shared = True
+        assert cache.stage( paths[:4] ) != paths[:4], "Paths should be redirected to a shared staging dir"
+    finally:
+        shutil.rmtree( work_dir )
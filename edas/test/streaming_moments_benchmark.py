@@ -0,0 +1,35 @@
+import numpy as np
+from edas.workflow.data import EDASArray
+from edas.test.benchmark_utils import synthetic_input, peak_rss_mb, timed
+
+# Out-of-core std / norm over a lazily generated multi-decade hourly series: the input never exists in memory, the
+# streaming moment accumulators ( edas.data.reduction.Moments ) reduce it chunk by chunk.  Peak RSS should stay a small
+# multiple of the chunk size.  Accuracy is checked on a subset against a float64 two-pass and the naive sum of squares.
+
+NHOURS, NLAT, NLON = 24 * 365 * 40, 16, 32
+OFFSET = 1.0e4   # large mean relative to the spread: the naive E[x^2]-E[x]^2 formula loses precision in float32
+
+def hourly( nhours: int ):
+    return synthetic_input( nhours, NLAT, NLON, 24 * 30, start="1980-01-01", offset=OFFSET )
+
+if __name__ == "__main__":
+    array = hourly( NHOURS )
+    print( f"Input: {array.shape} {array.dtype}, {array.nbytes/1e9:.2f} GB ( lazy ), {len(array.chunks[0])} chunks of {array.data.chunksize[0]*NLAT*NLON*4/1e6:.1f} MB" )
+    variable = EDASArray( "tas", "d0", array )
+
+    std, seconds = timed( lambda: variable.std( [ "t" ] ).xr.values )
+    print( f"std(t): compute time = {seconds:.2f} sec, peak RSS = {peak_rss_mb():.0f} MB" )
+
+    norm = variable.norm( [ "t" ] )
+    result, seconds = timed( lambda: norm.xr.isel( t=slice( -24, None ) ).values )
+    print( f"norm(t) ( last day ): compute time = {seconds:.2f} sec, peak RSS = {peak_rss_mb():.0f} MB" )
+    column = array.isel( y=0, x=0 ).values.astype( np.float64 )
+    assert np.allclose( result[:,0,0], ( ( column - column.mean() ) / column.std() )[-24:], atol=1e-4 ), "Streaming norm differs from the two-pass reference"
+
+    subset = hourly( 24 * 365 ).values
+    reference = subset.astype( np.float64 ).std( axis=0 )
+    streamed = EDASArray( "tas", "d0", hourly( 24 * 365 ) ).std( [ "t" ] ).xr.values
+    mean32 = subset.mean( axis=0, dtype=np.float32 )
+    naive = np.sqrt( np.maximum( ( subset * subset ).mean( axis=0, dtype=np.float32 ) - mean32 * mean32, 0 ) )
+    print( f"Max relative std error vs float64 two-pass: streaming = {np.abs( streamed/reference - 1 ).max():.2e}, naive sum of squares = {np.abs( naive/reference - 1 ).max():.2e}" )
+    assert np.allclose( streamed, reference, rtol=1e-5 ), "Streaming std differs from the two-pass reference"
@@ -0,0 +1,29 @@
+import numpy as np
+import dask
+from edas.workflow.data import EDASArray
+from edas.test.benchmark_utils import synthetic_input, peak_rss_mb, timed
+
+# Time median and p10/p90 of a lazily generated multi-decade hourly series chunked along time: the exact xarray
+# reduction must rechunk every grid cell's full time series into memory, the streaming sketches
+# ( edas.data.reduction.QuantileSketch ) reduce chunk by chunk.  Run the sketch first, since peak RSS is per process.
+
+NHOURS, NLAT, NLON = 24 * 365 * 10, 32, 64
+QUANTILES = [ 0.1, 0.5, 0.9 ]
+
+def run( name: str, variable: EDASArray, **kwargs ):
+    results, seconds = timed( dask.compute, *[ result.data for result in variable.quantiles( [ "t" ], QUANTILES, **kwargs ) ] )
+    print( f"{name}: compute time = {seconds:.2f} sec, peak RSS = {peak_rss_mb():.0f} MB" )
+    return np.stack( results )
+
+if __name__ == "__main__":
+    array = synthetic_input( NHOURS, NLAT, NLON, 24 * 30, name="pr", distribution="gamma" )
+    print( f"Input: {array.shape} {array.dtype}, {array.nbytes/1e9:.2f} GB ( lazy ), {len(array.chunks[0])} time chunks, quantiles = {QUANTILES}" )
+    variable = EDASArray( "pr", "d0", array )
+    sketches = { error: run( f"Streaming sketches ( error = {error} )", variable, error=error ) for error in [ 0.01, 0.002 ] }
+    exact = run( "Exact ( rechunked )", variable, exact=True )
+    sample = array.isel( y=slice( 0, 4 ), x=slice( 0, 4 ) ).values
+    for error, sketched in sketches.items():
+        ranks = np.stack( [ ( sample < sketched[ index, :4, :4 ] ).mean( axis=0 ) for index in range( len( QUANTILES ) ) ] )
+        rankError = np.abs( ranks - np.array( QUANTILES )[:,None,None] ).max()
+        print( f"error = {error}: max rank error = {rankError:.2e}, max abs difference from exact = {np.abs( sketched - exact ).max():.2e}" )
+        assert rankError <= error, f"Sketch rank error {rankError} exceeds its bound {error}"
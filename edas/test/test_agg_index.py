@@ -0,0 +1,63 @@
+import os, pytest
+from edas.config import EdasEnv
+from edas.collection.agg import Aggregation
+from edas.collection.index import AggIndex
+from edas.test.agg_index_benchmark import write_synthetic_agg, START_MINUTES
+
+# Compiled aggregation index ( AggIndex ): an Aggregation loaded from the index must expose the same files, paths and
+# chunk sizes as one parsed from the .ag1 text, and the index must be rebuilt when the .ag1 file changes.
+
+@pytest.fixture
+def agg_file( tmp_path ):
+    saved = { key: EdasEnv.get( key ) for key in [ "agg.index", "agg.index.dir" ] }
+    EdasEnv.update( { "agg.index.dir": os.path.join( str(tmp_path), "index" ) } )
+    path = os.path.join( str(tmp_path), "test.ag1" )
+    write_synthetic_agg( path, 50 )
+    yield path
+    for key, value in saved.items():
+        if value is None: EdasEnv.parms.pop( key, None )
+        else: EdasEnv.update( { key: value } )
+
+def load( agg_file: str, indexed: bool ) -> Aggregation:
+    EdasEnv.update( { "agg.index": "true" if indexed else "false" } )
+    return Aggregation( "test", agg_file )
+
+def test_index_matches_text_parse( agg_file ):
+    text, indexed = load( agg_file, False ), load( agg_file, True )
+    assert text.index is None and indexed.index is not None
+    assert indexed.nFiles == text.nFiles == 50
+    assert indexed.pathList() == text.pathList()
+    assert indexed.getChunkSize( 10, 50 ) == text.getChunkSize( 10, 50 )
+    assert list( indexed.files.keys() ) == list( text.files.keys() )
+    assert indexed.parms == text.parms and indexed.vars.keys() == text.vars.keys() and indexed.axes.keys() == text.axes.keys()
+
+def test_index_records( agg_file ):
+    index = AggIndex.build( agg_file )
+    assert len( index ) == 50
+    assert index.starts.tolist() == [ START_MINUTES + 60 * iFile for iFile in range( 50 ) ]
+    assert index.relpaths( 3, 5 ) == [ index.relpath( 3 ), index.relpath( 4 ) ]
+    assert [ rec[2] for rec in index.iterRecords( 10, 12 ) ] == index.relpaths( 10, 12 )
+    assert index.relpaths( 50 ) == []
+
+def test_index_reused( agg_file ):
+    AggIndex.build( agg_file )
+    base = AggIndex.indexBase( agg_file )
+    mtime = os.stat( base + ".idx.npy" ).st_mtime_ns
+    assert AggIndex.open( agg_file ) is not None
+    AggIndex.load( agg_file )
+    assert os.stat( base + ".idx.npy" ).st_mtime_ns == mtime
+
+def test_index_rebuilt_when_source_changes( agg_file ):
+    AggIndex.build( agg_file )
+    write_synthetic_agg( agg_file, 20 )
+    stat = os.stat( agg_file )
+    os.utime( agg_file, ns=( stat.st_atime_ns, stat.st_mtime_ns + 1000000000 ) )
+    assert AggIndex.open( agg_file ) is None
+    assert len( AggIndex.load( agg_file ) ) == 20
+    assert load( agg_file, True ).nFiles == 20
+
+def test_unreadable_index_discarded( agg_file ):
+    AggIndex.build( agg_file )
+    with open( AggIndex.indexBase( agg_file ) + ".meta.json", "w" ) as mfile: mfile.write( "{ not json" )
+    assert AggIndex.open( agg_file ) is None
+    assert len( AggIndex.load( agg_file ) ) == 50
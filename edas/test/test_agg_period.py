@@ -0,0 +1,47 @@
+import os, pytest
+from datetime import datetime, timezone
+from edas.config import EdasEnv
+from edas.collection.agg import Aggregation
+from edas.test.agg_index_benchmark import write_synthetic_agg, START_MINUTES
+
+# Aggregation file selection for a time window: the compiled index ( periodRange ) and the parsed .ag1 records
+# ( _periodPathList, agg.index = false ) must select the same files, including at the first, last and single-file edges.
+
+def hour( h: float ) -> datetime:
+    return datetime.fromtimestamp( ( START_MINUTES + 60 * h ) * 60, tz=timezone.utc )
+
+@pytest.fixture( params=[ "true", "false" ] )
+def aggregation( request, tmp_path ):
+    def load( nfiles: int ) -> Aggregation:
+        agg_file = os.path.join( str(tmp_path), f"test_{nfiles}.ag1" )
+        write_synthetic_agg( agg_file, nfiles )
+        return Aggregation( "test", agg_file )
+    saved = { key: EdasEnv.get( key ) for key in [ "agg.index", "agg.index.dir" ] }
+    EdasEnv.update( { "agg.index": request.param, "agg.index.dir": os.path.join( str(tmp_path), "index" ) } )
+    yield load
+    for key, value in saved.items():
+        if value is None: EdasEnv.parms.pop( key, None )
+        else: EdasEnv.update( { key: value } )
+
+def selected( agg: Aggregation, start: datetime, end: datetime ):
+    paths = agg.periodPathList( start, end )
+    return [ int( path[-6:-4] ) for path in paths ]     # hour of day of each ( hourly ) file
+
+@pytest.mark.parametrize( "window, hours", [
+    ( ( 0, 2 ), [ 0, 1, 2 ] ),              # starts at the first file
+    ( ( -5, -1 ), [] ),                     # ends before the first file
+    ( ( -5, 0.5 ), [ 0 ] ),                 # overlaps the start of the first file
+    ( ( 3.25, 3.75 ), [ 3 ] ),              # inside one file
+    ( ( 3.5, 5 ), [ 3, 4, 5 ] ),            # starts inside a file: that file is included
+    ( ( 3, 5 ), [ 3, 4, 5 ] ),              # starts at a file start: the preceding file is not
+    ( ( 9, 12 ), [ 9 ] ),                   # starts at the last file
+    ( ( 9.5, 20 ), [ 9 ] ),                 # starts after the last file's start
+] )
+def test_period_selection( aggregation, window, hours ):
+    agg = aggregation( 10 )
+    assert selected( agg, hour( window[0] ), hour( window[1] ) ) == hours
+
+def test_single_file( aggregation ):
+    agg = aggregation( 1 )
+    for window in [ ( -5, -1 ), ( 0.2, 0.4 ), ( 5, 6 ) ]:
+        assert selected( agg, hour( window[0] ), hour( window[1] ) ) == [ 0 ]
@@ -0,0 +1,75 @@
+import os, pytest
+import numpy as np
+from edas.config import EdasEnv
+from edas.collection.agg import Aggregation
+from edas.collection.index import AggIndex
+from edas.collection.builder import AggBuilder
+from edas.collection.virtual import VirtualDataset
+from edas.test.file_aligned_chunks_benchmark import write_synthetic_collection, NLAT, NLON
+from edas.test.agg_builder_benchmark import add_day
+
+# Aggregation builder: a built .ag1 must list the same files as the reference catalog and describe the variables well
+# enough to open them, and incremental builds must scan only the files the existing .ag1 doesn't list.
+
+NFILES, NSTEPS = 4, 24
+
+class CountingBuilder( AggBuilder ):
+    scanned = []
+    def scanFiles( self, relpaths ):
+        CountingBuilder.scanned = list( relpaths )
+        return super( CountingBuilder, self ).scanFiles( relpaths )
+
+@pytest.fixture
+def collection( tmp_path ):
+    saved = EdasEnv.get( "agg.index.dir" )
+    EdasEnv.update( { "agg.index.dir": os.path.join( str(tmp_path), "index" ) } )
+    data_dir = os.path.join( str(tmp_path), "data" )
+    os.makedirs( data_dir )
+    reference = write_synthetic_collection( data_dir, NFILES, NSTEPS )
+    yield data_dir, reference, os.path.join( str(tmp_path), "built.ag1" )
+    if saved is None: EdasEnv.parms.pop( "agg.index.dir", None )
+    else: EdasEnv.update( { "agg.index.dir": saved } )
+
+def records( agg_file: str ):
+    return sorted( AggIndex.parseFileRecords( agg_file )[1].values() )
+
+def test_full_build( collection ):
+    data_dir, reference, agg_file = collection
+    assert AggBuilder( agg_file, data_dir, "*.nc", 2 ).build() == NFILES
+    assert records( agg_file ) == records( reference )
+    agg = Aggregation( "test", agg_file )
+    assert agg.parm( "base.path" ) == data_dir
+    assert agg.getAxis( "T" ).length == NFILES * NSTEPS and agg.getAxis( "Y" ).length == NLAT
+    assert agg.vars["tas"].dims == [ "time", "lat", "lon" ]
+    built = VirtualDataset( agg ).open( [ "tas" ] )
+    expected = VirtualDataset( Aggregation( "reference", reference ) ).open( [ "tas" ] )
+    assert ( built.time.values == expected.time.values ).all()
+    assert np.array_equal( built.tas.values, expected.tas.values )
+
+def test_incremental( collection ):
+    data_dir, reference, agg_file = collection
+    AggBuilder( agg_file, data_dir, "*.nc", 1 ).build()
+    added = add_day( data_dir, max( records( agg_file ) )[2].decode() )
+    assert CountingBuilder( agg_file, data_dir, "*.nc", 1 ).build( incremental=True ) == 1
+    assert CountingBuilder.scanned == [ added ]
+    agg = Aggregation( "test", agg_file )
+    assert agg.nFiles == NFILES + 1 and agg.getAxis( "T" ).length == ( NFILES + 1 ) * NSTEPS
+    assert agg.index.relpath( NFILES ) == added
+    assert VirtualDataset( agg ).open( [ "tas" ] ).tas.shape == ( ( NFILES + 1 ) * NSTEPS, NLAT, NLON )
+
+def test_incremental_no_new_files( collection ):
+    data_dir, reference, agg_file = collection
+    AggBuilder( agg_file, data_dir, "*.nc", 1 ).build()
+    mtime = os.stat( agg_file ).st_mtime_ns
+    assert CountingBuilder( agg_file, data_dir, "*.nc", 1 ).build( incremental=True ) == 0
+    assert CountingBuilder.scanned == [] and os.stat( agg_file ).st_mtime_ns == mtime
+
+def test_unreadable_file_retried( collection ):
+    data_dir, reference, agg_file = collection
+    AggBuilder( agg_file, data_dir, "*.nc", 1 ).build()
+    with open( os.path.join( data_dir, "zzz.broken.nc" ), "w" ) as f: f.write( "not netcdf" )
+    add_day( data_dir, max( records( agg_file ) )[2].decode() )
+    assert AggBuilder( agg_file, data_dir, "*.nc", 1 ).build( incremental=True ) == 1
+    CountingBuilder( agg_file, data_dir, "*.nc", 1 ).build( incremental=True )
+    assert CountingBuilder.scanned == [ "zzz.broken.nc" ]
+    assert len( records( agg_file ) ) == NFILES + 1
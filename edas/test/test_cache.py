@@ -0,0 +1,122 @@
+import os, threading, pytest
+import numpy as np
+import xarray as xr
+from edas.workflow.data import EDASArray
+from edas.data.cache import CacheManager, SpillCache
+
+# The in-memory array cache: byte-accurate sizes, LRU eviction, pins and stats, under concurrent use.  Then the spill
+# tier: arrays evicted from memory are spilled to disk, faulted back in, deleted, and restored after a restart.
+# 800 KB arrays, with room for two in memory.
+
+def arrays( count: int ):
+    times = np.arange( "2000-01-01", "2000-01-11", dtype="datetime64[D]" ).astype( "datetime64[ns]" )
+    rs = np.random.RandomState( 0 )
+    return { f"roi{index}": EDASArray( f"tas{index}", "d0", xr.DataArray( rs.rand( 10, 100, 100 ), dims=["t","y","x"], coords=dict( t=times, y=np.arange(100.0), x=np.arange(100.0) ) ) ) for index in range( count ) }
+
+def spilling( spillDir, spillSize: int = 10000000 ) -> CacheManager:
+    cache = CacheManager()
+    cache.maxSize = 2000000
+    cache.spillCache = SpillCache( str( spillDir ), spillSize )
+    return cache
+
+def memory() -> CacheManager:
+    cache = CacheManager()
+    cache.maxSize = 2000000
+    cache.spillCache = SpillCache( None, 0 )
+    return cache
+
+def test_sizes():
+    cache, array = memory(), next( iter( arrays( 1 ).values() ) )
+    single = EDASArray( "tas", "d0", array.xr.astype( np.float32 ) )
+    cache.cache( "roi0", array )
+    cache.cache( "roi1", single )
+    assert cache.sizes == { "roi0": 800000, "roi1": 400000 } and cache.currentSize == 1200000
+    cache.cache( "roi0", single )
+    assert cache.currentSize == 800000 and len( cache ) == 2
+    with pytest.raises( AssertionError ): cache.cache( "big", EDASArray( "big", "d0", xr.DataArray( np.zeros( 300000 ) ) ) )
+
+def test_lru():
+    cache, inputs = memory(), arrays( 3 )
+    cache.cache( "roi0", inputs["roi0"] )
+    cache.cache( "roi1", inputs["roi1"] )
+    assert cache["roi0"] is inputs["roi0"]
+    cache.cache( "roi2", inputs["roi2"] )
+    assert "roi0" in cache and "roi1" not in cache and "roi2" in cache
+    assert cache.stats()["evictions"] == 1
+
+def test_pins():
+    cache, inputs = memory(), arrays( 4 )
+    cache.cache( "roi0", inputs["roi0"] )
+    cache.cache( "roi1", inputs["roi1"] )
+    assert cache.get( "roi0", "request1" ) is not None and cache.get( "roi1", "request2" ) is not None
+    with pytest.raises( AssertionError ): cache.cache( "roi2", inputs["roi2"] )
+    cache.release( "request2" )
+    cache.cache( "roi2", inputs["roi2"] )
+    assert "roi0" in cache and "roi1" not in cache
+    assert cache.get( "roi3", "request1" ) is None and list( cache.pins.keys() ) == [ "roi0" ]
+    cache.release( "request1" )
+    assert cache.pins == {}
+
+def test_stats():
+    cache, inputs = memory(), arrays( 3 )
+    for key, array in inputs.items(): cache.cache( key, array )
+    cache.get( "roi2" )
+    cache.get( "roi0" )
+    stats = cache.stats()
+    assert ( stats["entries"], stats["nbytes"], stats["hits"], stats["misses"], stats["evictions"], stats["hitRate"] ) == ( 2, 1600000, 1, 1, 1, 0.5 )
+
+def test_threads():
+    cache, inputs, errors = memory(), arrays( 6 ), []
+    keys = list( inputs.keys() )
+    def worker( iThread: int ):
+        owner = f"request{iThread}"
+        try:
+            for iStep in range( 200 ):
+                key = keys[ ( iThread + iStep ) % len(keys) ]
+                if cache.get( key, owner ) is None:
+                    try: cache.cache( key, inputs[key] )
+                    except AssertionError: pass         # all entries pinned by the other threads
+                cache.release( owner )
+        except Exception as err: errors.append( err )
+    threads = [ threading.Thread( target=worker, args=( iThread, ) ) for iThread in range( 8 ) ]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    stats = cache.stats()
+    assert not errors and cache.pins == {}
+    assert cache.currentSize == sum( cache.sizes.values() ) <= cache.maxSize and set( cache.sizes ) == set( cache.arrayCache )
+    assert stats["hits"] + stats["misses"] == 1600
+
+def test_spill_and_fault_in( tmp_path ):
+    cache, inputs = spilling( tmp_path ), arrays( 4 )
+    for key, array in inputs.items(): cache.cache( key, array )
+    cache.waitForSpills()
+    assert sorted( cache.spillCache.entries.keys() ) == [ "roi0", "roi1" ]
+    assert not os.path.exists( os.path.join( tmp_path, SpillCache.IndexFile ) ), "The spill index should not be saved on every spill"
+    for key, array in inputs.items(): assert cache.get( key ).xr.equals( array.xr )
+
+def test_spill_quota( tmp_path ):
+    cache = spilling( tmp_path, 1500000 )
+    for key, array in arrays( 5 ).items(): cache.cache( key, array )
+    cache.waitForSpills()
+    assert cache.spillCache.currentSize <= cache.spillCache.maxSize and cache.spillCache.evictions > 0
+    assert sorted( name for name in os.listdir( tmp_path ) if name.endswith( ".zarr" ) ) == sorted( os.path.basename( entry["path"] ) for entry in cache.spillCache.entries.values() )
+
+def test_spill_delete( tmp_path ):
+    cache = spilling( tmp_path )
+    for key, array in arrays( 3 ).items(): cache.cache( key, array )
+    cache.waitForSpills()
+    path = cache.spillCache.entries["roi0"]["path"]
+    assert cache.evict( "roi0" ) == [ "roi0" ]
+    cache.waitForSpills()
+    assert not os.path.exists( path ) and "roi0" not in cache and cache.get( "roi0" ) is None
+
+def test_spill_restart( tmp_path ):
+    cache, inputs = spilling( tmp_path ), arrays( 4 )
+    for key, array in inputs.items(): cache.cache( key, array )
+    cache.waitForSpills()
+    cache.spillCache.flush()
+    orphan = cache.spillCache.storePath( "orphan" )
+    os.makedirs( orphan )
+    restarted = spilling( tmp_path )
+    assert restarted.get( "roi1" ).xr.equals( inputs["roi1"].xr )
+    assert not os.path.exists( orphan ), "Stores missing from the saved index should be deleted"
@@ -0,0 +1,58 @@
+import os, json, pytest
+from edas.config import EdasEnv
+from edas.collection.agg import Collection, CatalogCacheMgr
+from edas.workflow.module import edasOpManager
+from edas.data.cache import EDASKCacheMgr
+from edas.data.memo import ResultMemoMgr
+from edas.test.file_aligned_chunks_benchmark import write_synthetic_collection, NLAT, NLON
+
+# Cache administration utilities ( as served to the endpoints by execCacheUtility ): warm ROIs into the cache, list
+# entries and stats, and evict by pattern.
+
+NFILES, NSTEPS = 2, 24
+TIME = { "start": "1990-01-01T00:00:00", "end": "1990-01-02T23:00:00", "system": "values" }
+NA = { "lat": { "start": 20.0, "end": 50.0, "system": "values" }, "lon": { "start": -120.0, "end": -60.0, "system": "values" } }
+
+def warm( *domains ) -> dict:
+    dataInputs = dict( domain=[ dict( name=f"d{index}", time=TIME, **domain ) for index, domain in enumerate( domains ) ],
+                       variable=[ { "uri": "collection://admin", "name": f"tas:v{index}", "domain": f"d{index}" } for index in range( len( domains ) ) ] )
+    return edasOpManager.execCacheUtility( [ "cache", "warm", json.dumps( dataInputs ) ] )
+
+@pytest.fixture
+def collection( tmp_path, monkeypatch ):
+    work_dir = str(tmp_path)
+    monkeypatch.setattr( Collection, "baseDir", work_dir )
+    monkeypatch.setattr( ResultMemoMgr, "maxSize", 0 )
+    saved = EdasEnv.get( "agg.index.dir" )
+    EdasEnv.update( { "agg.index.dir": os.path.join( work_dir, "index" ) } )
+    os.rename( write_synthetic_collection( work_dir, NFILES, NSTEPS ), os.path.join( work_dir, "admin.ag1" ) )
+    with open( os.path.join( work_dir, "admin.csv" ), "w" ) as spec: spec.write( "tas,admin\n" )
+    EDASKCacheMgr.evict( "*" )
+    yield work_dir
+    EDASKCacheMgr.evict( "*" )
+    CatalogCacheMgr.clear()
+    if saved is None: EdasEnv.parms.pop( "agg.index.dir", None )
+    else: EdasEnv.update( { "agg.index.dir": saved } )
+
+def test_warm_list_evict( collection ):
+    result = warm( NA, {} )
+    assert len( result["cached"] ) == 2 and result["stats"]["entries"] == 2
+    entries = edasOpManager.execCacheUtility( [ "cache", "list" ] )["entries"]
+    assert sorted( entry["key"] for entry in entries ) == sorted( result["cached"] )
+    assert all( entry["tier"] == "memory" and entry["nbytes"] > 0 and entry["atime"] is not None and entry["owners"] == [] for entry in entries )
+    assert max( entry["nbytes"] for entry in entries ) == NFILES * NSTEPS * NLAT * NLON * 4
+    stats = edasOpManager.execCacheUtility( [ "cache", "stats" ] )
+    assert stats["entries"] == 2 and stats["nbytes"] == sum( entry["nbytes"] for entry in entries ) and stats["@ResultType"] == "CACHE"
+    evicted = edasOpManager.execCacheUtility( [ "cache", "evict", "v0*" ] )["evicted"]
+    assert len( evicted ) == 1 and evicted[0].startswith( "v0" )
+    assert [ entry["key"] for entry in edasOpManager.execCacheUtility( [ "cache", "list" ] )["entries"] ] == [ key for key in result["cached"] if key not in evicted ]
+    assert edasOpManager.execCacheUtility( [ "cache", "evict", "nomatch" ] )["evicted"] == []
+
+def test_warm_too_big( collection, monkeypatch ):
+    monkeypatch.setattr( EDASKCacheMgr, "maxSize", 100000 )
+    with pytest.raises( AssertionError, match="too big for the cache" ): warm( {} )
+    assert EDASKCacheMgr.stats()["entries"] == 0
+
+def test_missing_parameters():
+    with pytest.raises( AssertionError ): edasOpManager.execCacheUtility( [ "cache", "evict" ] )
+    with pytest.raises( AssertionError ): edasOpManager.execCacheUtility( [ "cache", "warm" ] )
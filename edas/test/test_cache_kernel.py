@@ -0,0 +1,29 @@
+import numpy as np
+import xarray as xr
+from edas.process.task import TaskRequest
+from edas.process.operation import SourceNode
+from edas.workflow.kernel import InputKernel
+from edas.workflow.data import EDASArray
+from edas.workflow.modules.edas import CacheKernel
+from edas.data.cache import EDASKCacheMgr
+
+# The cached-input path: the edas.cache kernel builds as an OpKernel ( its decomposition and required options are set ),
+# and inputs served from the cache are imported as an xarray Dataset.
+
+def test_cache_kernel_init():
+    kernel = CacheKernel()
+    assert kernel._decomposable and "input" in kernel.requiredOptions
+
+def test_cached_input_dataset():
+    domain = dict( name="d0", lat=dict( start=0.0, end=10.0, system="values" ), lon=dict( start=0.0, end=10.0, system="values" ) )
+    request = TaskRequest.init( "test", "test", "cached", "edas.ave", dict( domain=[ domain ], variable=[ { "uri": "collection://test", "name": "tas:cached", "domain": "d0", "cache": "optional" } ],
+                                                                           operation=[ { "name": "edas.ave", "input": "cached", "axes": "t" } ] ) )
+    snode = next( node for node in request.operationManager.operations if isinstance( node, SourceNode ) )
+    array = xr.DataArray( np.random.rand( 4, 11, 11 ), dims=[ "t", "lat", "lon" ], coords=dict( t=np.arange( 4 ), lat=np.arange( 11.0 ), lon=np.arange( 11.0 ) ) )
+    cid = snode.varSource.getId()
+    EDASKCacheMgr.cacheRegion( cid, request.operationManager.domains.domains["d0"], EDASArray( "tas", "d0", array ) )
+    try:
+        dset = InputKernel().getCachedDataset( request, snode )
+        assert isinstance( dset, xr.Dataset ) and dset[cid].equals( array )
+    finally:
+        EDASKCacheMgr.evict( cid )
@@ -0,0 +1,84 @@
+import os, time, threading, pytest
+from edas.config import EdasEnv
+from edas.collection.agg import CatalogCache, CatalogCacheMgr, Collection
+from edas.test.agg_index_benchmark import write_synthetic_agg
+
+# Catalog cache: parsed Collection and Aggregation objects are reused until their spec file's mtime changes, the cache
+# is bounded, and spec files are not re-stat'ed more than once per check interval.
+
+def touch( path: str ):
+    stat = os.stat( path )
+    os.utime( path, ns=( stat.st_atime_ns, stat.st_mtime_ns + 1000000000 ) )
+
+@pytest.fixture
+def spec( tmp_path ):
+    path = os.path.join( str(tmp_path), "spec.txt" )
+    with open( path, "w" ) as f: f.write( "v1" )
+    return path
+
+def test_hit_until_modified( spec ):
+    cache = CatalogCache( 10, 0.0 )
+    calls = []
+    factory = lambda: calls.append( 1 ) or object()
+    obj = cache.get( "k", spec, factory )
+    assert cache.get( "k", spec, factory ) is obj
+    touch( spec )
+    assert cache.get( "k", spec, factory ) is not obj
+    assert len( calls ) == 2
+    assert cache.stats() == dict( hits=1, misses=2, evictions=0, entries=1, maxEntries=10 )
+
+def test_check_interval( spec ):
+    cache = CatalogCache( 10, 60.0 )
+    obj = cache.get( "k", spec, object )
+    touch( spec )
+    assert cache.get( "k", spec, object ) is obj      # not re-stat'ed within the check interval
+
+def test_bounded( spec ):
+    cache = CatalogCache( 2, 0.0 )
+    objs = [ cache.get( f"k{i}", spec, object ) for i in range( 3 ) ]
+    assert cache.stats()["entries"] == 2 and cache.stats()["evictions"] == 1
+    assert cache.get( "k2", spec, object ) is objs[2]
+    assert cache.get( "k0", spec, object ) is not objs[0]
+
+def test_missing_file( tmp_path ):
+    cache = CatalogCache( 10, 0.0 )
+    obj = cache.get( "k", os.path.join( str(tmp_path), "missing" ), object )
+    assert cache.get( "k", os.path.join( str(tmp_path), "missing" ), object ) is obj
+
+def test_threads( spec ):
+    cache = CatalogCache( 10, 0.0 )
+    results, errors = [], []
+    def worker():
+        try:
+            for i in range( 200 ): results.append( cache.get( f"k{i%20}", spec, object ) )
+        except Exception as err: errors.append( err )
+    threads = [ threading.Thread( target=worker ) for i in range( 8 ) ]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    stats = cache.stats()
+    assert not errors and len( results ) == 1600
+    assert stats["hits"] + stats["misses"] == 1600 and stats["entries"] <= 10
+
+def test_collection_and_aggregation( tmp_path, monkeypatch ):
+    monkeypatch.setattr( Collection, "baseDir", str(tmp_path) )
+    monkeypatch.setattr( CatalogCacheMgr, "checkInterval", 0.0 )
+    saved = EdasEnv.get( "agg.index.dir" )
+    EdasEnv.update( { "agg.index.dir": os.path.join( str(tmp_path), "index" ) } )
+    try:
+        csv_file = os.path.join( str(tmp_path), "testcol.csv" )
+        with open( csv_file, "w" ) as f: f.write( "tas, testagg\n" )
+        write_synthetic_agg( os.path.join( str(tmp_path), "testagg.ag1" ), 10 )
+        collection = Collection.new( "testcol" )
+        assert Collection.new( "testcol" ) is collection
+        agg = collection.getAggregation( "testagg" )
+        assert collection.getAggregation( "testagg" ) is agg
+        write_synthetic_agg( os.path.join( str(tmp_path), "testagg.ag1" ), 5 )
+        touch( os.path.join( str(tmp_path), "testagg.ag1" ) )
+        assert collection.getAggregation( "testagg" ).nFiles == 5
+        with open( csv_file, "a" ) as f: f.write( "pr, testagg\n" )
+        touch( csv_file )
+        assert Collection.new( "testcol" ).getAggId( "pr" ) == "testagg"
+    finally:
+        CatalogCacheMgr.clear()
+        if saved is None: EdasEnv.parms.pop( "agg.index.dir", None )
+        else: EdasEnv.update( { "agg.index.dir": saved } )
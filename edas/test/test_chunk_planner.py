@@ -0,0 +1,68 @@
+import pytest
+import numpy as np
+from edas.config import EdasEnv
+from edas.data.chunks import ChunkPlanner
+
+# Chunk plans for collection reads: chunks near the target size in bytes, split along time first, then the other
+# non-reduction dims, and only then the downstream reduction dims; the target is capped by the worker memory limit.
+
+SHAPE = dict( time=8760, lat=361, lon=576 )       # a year of hourly MERRA2 fields, 7.3 GB as float32
+
+def plan( shape=SHAPE, dtype=np.float32, reductionDims=(), targetBytes=100000000 ):
+    return ChunkPlanner( shape, dtype, reductionDims, "time", targetBytes ).plan()
+
+def nbytes( chunks, itemsize=4 ): return itemsize * int( np.prod( list( chunks.values() ) ) )
+
+def test_fits():
+    assert plan( dict( time=24, lat=361, lon=576 ) ) == dict( time=24, lat=361, lon=576 )
+
+def test_time_split_first():
+    chunks = plan()
+    assert chunks["lat"] == 361 and chunks["lon"] == 576
+    assert 0.5e8 < nbytes( chunks ) <= 1.0e8
+
+def test_dtype():
+    assert plan( dtype=np.float64 )["time"] * 2 <= plan()["time"] + 1
+
+def test_time_reduction():
+    chunks = plan( reductionDims=[ "time" ] )
+    assert chunks["time"] == 8760 and chunks["lat"] < 361 and chunks["lon"] < 576
+    assert nbytes( chunks ) <= 1.0e8
+
+def test_reduction_dims_split_last():
+    chunks = plan( reductionDims=[ "lat" ], targetBytes=200000 )
+    assert chunks["time"] == 1 and chunks["lat"] == 361 and chunks["lon"] < 576
+    assert nbytes( chunks ) <= 200000
+    chunks = plan( reductionDims=[ "lat" ], targetBytes=1000 )
+    assert chunks["time"] == 1 and chunks["lon"] == 1 and chunks["lat"] < 361
+
+def test_spatial_split_when_time_exhausted():
+    chunks = plan( targetBytes=200000 )
+    assert chunks["time"] == 1 and nbytes( chunks ) <= 200000
+    assert chunks["lat"] < 361 and chunks["lon"] < 576
+
+def test_target_bytes( monkeypatch ):
+    saved = EdasEnv.get( "chunk.bytes" )
+    EdasEnv.update( { "chunk.bytes": "64M" } )
+    try:
+        monkeypatch.setattr( ChunkPlanner, "getWorkerMemoryPerThread", classmethod( lambda cls: None ) )
+        assert ChunkPlanner.getTargetBytes() == 64000000
+        monkeypatch.setattr( ChunkPlanner, "getWorkerMemoryPerThread", classmethod( lambda cls: 100000000 ) )
+        assert ChunkPlanner.getTargetBytes() == 25000000
+        assert ChunkPlanner( SHAPE ).targetBytes == 25000000
+    finally:
+        if saved is None: EdasEnv.parms.pop( "chunk.bytes", None )
+        else: EdasEnv.update( { "chunk.bytes": saved } )
+
+def test_reduction_dims_mapping():
+    coordMap = dict( t="time", y="lat", x="lon" )
+    assert ChunkPlanner.getReductionDims( [ "T", "x", "z" ], coordMap ) == [ "time", "lon" ]
+
+@pytest.mark.parametrize( "sizes, timeChunk, expected", [
+    ( [ 24 ] * 5, 48, [ ( 0, 2 ), ( 2, 4 ), ( 4, 5 ) ] ),
+    ( [ 24 ] * 3, 10, [ ( 0, 1 ), ( 1, 2 ), ( 2, 3 ) ] ),      # files longer than the chunk form groups of their own
+    ( [ 24 ] * 3, None, [ ( 0, 3 ) ] ),
+    ( [], 48, [] ),
+] )
+def test_file_groups( sizes, timeChunk, expected ):
+    assert ChunkPlanner.fileGroups( sizes, timeChunk ) == expected
@@ -0,0 +1,64 @@
+import pytest
+import numpy as np
+import xarray as xr
+import dask.array as da
+from distributed import Client, LocalCluster
+from edas.workflow.data import EDASArray
+from edas.data.cache import CacheManager, ClusterCache, SpillCache
+
+# The cluster tier of the array cache: arrays are persisted and published on the scheduler, shared by every cache
+# connected to it, evicted in LRU order beyond the tier's size, and unpublished when evicted or removed.
+
+NBYTES = 8 * 4 * 50 * 50
+
+def roi( index: int ) -> EDASArray:
+    data = da.ones( ( 4, 50, 50 ), chunks=( 2, 50, 50 ) ) * index
+    return EDASArray( f"roi{index}", "d0", xr.DataArray( data, dims=["t","y","x"], name=f"roi{index}" ) )
+
+@pytest.fixture( scope="module" )
+def client():
+    with LocalCluster( n_workers=1, threads_per_worker=2, processes=False, dashboard_address=None ) as cluster, Client( cluster ) as client:
+        yield client
+
+@pytest.fixture
+def cache( client ):
+    cache = ClusterCache( True, 2 * NBYTES )
+    yield cache
+    for key in cache.keys(): cache.remove( key )
+
+def test_disabled_without_client():
+    cache = ClusterCache( False, NBYTES )
+    assert not cache.enabled and not cache.cache( "roi1|d0", roi( 1 ) )
+    assert cache.get( "roi1|d0" ) is None and cache.stats()["enabled"] is False
+
+def test_shared( client, cache ):
+    assert cache.cache( "roi1|d0", roi( 1 ) )
+    other = ClusterCache( True, 2 * NBYTES )
+    array = other.get( "roi1|d0" )
+    assert array is not None and array.domId == "d0" and float( array.xr.mean().values ) == 1.0
+    assert other.keys() == [ "roi1|d0" ] and other.stats()["nbytes"] == NBYTES
+    assert ClusterCache.datasetName( "roi1|d0" ) in client.list_datasets()
+
+def test_lru_eviction( client, cache ):
+    cache.cache( "roi1|d0", roi( 1 ) )
+    cache.cache( "roi2|d0", roi( 2 ) )
+    assert cache.get( "roi1|d0" ) is not None
+    cache.cache( "roi3|d0", roi( 3 ) )
+    assert sorted( cache.keys() ) == [ "roi1|d0", "roi3|d0" ] and cache.evictions == 1
+    assert ClusterCache.datasetName( "roi2|d0" ) not in client.list_datasets()
+    assert cache.get( "roi2|d0" ) is None
+
+def test_remove( client, cache ):
+    cache.cache( "roi1|d0", roi( 1 ) )
+    cache.remove( "roi1|d0" )
+    assert cache.keys() == [] and ClusterCache.datasetName( "roi1|d0" ) not in client.list_datasets()
+
+def test_cache_manager( client, cache ):
+    manager = CacheManager()
+    manager.spillCache = SpillCache( None, 0 )
+    manager.clusterCache = cache
+    manager.cache( "roi1|d0", roi( 1 ) )
+    assert len( manager ) == 0 and "roi1|d0" in manager and manager.maxEntrySize == cache.maxSize
+    assert float( manager.get( "roi1|d0" ).xr.mean().values ) == 1.0
+    assert [ entry["tier"] for entry in manager.entries() ] == [ "cluster" ]
+    assert manager.evict( "roi1" ) == [ "roi1|d0" ] and cache.keys() == []
@@ -0,0 +1,91 @@
+import os, pytest
+import numpy as np
+import xarray as xr
+from datetime import datetime, timezone
+from edas.config import EdasEnv
+from edas.collection.agg import Aggregation, Collection, CatalogCacheMgr
+from edas.collection.virtual import VirtualDataset
+from edas.collection.convert import ZarrConverter
+from edas.process.source import DataSource, SourceType
+from edas.workflow.kernel import InputKernel
+from edas.test.file_aligned_chunks_benchmark import write_synthetic_collection
+from edas.test.zarr_conversion_benchmark import InterruptedConverter, Interrupted
+
+# Zarr conversion: the converted store must hold the aggregation's data with the requested chunks, an interrupted
+# conversion must resume with only the blocks it hadn't written, and completed stores are served by InputKernel.
+
+NFILES, NSTEPS = 6, 24
+CHUNKS = { "time": 12 }
+
+class CountingConverter( ZarrConverter ):
+    blocks = []
+    def writeBlock( self, dset, timeVars, tname, block, progress ):
+        CountingConverter.blocks.append( block )
+        super( CountingConverter, self ).writeBlock( dset, timeVars, tname, block, progress )
+
+@pytest.fixture( scope="module" )
+def agg( tmp_path_factory ):
+    work_dir = str( tmp_path_factory.mktemp( "convert" ) )
+    saved = EdasEnv.get( "agg.index.dir" )
+    EdasEnv.update( { "agg.index.dir": os.path.join( work_dir, "index" ) } )
+    yield Aggregation( "test", write_synthetic_collection( work_dir, NFILES, NSTEPS ) )
+    if saved is None: EdasEnv.parms.pop( "agg.index.dir", None )
+    else: EdasEnv.update( { "agg.index.dir": saved } )
+
+def test_convert( agg, tmp_path ):
+    store = os.path.join( str(tmp_path), "test.zarr" )
+    assert not ZarrConverter.isComplete( store )
+    ZarrConverter( agg, store, CHUNKS, blockChunks=2 ).convert()
+    assert ZarrConverter.isComplete( store )
+    converted = xr.open_zarr( store, consolidated=True )
+    assert converted.tas.data.chunksize[0] == 12
+    assert np.array_equal( converted.tas.values, VirtualDataset( agg ).open( [ "tas" ] ).tas.values )
+    assert np.allclose( converted.lat.values, np.linspace( -90.0, 90.0, converted.lat.size ) )
+
+def test_resume( agg, tmp_path ):
+    store = os.path.join( str(tmp_path), "test.zarr" )
+    InterruptedConverter.maxBlocks = 3
+    with pytest.raises( Interrupted ): InterruptedConverter( agg, store, CHUNKS, blockChunks=1, nParallel=1 ).convert()
+    assert not ZarrConverter.isComplete( store )
+    CountingConverter.blocks = []
+    CountingConverter( agg, store, CHUNKS, blockChunks=1 ).convert()
+    assert len( CountingConverter.blocks ) == NFILES * NSTEPS // 12 - 3
+    assert ( 0, 12 ) not in CountingConverter.blocks
+    assert ZarrConverter.isComplete( store )
+    converted = xr.open_zarr( store, consolidated=True )
+    assert np.array_equal( converted.tas.values, VirtualDataset( agg ).open( [ "tas" ] ).tas.values )
+    CountingConverter.blocks = []
+    CountingConverter( agg, store, CHUNKS ).convert()
+    assert CountingConverter.blocks == []
+
+def test_restart_on_new_chunks( agg, tmp_path ):
+    store = os.path.join( str(tmp_path), "test.zarr" )
+    InterruptedConverter.maxBlocks = 2
+    with pytest.raises( Interrupted ): InterruptedConverter( agg, store, CHUNKS, blockChunks=1, nParallel=1 ).convert()
+    CountingConverter.blocks = []
+    CountingConverter( agg, store, { "time": 24 }, blockChunks=1 ).convert()
+    assert len( CountingConverter.blocks ) == NFILES
+    assert xr.open_zarr( store, consolidated=True ).tas.data.chunksize[0] == 24
+
+def test_served_by_input_kernel( agg, tmp_path, monkeypatch ):
+    zarrDir = str(tmp_path)
+    store = ZarrConverter( agg, ZarrConverter.getStorePath( zarrDir, "hourly" ), CHUNKS ).convert()
+    start, end = datetime( 1990, 1, 2, tzinfo=timezone.utc ), datetime( 1990, 1, 3, 23, tzinfo=timezone.utc )
+    window = InputKernel().openZarrStore( store, [ "tas" ], { "lat": slice( 0, 10 ) }, start, end )
+    assert dict( window.tas.sizes ) == dict( time=48, lat=10, lon=window.lon.size )
+    monkeypatch.setattr( Collection, "baseDir", zarrDir )
+    with open( os.path.join( zarrDir, "zarrcol.csv" ), "w" ) as f: f.write( f"# zarr.dir, {zarrDir}\ntas, hourly\n" )
+    try:
+        assert ZarrConverter.getStore( Collection.new( "zarrcol" ), "hourly" ) == store
+        assert ZarrConverter.getStore( Collection.new( "zarrcol" ), "daily" ) is None
+    finally: CatalogCacheMgr.clear()
+
+def test_zarr_source():
+    saved = EdasEnv.get( "sources.allowed" )
+    EdasEnv.update( { "sources.allowed": "collection,zarr" } )
+    try:
+        source = DataSource( "zarr:/data/hourly.zarr", SourceType.uri )
+        assert source.type == SourceType.zarr and source.address == "/data/hourly.zarr"
+    finally:
+        if saved is None: EdasEnv.parms.pop( "sources.allowed", None )
+        else: EdasEnv.update( { "sources.allowed": saved } )
@@ -0,0 +1,88 @@
+import os, pytest
+import numpy as np
+import xarray as xr
+from datetime import datetime, timezone
+from edas.config import EdasEnv
+from edas.collection.agg import Aggregation, CatalogCacheMgr
+from edas.collection.coords import CoordIndex, CoordLookupMgr, CoordWindow
+from edas.process.task import TaskRequest
+from edas.test.file_aligned_chunks_benchmark import write_synthetic_collection
+from edas.test.coord_index_benchmark import crop_and_subset
+
+# Coordinate index: windows taken from the index must hold the coordinates of the datasets opened from the same files,
+# time selection and domain cropping against them must match xarray's, and the index is rebuilt when the catalog changes.
+
+NFILES, NSTEPS = 6, 24
+DOMAIN = { "name": "d0", "lat": { "start": 20.0, "end": 50.0, "system": "values" }, "lon": { "start": -120.0, "end": -60.0, "system": "values" },
+           "time": { "start": "1990-01-02T06:00:00", "end": "1990-01-04T18:00:00", "system": "values" } }
+
+@pytest.fixture
+def agg( tmp_path ):
+    saved = EdasEnv.get( "agg.index.dir" )
+    EdasEnv.update( { "agg.index.dir": os.path.join( str(tmp_path), "index" ) } )
+    yield Aggregation( "test", write_synthetic_collection( str(tmp_path), NFILES, NSTEPS ) )
+    CatalogCacheMgr.clear()
+    if saved is None: EdasEnv.parms.pop( "agg.index.dir", None )
+    else: EdasEnv.update( { "agg.index.dir": saved } )
+
+def open_files( agg: Aggregation, iStart: int, iEnd: int ) -> xr.Dataset:
+    return xr.open_mfdataset( agg.pathRange( iStart, iEnd ), engine="netcdf4", parallel=False )
+
+def test_window_matches_dataset( agg ):
+    window = CoordLookupMgr.window( agg, 1, 4, { "lat": slice( 5, 15 ) } )
+    dset = open_files( agg, 1, 4 ).isel( lat=slice( 5, 15 ) )
+    assert np.array_equal( window.values( "t" ), dset.time.values )
+    assert np.array_equal( window.values( "y" ), dset.lat.values ) and np.array_equal( window.values( "x" ), dset.lon.values )
+    assert window.fits( dset.tas.rename( time="t", lat="y", lon="x" ) )
+    assert not window.fits( open_files( agg, 1, 3 ).tas.rename( time="t", lat="y", lon="x" ) )
+
+def test_indexer( agg ):
+    window = CoordLookupMgr.window( agg )
+    dset = open_files( agg, 0, NFILES )
+    assert window.indexer( "y", 31.0 ) == int( np.abs( dset.lat.values - 31.0 ).argmin() )
+    tslice = window.indexer( "t", slice( "1990-01-02T03:30", "1990-01-03" ) )
+    assert np.array_equal( window.values( "t" )[ tslice ], dset.time.sel( time=slice( "1990-01-02T03:30", "1990-01-03" ) ).values )
+    assert set( window.isel( { "t": 3, "y": slice( 0, 2 ) } ).coords ) == { "x", "y" }
+
+def test_select( agg ):
+    start, end = datetime( 1990, 1, 2, 6, tzinfo=timezone.utc ), datetime( 1990, 1, 4, 18, tzinfo=timezone.utc )
+    iStart, iEnd = agg.periodRange( start, end )
+    tslice, window = CoordLookupMgr.select( agg, iStart, iEnd, start, end )
+    dset = open_files( agg, iStart, iEnd )
+    expected = dset.time.sel( time=slice( "1990-01-02T06", "1990-01-04T18" ) ).values
+    assert np.array_equal( dset.time.values[ tslice ], expected ) and np.array_equal( window.values( "t" ), expected )
+    tslice, window = CoordLookupMgr.select( agg, iStart, iEnd )
+    assert tslice is None and window.values( "t" ).size == ( iEnd - iStart ) * NSTEPS
+
+def test_crop_matches_dataset_coords( agg ):
+    request = TaskRequest( None, "test", "test", "test", None, {} )
+    dset = open_files( agg, 0, NFILES )
+    reference = crop_and_subset( request, dset, None, DOMAIN )
+    result = crop_and_subset( request, dset, CoordLookupMgr.window( agg ), DOMAIN )
+    assert result.shape == reference.shape and result.shape[0] == 61
+    assert np.array_equal( result.t.values, reference.t.values ) and np.array_equal( result.values, reference.values )
+
+def test_persistent_and_rebuilt( agg ):
+    CoordIndex.build( agg )
+    assert CoordIndex.open( agg.spec ) is not None
+    with open( agg.spec, "a" ) as f: f.write( "\n" )
+    stat = os.stat( agg.spec )
+    os.utime( agg.spec, ns=( stat.st_atime_ns, stat.st_mtime_ns + 1000000000 ) )
+    assert CoordIndex.open( agg.spec ) is None
+    assert CoordIndex.load( agg ).time.size == NFILES * NSTEPS
+    assert CoordIndex.open( agg.spec ) is not None
+
+def test_catalog_time_mismatch( tmp_path, agg ):
+    with open( agg.spec ) as f: lines = f.readlines()
+    shifted = os.path.join( str(tmp_path), "shifted.ag1" )
+    with open( shifted, "w" ) as f:
+        for line in lines:
+            if line.startswith( "F;" ):
+                toks = line.split( ";" )
+                line = ";".join( [ toks[0], f" {int(toks[1]) + 30}" ] + toks[2:] )
+            f.write( line )
+    shiftedAgg = Aggregation( "shifted", shifted )
+    assert CoordLookupMgr.checkTime( agg )
+    assert not CoordLookupMgr.checkTime( shiftedAgg )
+    start, end = datetime( 1990, 1, 2, tzinfo=timezone.utc ), datetime( 1990, 1, 3, tzinfo=timezone.utc )
+    assert CoordLookupMgr.select( shiftedAgg, 0, NFILES, start, end )[0] is None
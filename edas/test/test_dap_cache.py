@@ -0,0 +1,48 @@
+import os, time
+import numpy as np
+from edas.data.dap import BlockCache
+
+# The DAP block cache: keys include the dataset version, blocks are shared by the processes using the same cache dir,
+# and the quota bounds the directory's contents, whichever process wrote them.  Two BlockCaches stand in for two workers.
+
+BLOCK = np.zeros( 1000 )        # 8128 bytes as .npy
+BLOCKSIZE = 8128
+
+def block( index: int ) -> np.ndarray:
+    return BLOCK + index
+
+def directory_size( cacheDir ) -> int:
+    return sum( os.path.getsize( os.path.join( root, file ) ) for root, dirs, files in os.walk( cacheDir ) for file in files )
+
+def test_block_versions( tmp_path ):
+    cache = BlockCache( str( tmp_path ), 10 * BLOCKSIZE )
+    slab = ( slice( 0, 10 ), slice( 0, 100 ) )
+    cache.put( BlockCache.key( "http://server/data", '"v1"', "tas", slab ), block( 1 ) )
+    assert ( cache.get( BlockCache.key( "http://server/data", '"v1"', "tas", slab ) ) == block( 1 ) ).all()
+    assert cache.get( BlockCache.key( "http://server/data", '"v2"', "tas", slab ) ) is None
+    assert cache.get( BlockCache.key( "http://server/data", '"v1"', "tas", ( slice( 10, 20 ), slice( 0, 100 ) ) ) ) is None
+
+def test_blocks_shared_by_workers( tmp_path ):
+    first, second = BlockCache( str( tmp_path ), 10 * BLOCKSIZE ), BlockCache( str( tmp_path ), 10 * BLOCKSIZE )
+    assert first.get( "00a" ) is None and second.get( "00a" ) is None
+    first.put( "00a", block( 1 ) )
+    assert ( second.get( "00a" ) == block( 1 ) ).all()
+
+def test_quota_across_workers( tmp_path ):
+    # Each worker sees the others' blocks when it rescans the cache dir ( here on every access ), and evicts them too.
+    workers = [ BlockCache( str( tmp_path ), 10 * BLOCKSIZE ) for index in range( 3 ) ]
+    for worker in workers: worker.ScanInterval = 0.0
+    for index in range( 30 ):
+        workers[ index % 3 ].put( f"{index:03d}", block( index ) )
+        assert directory_size( tmp_path ) <= 10 * BLOCKSIZE
+    assert ( workers[0].get( "029" ) == block( 29 ) ).all() and workers[0].get( "000" ) is None
+
+def test_lru_across_workers( tmp_path ):
+    # A hit in one worker touches the block, so the other workers evict it last.
+    first, second = BlockCache( str( tmp_path ), 4 * BLOCKSIZE ), BlockCache( str( tmp_path ), 4 * BLOCKSIZE )
+    for index in range( 4 ):
+        first.put( f"{index:03d}", block( index ) )
+        time.sleep( 0.01 )
+    second.get( "000" )
+    second.put( "004", block( 4 ) )
+    assert first.get( "000" ) is not None and first.get( "001" ) is None
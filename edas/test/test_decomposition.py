@@ -0,0 +1,39 @@
+import pytest
+import numpy as np
+import dask.array as da
+from eofs.standard import Eof
+from edas.data.decomposition import EofSolver
+
+# EofSolver on a chunked ( time x space ) matrix with planted modes, against eofs.standard.Eof on the in-memory matrix.
+
+NMODES = 3
+
+def planted( ntimes: int, npoints: int ) -> np.ndarray:
+    rs = np.random.RandomState( 0 )
+    patterns = np.linalg.qr( rs.standard_normal( ( npoints, NMODES ) ) )[0].T
+    amplitudes = rs.standard_normal( ( ntimes, NMODES ) ) * np.array( [ 40.0, 20.0, 10.0 ] )
+    return amplitudes.dot( patterns ) + 0.1 * rs.standard_normal( ( ntimes, npoints ) ) + 280.0
+
+@pytest.mark.parametrize( "method", EofSolver.Methods )
+@pytest.mark.parametrize( "shape", [ ( 240, 60 ), ( 60, 240 ) ] )
+def test_eof_solver( method, shape ):
+    data = planted( *shape )
+    data[:,5] = np.nan
+    solver = EofSolver( da.from_array( data, chunks=( 40, shape[1] ) ), NMODES, method=method )
+    reference = Eof( data, center=True )
+    expected = reference.eofs( neofs=NMODES ).reshape( NMODES, -1 )
+    eofs = solver.eofs()
+    assert np.isnan( eofs[:,5] ).all()
+    valid = ~np.isnan( expected[0] )
+    signs = np.sign( ( eofs[:,valid] * expected[:,valid] ).sum( axis=1 ) )
+    assert np.allclose( eofs[:,valid], signs[:,None] * expected[:,valid], atol=1e-3 )
+    assert np.allclose( solver.varianceFraction(), reference.varianceFraction( neigs=NMODES ), atol=1e-4 )
+    assert np.allclose( solver.eigenvalues(), reference.eigenvalues( neigs=NMODES ), rtol=1e-3 )
+    assert np.allclose( np.abs( solver.pcs() ), np.abs( reference.pcs( npcs=NMODES, pcscaling=0 ) ), rtol=1e-3, atol=1e-2 )
+
+def test_eof_solver_tsqr_fallback():
+    # tsqr blocks span the whole short axis; above maxBlockBytes the solver uses the randomized SVD instead.
+    data = da.from_array( planted( 240, 60 ), chunks=( 40, 60 ) )
+    assert EofSolver.blockBytes( data ) == 60 * 60 * 8
+    assert EofSolver( data, NMODES, method="tsqr", maxBlockBytes=60 * 60 * 8 ).method == "tsqr"
+    assert EofSolver( data, NMODES, method="tsqr", maxBlockBytes=60 * 60 * 4 ).method == "randomized"
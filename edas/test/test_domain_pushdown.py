@@ -0,0 +1,46 @@
+import os, pytest
+import numpy as np
+import netCDF4
+from edas.config import EdasEnv
+from edas.collection.agg import Aggregation
+from edas.collection.virtual import VirtualDataset
+from edas.process.domain import Domain
+
+# Domain push-down index slices are computed from the catalog's axis bounds: they are only used on axes whose catalog
+# coordinates match the coordinate variables of the aggregation's files.
+
+BOX = { "lat": { "start": 40.0, "end": 41.0, "system": "values" }, "lon": { "start": -100.0, "end": -99.0, "system": "values" } }
+
+def write_aggregation( work_dir: str, lat_bounds ) -> Aggregation:
+    with netCDF4.Dataset( os.path.join( work_dir, "file0.nc" ), "w" ) as ds:
+        ds.createDimension( "time", None ); ds.createDimension( "lat", 181 ); ds.createDimension( "lon", 360 )
+        ds.createVariable( "time", "f8", ("time",) )[:] = np.arange( 2 )
+        ds.createVariable( "lat", "f8", ("lat",) )[:] = np.linspace( -90.0, 90.0, 181 )
+        ds.createVariable( "lon", "f8", ("lon",) )[:] = np.linspace( -180.0, 179.0, 360 )
+        ds.createVariable( "tas", "f4", ("time", "lat", "lon") )[:] = 0.0
+    agg_file = os.path.join( work_dir, f"test{lat_bounds[0]}.ag1" )
+    with open( agg_file, "w" ) as f:
+        f.write( f"P; base.path; {work_dir}\n" )
+        f.write( "A; time; time; T; 2; minutes since 1970-01-01T00:00:00Z; 0; 1\n" )
+        f.write( f"A; lat; latitude; Y; 181; degrees_north; {lat_bounds[0]}; {lat_bounds[1]}\n" )
+        f.write( "A; lon; longitude; X; 360; degrees_east; -180.0; 179.0\n" )
+        f.write( "V; tas; tas; tas; Surface air temperature; 2,181,360; lat:1.0,lon:1.0; time lat lon; K\n" )
+        f.write( "F; 0; 2; file0.nc\n" )
+    return Aggregation( "test", agg_file )
+
+@pytest.fixture
+def work_dir( tmp_path ):
+    saved = EdasEnv.get( "agg.index.dir" )
+    EdasEnv.update( { "agg.index.dir": os.path.join( str(tmp_path), "index" ) } )
+    yield str(tmp_path)
+    if saved is None: EdasEnv.parms.pop( "agg.index.dir", None )
+    else: EdasEnv.update( { "agg.index.dir": saved } )
+
+def test_matching_catalog_pushes_down( work_dir ):
+    region = VirtualDataset( write_aggregation( work_dir, ( -90.0, 90.0 ) ) ).getRegion( Domain.new( BOX ) )
+    assert set( region ) == { "lat", "lon" }
+    assert region["lat"] == slice( 129, 133 )
+
+def test_mismatched_catalog_axis_is_not_pushed_down( work_dir ):
+    region = VirtualDataset( write_aggregation( work_dir, ( -89.5, 90.5 ) ) ).getRegion( Domain.new( BOX ) )
+    assert set( region ) == { "lon" }
@@ -0,0 +1,15 @@
+import pytest
+from edas.data.chunks import ChunkPlanner
+
+# Time chunks for open_mfdataset, which chunks each file separately: whole files when they fit, else an even split.
+
+@pytest.mark.parametrize( "sizes, timeChunk, expected", [
+    ( [ 24 ] * 10, 100, 24 ),                   # daily hourly files: one chunk per file
+    ( [ 672, 744, 720, 744 ], 1000, 744 ),      # monthly hourly files that fit: one chunk per file
+    ( [ 744, 720, 744 ], 100, 93 ),             # longer files split evenly ( 744 = 8 x 93 )
+    ( [ 240 ] * 5, 100, 80 ),                   # 240 = 3 x 80
+    ( [ 743 ] * 3, 100, 100 ),                  # prime length: no usable divisor, keep the planned chunk
+    ( [ 24 ], None, None ),
+] )
+def test_file_chunk( sizes, timeChunk, expected ):
+    assert ChunkPlanner.fileChunk( sizes, timeChunk ) == expected
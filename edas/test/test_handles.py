@@ -0,0 +1,60 @@
+import os, pickle
+import numpy as np
+import xarray as xr
+from edas.data.handles import HandlePool, HandlePoolMgr, PooledNetCDF4Backend
+
+# The per-process netCDF handle pool: reuse, LRU eviction and mtime invalidation, and the xarray read paths through it.
+
+def netcdf_files( directory, nfiles: int ):
+    paths = []
+    for index in range( nfiles ):
+        path = os.path.join( directory, f"file-{index}.nc" )
+        xr.Dataset( { "tas": ( ( "time", "y" ), np.full( ( 4, 3 ), float( index ) ) ) }, coords=dict( time=np.arange( 4 ) + 4 * index ) ).to_netcdf( path )
+        paths.append( path )
+    return paths
+
+def touch( path: str ):
+    stat = os.stat( path )
+    os.utime( path, ns=( stat.st_atime_ns, stat.st_mtime_ns + 1000000000 ) )
+
+def test_pool_reuse_and_eviction( tmp_path ):
+    paths = netcdf_files( tmp_path, 3 )
+    pool = HandlePool( 2 )
+    for path in paths + paths[1:]:
+        with pool.open( path ) as ds: assert ds.variables["tas"][0,0] == paths.index( path )
+    assert ( pool.hits, pool.misses, pool.evictions ) == ( 2, 3, 1 )
+
+def test_pool_keeps_handles_in_use( tmp_path ):
+    # A handle evicted or invalidated while in use is closed only when its last user releases it.
+    paths = netcdf_files( tmp_path, 2 )
+    pool = HandlePool( 1 )
+    with pool.open( paths[0] ) as ds:
+        with pool.open( paths[1] ): pass
+        touch( paths[1] )
+        with pool.open( paths[1] ): pass
+        assert ds.isopen() and pool.evictions == 1 and pool.invalidations == 1
+    assert not ds.isopen()
+
+def test_pool_invalidation( tmp_path ):
+    paths = netcdf_files( tmp_path, 1 )
+    pool = HandlePool( 4 )
+    with pool.open( paths[0] ) as first: pass
+    touch( paths[0] )
+    with pool.open( paths[0] ) as second: assert second is not first
+    assert pool.invalidations == 1 and not first.isopen()
+
+def test_open_mfdataset_shares_handles( tmp_path ):
+    # Datasets opened by successive requests read through the same pooled handles, also when their graphs are pickled.
+    paths = netcdf_files( tmp_path, 3 )
+    HandlePoolMgr.clear()
+    misses = HandlePoolMgr.misses
+    for iRequest in range( 3 ):
+        dset = xr.open_mfdataset( paths, engine=PooledNetCDF4Backend, chunks={} )
+        assert float( dset.tas.mean() ) == 1.0
+        assert float( pickle.loads( pickle.dumps( dset.tas.data ) ).mean().compute() ) == 1.0
+        dset.close()
+    assert HandlePoolMgr.misses - misses == 3
+    touch( paths[0] )
+    invalidations = HandlePoolMgr.invalidations
+    xr.open_mfdataset( paths, engine=PooledNetCDF4Backend, chunks={} ).tas.mean().values
+    assert HandlePoolMgr.invalidations == invalidations + 1
@@ -0,0 +1,88 @@
+import os, time, pytest
+import numpy as np
+import xarray as xr
+from collections import OrderedDict
+from edas.config import EdasEnv
+from edas.collection.agg import Collection, CatalogCacheMgr
+from edas.process.task import TaskRequest
+from edas.workflow.data import EDASArray, EDASDataset, EDASDatasetCollection
+from edas.data.memo import ResultMemo, ResultMemoMgr
+from edas.test.file_aligned_chunks_benchmark import write_synthetic_collection
+from edas.test.result_memo_benchmark import dashboardRequest
+
+# Cross-request result memo: results are stored the second time a subtree runs and reused after that, invalidated when
+# the aggregation changes or the entry expires, and evicted in LRU order beyond the memo's size.
+
+def results( name: str, nbytes: int = 8000 ) -> EDASDatasetCollection:
+    collection = EDASDatasetCollection( "test" )
+    array = EDASArray( name, "d0", xr.DataArray( np.ones( nbytes // 8 ), dims=["t"], name=name ) )
+    collection[name] = EDASDataset( OrderedDict( [ ( name, array ) ] ), {} )
+    return collection
+
+@pytest.fixture
+def request0():
+    return TaskRequest( None, "test", "test", "test", None, {} )
+
+def test_stored_when_seen_twice( request0, tmp_path ):
+    memo, paths = ResultMemo( 100000, 600.0 ), [ str(tmp_path) ]
+    assert memo.get( "k0", paths, request0 ) is None
+    memo.put( "k0", paths, results( "r0" ) )
+    assert memo.stats()["entries"] == 0
+    memo.put( "k0", paths, results( "r0" ) )
+    reused = memo.get( "k0", paths, request0 )
+    assert [ array.name for array in reused.arrays ] == [ "r0" ] and memo.stats()["hits"] == 1 and memo.stats()["nbytes"] == 8000
+
+def test_invalidation( request0, tmp_path ):
+    memo, spec = ResultMemo( 100000, 600.0 ), os.path.join( str(tmp_path), "test.ag1" )
+    with open( spec, "w" ) as f: f.write( "v1" )
+    for iRun in range( 2 ): memo.put( "k0", [ spec ], results( "r0" ) )
+    assert memo.get( "k0", [ spec ], request0 ) is not None
+    with open( spec, "w" ) as f: f.write( "v2." )
+    assert memo.get( "k0", [ spec ], request0 ) is None
+    assert memo.stats()["invalidations"] == 1 and memo.stats()["entries"] == 0
+
+def test_ttl( request0 ):
+    memo = ResultMemo( 100000, 0.05 )
+    for iRun in range( 2 ): memo.put( "k0", [], results( "r0" ) )
+    time.sleep( 0.1 )
+    assert memo.get( "k0", [], request0 ) is None and memo.stats()["invalidations"] == 1
+
+def test_lru_eviction( request0 ):
+    memo = ResultMemo( 20000, 600.0 )
+    for key in [ "k0", "k1", "k0", "k1" ]: memo.put( key, [], results( key ) )
+    assert memo.get( "k0", [], request0 ) is not None
+    for iRun in range( 2 ): memo.put( "k2", [], results( "k2" ) )
+    assert memo.get( "k1", [], request0 ) is None and memo.get( "k0", [], request0 ) is not None
+    assert memo.stats()["evictions"] == 1
+    memo.put( "big", [], results( "big", 40000 ) )
+    memo.put( "big", [], results( "big", 40000 ) )
+    assert memo.get( "big", [], request0 ) is None
+
+def test_disabled( request0 ):
+    memo = ResultMemo( 0, 600.0 )
+    assert not memo.enabled and memo.key( request0, None ) == ( None, [] )
+
+def test_requests( tmp_path, monkeypatch ):
+    work_dir = str(tmp_path)
+    monkeypatch.setattr( Collection, "baseDir", work_dir )
+    monkeypatch.setattr( CatalogCacheMgr, "checkInterval", 0.0 )
+    monkeypatch.setattr( ResultMemoMgr, "maxSize", 1000000000 )
+    saved = EdasEnv.get( "agg.index.dir" )
+    EdasEnv.update( { "agg.index.dir": os.path.join( work_dir, "index" ) } )
+    try:
+        os.rename( write_synthetic_collection( work_dir, 4, 24 ), os.path.join( work_dir, "bench.ag1" ) )
+        with open( os.path.join( work_dir, "bench.csv" ), "w" ) as file: file.write( "tas,bench\n" )
+        ResultMemoMgr.clear()
+        hits, invalidations = ResultMemoMgr.hits, ResultMemoMgr.invalidations
+        reference = dashboardRequest( 0 )
+        for iRun in range( 2 ): assert np.array_equal( dashboardRequest( iRun + 1 ), reference )
+        assert ResultMemoMgr.hits == hits + 1
+        os.utime( os.path.join( work_dir, "bench.ag1" ), ns=( time.time_ns(), time.time_ns() + 1000000000 ) )
+        assert np.array_equal( dashboardRequest( 3 ), reference )
+        assert ResultMemoMgr.hits == hits + 1 and ResultMemoMgr.invalidations == invalidations + 1
+        assert np.array_equal( dashboardRequest( 4 ), reference ) and ResultMemoMgr.hits == hits + 2
+    finally:
+        ResultMemoMgr.clear()
+        CatalogCacheMgr.clear()
+        if saved is None: EdasEnv.parms.pop( "agg.index.dir", None )
+        else: EdasEnv.update( { "agg.index.dir": saved } )
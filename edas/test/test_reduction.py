@@ -0,0 +1,140 @@
+import pytest
+import numpy as np
+import pandas as pd
+import xarray as xr
+import dask
+import dask.array as da
+from edas.data.reduction import GroupedStats, TimeBins, Moments, QuantileSketch
+
+# The streaming reductions of edas.data.reduction against xarray, pandas and numpy, on small in-memory and chunked inputs.
+
+def hourly( ndays: int, chunk: int = None, nans: bool = True ) -> xr.DataArray:
+    data = np.random.RandomState( 0 ).standard_normal( ( 24 * ndays, 3, 4 ) ) + 280.0
+    if nans: data[ 5:40, 0, 0 ] = np.nan
+    array = xr.DataArray( data, dims=( "time", "y", "x" ), coords=dict( time=pd.date_range( "2000-01-01", periods=24 * ndays, freq="h" ) ) )
+    return array.chunk( dict( time=chunk ) ) if chunk else array
+
+@pytest.mark.parametrize( "chunk", [ None, 50, 24 * 7 ] )
+@pytest.mark.parametrize( "freq", [ "D", "MS" ] )
+def test_grouped_stats_resample( chunk, freq ):
+    array = hourly( 70, chunk )
+    stats = [ "mean", "max", "min", "std", "var", "sum", "count" ]
+    results = GroupedStats( stats ).apply( array, "time", TimeBins.resample( array, freq ) )
+    resampled = array.resample( time=freq )
+    for stat in stats:
+        assert np.allclose( results[stat].values, getattr( resampled, stat )( "time" ).values, equal_nan=True ), f"{stat} differs from xarray"
+
+def test_grouped_stats_climatology():
+    array = hourly( 70, 100 )
+    results = GroupedStats( [ "mean", "std" ] ).apply( array, "month", TimeBins.groupby( array, "month" ) )
+    grouped = array.groupby( "time.month" )
+    assert np.allclose( results["mean"].values, grouped.mean( "time" ).values, equal_nan=True )
+    assert np.allclose( results["std"].values, grouped.std( "time" ).values, equal_nan=True )
+
+SPANS = []
+
+class RecordingStats( GroupedStats ):
+    # Records the number of groups of each chunk's partials, and the number of groups the chunk touches.  Module level, so
+    # that dask pickles the class by reference and the calls are recorded in SPANS.
+    def chunkPartials( self, data, codes, ngroups ):
+        SPANS.append( ( ngroups, len( np.unique( codes[ codes >= 0 ] ) ) ) )
+        return GroupedStats.chunkPartials( self, data, codes, ngroups )
+
+def test_grouped_stats_chunk_partials():
+    # Each time chunk only produces the partials of the groups it spans ( 10 days ), not of all groups.
+    SPANS.clear()
+    array = hourly( 365, 24 * 10 )
+    results = RecordingStats( [ "mean" ] ).apply( array, "time", TimeBins.resample( array, "D" ) )
+    with dask.config.set( scheduler="sync" ): results["mean"].compute()
+    assert len( SPANS ) == 37 and all( ngroups == touched for ngroups, touched in SPANS ), f"Partials span more groups than their chunk: {SPANS}"
+    assert max( ngroups for ngroups, touched in SPANS ) == 10
+
+@pytest.mark.parametrize( "freq", [ "D", "MS", "YS" ] )
+def test_time_bins_resample( freq ):
+    array = hourly( 800, nans=False )
+    labels, codes, members = TimeBins.resample( array, freq )
+    expected = TimeBins.groups( array.resample( time=freq ), array.sizes["time"], TimeBins.resampleLabels( array.time.values, freq ) )
+    assert ( labels == expected[0] ).all() and ( codes == expected[1] ).all() and ( members == expected[2] ).all()
+
+@pytest.mark.parametrize( "period", [ "hour", "day", "month", "year" ] )
+def test_time_bins_groupby( period ):
+    array = hourly( 800, nans=False )
+    labels, codes, members = TimeBins.groupby( array, period )
+    expected = TimeBins.groups( array.groupby( "time." + period ), array.sizes["time"] )
+    assert ( labels == expected[0] ).all() and ( codes == expected[1] ).all() and ( members == expected[2] ).all()
+
+@pytest.mark.parametrize( "start", [ "1980-01-01", "1980-01-15T12:00" ] )
+def test_time_bins_monthly( start ):
+    # Monthly axes at a fixed day of month and time of day are regular, though their steps vary.
+    times = pd.date_range( "1980-01-01", periods=240, freq="MS" ) + ( pd.Timestamp( start ) - pd.Timestamp( "1980-01-01" ) )
+    array = xr.DataArray( np.arange( 240.0 ), dims=[ "time" ], coords=dict( time=times ) )
+    assert TimeBins.regular( array.time.values )
+    for freq in [ "MS", "YS" ]:
+        labels, codes, members = TimeBins.resample( array, freq )
+        expected = TimeBins.groups( array.resample( time=freq ), array.sizes["time"], TimeBins.resampleLabels( array.time.values, freq ) )
+        assert ( labels == expected[0] ).all() and ( codes == expected[1] ).all() and ( members == expected[2] ).all()
+    labels, codes, members = TimeBins.groupby( array, "month" )
+    assert ( codes == TimeBins.groups( array.groupby( "time.month" ), array.sizes["time"] )[1] ).all()
+    assert not TimeBins.regular( np.delete( times.values, 7 ) )
+
+def test_time_bins_irregular():
+    array = hourly( 40, nans=False ).drop_isel( time=[ 3, 100, 101 ] )
+    assert not TimeBins.regular( array.time.values )
+    labels, codes, members = TimeBins.resample( array, "D" )
+    assert ( members == array.resample( time="D" ).count( "time" ).values[:,0,0] ).all()
+
+@pytest.mark.parametrize( "chunk", [ None, 37 ] )
+def test_moments( chunk ):
+    data = np.random.RandomState( 1 ).gamma( 2.0, size=( 500, 3, 4 ) ) + 1.0e4
+    data[ 10:60, 1, 1 ] = np.nan
+    accumulators = Moments( 4 ).accumulate( da.from_array( data, chunks=( chunk, 3, 4 ) ) if chunk else data, [ 0 ] )
+    value = lambda stat, ddof=0: np.asarray( Moments.stat( accumulators, stat, ddof ) )
+    deviation = data - np.nanmean( data, axis=0 )
+    m2 = np.nanmean( deviation**2, axis=0 )
+    assert np.allclose( value( "mean" ), np.nanmean( data, axis=0 ) )
+    assert np.allclose( value( "var" ), np.nanvar( data, axis=0 ) )
+    assert np.allclose( value( "std", 1 ), np.nanstd( data, axis=0, ddof=1 ) )
+    assert np.allclose( value( "skew" ), np.nanmean( deviation**3, axis=0 ) / m2**1.5 )
+    assert np.allclose( value( "kurt" ), np.nanmean( deviation**4, axis=0 ) / m2**2 - 3.0 )
+
+def test_moments_empty_cells():
+    data = np.full( ( 10, 2 ), np.nan )
+    data[:,1] = np.arange( 10.0 )
+    accumulators = Moments( 2 ).accumulate( da.from_array( data, chunks=( 3, 2 ) ), [ 0 ] )
+    assert np.isnan( np.asarray( Moments.stat( accumulators, "var" ) )[0] )
+    assert np.allclose( np.asarray( Moments.stat( accumulators, "var" ) )[1], np.var( np.arange( 10.0 ) ) )
+
+QUANTILES = [ 0.0, 0.1, 0.5, 0.9, 1.0 ]
+
+def test_quantile_sketch_exact():
+    # Cells with at most 1/error values are summarised exactly: numpy's linear quantiles.
+    data = np.random.RandomState( 2 ).standard_normal( ( 80, 3, 4 ) )
+    data[ :30, 0, 0 ] = np.nan
+    results = QuantileSketch( QUANTILES, error=0.01 ).apply( data, [ 0 ] )
+    for q, result in zip( QUANTILES, results ):
+        assert np.allclose( result, np.nanquantile( data, q, axis=0 ) )
+
+def test_quantile_sketch_chunked():
+    error = 0.01
+    data = np.random.RandomState( 3 ).gamma( 2.0, size=( 20000, 2, 3 ) )
+    results = QuantileSketch( QUANTILES, error=error ).apply( da.from_array( data, chunks=( 700, 2, 3 ) ), [ 0 ] )
+    for q, result in zip( QUANTILES, results ):
+        rank = ( data < np.asarray( result ) ).mean( axis=0 )
+        assert np.abs( rank - q ).max() <= error, f"Rank error of quantile {q} exceeds {error}"
+
+def test_grouped_stats_variance_offset():
+    # Partial variances are merged as centred second moments, so a large offset does not cancel the variance.
+    array = ( hourly( 70, 50 ) - 280.0 ) * 0.01 + 1.0e6
+    results = GroupedStats( [ "var" ] ).apply( array, "time", TimeBins.resample( array, "D" ) )
+    assert np.allclose( results["var"].values, array.resample( time="D" ).var( "time" ).values, rtol=1e-6, equal_nan=True )
+
+def test_quantile_sketch_chunk_width():
+    # Chunk sketches hold no more centroids than their fullest cell has values, and stay exact until they exceed 'size'.
+    sketch = QuantileSketch( QUANTILES, error=0.01 )
+    data = np.random.RandomState( 4 ).standard_normal( ( 24, 3, 4 ) )
+    data[ 5:, 0, 0 ] = np.nan
+    part = sketch.chunk( data, ( 0, ) )
+    assert part["means"].shape == ( 3, 4, 24 ) and part["weights"][0,0].sum() == 5
+    results = sketch.apply( da.from_array( data, chunks=( 5, 3, 4 ) ), [ 0 ] )
+    for q, result in zip( QUANTILES, results ):
+        assert np.allclose( result, np.nanquantile( data, q, axis=0 ) )
@@ -0,0 +1,68 @@
+import os, pytest
+import numpy as np
+import xarray as xr
+from edas.config import EdasEnv
+from edas.collection.agg import Collection, CatalogCacheMgr
+from edas.process.domain import Domain
+from edas.workflow.data import EDASArray
+from edas.data.cache import CacheManager, RegionIndex, SpillCache, EDASKCacheMgr
+from edas.data.memo import ResultMemoMgr
+from edas.test.file_aligned_chunks_benchmark import write_synthetic_collection
+from edas.test.region_cache_benchmark import compare, run, NA, TX
+
+# Cached regions: a domain inside a cached region is served from it, a domain extending it along one axis reads only the
+# missing intervals, and requests served from the cache return the same results as direct reads.
+
+TIME = { "start": "1990-01-01T00:00:00", "end": "1990-01-02T23:00:00", "system": "values" }
+
+def domain( name: str = "d0", **bounds ) -> Domain:
+    return Domain.new( dict( name=name, **bounds ) )
+
+def test_region_index():
+    index = RegionIndex()
+    index.add( "tas", "tas|na", domain( **NA ) )
+    index.add( "tas", "tas|na-jan", domain( time=TIME, **NA ) )
+    assert index.find( "tas", domain( **TX ) ) == [ ( "tas|na", None ) ]
+    assert index.find( "tas", domain( time=TIME, **TX ) ) == [ ( "tas|na", None ), ( "tas|na-jan", None ) ]
+    wider = dict( NA, lat={ "start": 10.0, "end": 40.0, "system": "values" } )
+    assert index.find( "tas", domain( **wider ) ) == [ ( "tas|na", ( "y", [ ( 10.0, 20.0 ) ] ) ) ]
+    assert index.find( "tas", domain( lat={ "start": 0.0, "end": 10.0, "system": "values" }, lon=NA["lon"] ) ) == []
+    assert index.find( "tas", domain( lat={ "start": 10.0, "end": 60.0, "system": "values" }, lon={ "start": -130.0, "end": -70.0, "system": "values" } ) ) == []
+    assert index.find( "tas", domain( lat={ "start": 0, "end": 10, "system": "indices" } ) ) == []
+    assert index.find( "pr", domain( **TX ) ) == []
+    index.remove( "tas", "tas|na" )
+    assert index.find( "tas", domain( **TX ) ) == []
+
+def test_find_region():
+    cache = CacheManager()
+    cache.spillCache = SpillCache( None, 0 )
+    array = EDASArray( "tas", "d0", xr.DataArray( np.zeros( ( 4, 4 ) ), dims=[ "y", "x" ] ) )
+    cache.cacheRegion( "tas", domain( **NA ), array )
+    assert cache.findRegion( "tas", domain( **NA ) ) == ( array, None )
+    assert cache.findRegion( "tas", domain( **TX ), "request1" ) == ( array, None ) and list( cache.pins.values() ) == [ { "request1" } ]
+    assert cache.findRegion( "tas", domain( time=TIME, **TX ) ) == ( array, None )
+    assert cache.findRegion( "tas", domain( lat={ "start": 0.0, "end": 10.0, "system": "values" } ) ) == ( None, None )
+    del cache[ CacheManager.key( "tas", domain( **NA ) ) ]
+    assert cache.findRegion( "tas", domain( **TX ) ) == ( None, None )
+
+def test_requests( tmp_path, monkeypatch ):
+    work_dir = str(tmp_path)
+    monkeypatch.setattr( Collection, "baseDir", work_dir )
+    monkeypatch.setattr( ResultMemoMgr, "maxSize", 0 )
+    saved = EdasEnv.get( "agg.index.dir" )
+    EdasEnv.update( { "agg.index.dir": os.path.join( work_dir, "index" ) } )
+    try:
+        os.rename( write_synthetic_collection( work_dir, 4, 24 ), os.path.join( work_dir, "bench.ag1" ) )
+        with open( os.path.join( work_dir, "bench.csv" ), "w" ) as spec: spec.write( "tas,bench\n" )
+        run( "cache", [ dict( name="d0", time=TIME, **NA ) ], [ { "uri": "collection://bench", "name": "tas:v0", "domain": "d0" } ], [ { "name": "edas.cache", "input": "v0", "result": "na" } ] )
+        hits = EDASKCacheMgr.hits
+        compare( "Texas subset", [ dict( name="d1", time=TIME, **TX ) ] )
+        assert EDASKCacheMgr.hits == hits + 1
+        compare( "North America, extended time", [ dict( name="d1", time=dict( TIME, end="1990-01-04T23:00:00" ), **NA ) ] )
+        compare( "Texas, earlier start", [ dict( name="d1", time=dict( TIME, start="1989-12-31T00:00:00" ), **TX ) ] )
+        assert EDASKCacheMgr.hits == hits + 3
+    finally:
+        EDASKCacheMgr.evict( "*" )
+        CatalogCacheMgr.clear()
+        if saved is None: EdasEnv.parms.pop( "agg.index.dir", None )
+        else: EdasEnv.update( { "agg.index.dir": saved } )
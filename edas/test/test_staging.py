@@ -0,0 +1,59 @@
+import os
+from edas.collection.staging import StagingCache
+
+# The staging LRU: its byte quota ( only files pinned by running requests are kept over it ), pins, and re-staging of
+# modified source files.  Staged copies are redirected with a shared staging dir, whatever the scheduler.
+
+FILESIZE = 1000
+
+def sources( directory, nfiles: int ):
+    os.makedirs( directory, exist_ok=True )
+    paths = [ os.path.join( directory, f"file-{index:02d}.nc" ) for index in range( nfiles ) ]
+    for path in paths:
+        with open( path, "wb" ) as file: file.write( os.urandom( FILESIZE ) )
+    return paths
+
+def staging( tmp_path, nfiles: int ) -> StagingCache:
+    return StagingCache( str( tmp_path / "staging" ), nfiles * FILESIZE, shared=True )
+
+def test_staging_redirects( tmp_path ):
+    paths = sources( tmp_path / "source", 4 )
+    cache = staging( tmp_path, 4 )
+    assert cache.stage( paths ) == paths
+    cache.wait()
+    assert cache.stage( paths ) == [ cache.localPath( path ) for path in paths ]
+    assert cache.stats()["hits"] == 4 and cache.stats()["misses"] == 4
+
+def test_staging_quota( tmp_path ):
+    # A request larger than the quota only queues the files that fit, and just-copied files are not protected from eviction.
+    paths = sources( tmp_path / "source", 10 )
+    cache = staging( tmp_path, 4 )
+    cache.stage( paths )
+    cache.wait()
+    assert cache.nbytes <= cache.quota and cache.stats()["files"] == 4
+    cache.stage( paths[4:] )
+    cache.wait()
+    assert cache.nbytes <= cache.quota and cache.evictions == 4
+    assert sum( cache.isStaged( path ) for path in paths ) == 4
+
+def test_staging_pins( tmp_path ):
+    paths = sources( tmp_path / "source", 8 )
+    cache = staging( tmp_path, 4 )
+    cache.stage( paths[:4] ); cache.wait()
+    cache.stage( paths[:2], "request-0" )
+    cache.stage( paths[4:] ); cache.wait()
+    assert all( cache.isStaged( path ) for path in paths[:2] ), "Pinned files should not be evicted"
+    assert cache.nbytes <= cache.quota
+    cache.release( "request-0" )
+    cache.stage( paths[6:] + paths[2:4] ); cache.wait()
+    assert not any( cache.isStaged( path ) for path in paths[:2] ), "Released files should be evicted first"
+
+def test_staging_modified_source( tmp_path ):
+    paths = sources( tmp_path / "source", 2 )
+    cache = staging( tmp_path, 2 )
+    cache.stage( paths ); cache.wait()
+    stat = os.stat( paths[0] )
+    os.utime( paths[0], ns=( stat.st_atime_ns, stat.st_mtime_ns + 1000000000 ) )
+    assert cache.stage( paths ) == [ paths[0], cache.localPath( paths[1] ) ]
+    cache.wait()
+    assert cache.isStaged( paths[0] )
@@ -0,0 +1,59 @@
+import os, pytest
+import numpy as np
+import xarray as xr
+import netCDF4
+from edas.config import EdasEnv
+from edas.collection.agg import Collection, CatalogCacheMgr
+from edas.workflow.kernel import InputKernel
+from edas.test.trusted_mfdataset_benchmark import write_synthetic_files, NTIME, NLAT, NLON
+
+# Trusted collections: the fast open_mfdataset path must produce the same dataset as the default one, take static
+# coordinates from the first file only, and be enabled by the collection.trusted parameter ( .csv or app.conf ).
+
+NFILES = 8
+
+@pytest.fixture( scope="module" )
+def paths( tmp_path_factory ):
+    return write_synthetic_files( str( tmp_path_factory.mktemp( "trusted" ) ), NFILES )
+
+def test_matches_default( paths ):
+    kernel = InputKernel()
+    default = kernel.openMFDataset( paths, [ "tas" ], False, parallel=False )
+    trusted = kernel.openMFDataset( paths, [ "tas" ], True, parallel=False )
+    assert trusted.tas.shape == ( NFILES * NTIME, NLAT, NLON )
+    assert "time" not in trusted.lat.dims and trusted.lat.dims == ( "lat", )
+    xr.testing.assert_equal( default.load(), trusted.load() )
+
+def test_region( paths ):
+    region = { "lat": slice( 5, 15 ), "lon": slice( 0, 30 ) }
+    kernel = InputKernel()
+    default = kernel.openMFDataset( paths, [ "tas" ], False, parallel=False )
+    trusted = kernel.openMFDataset( paths, [ "tas" ], True, region, parallel=False )
+    xr.testing.assert_equal( default.isel( region ).load(), trusted.load() )
+
+def test_static_coords_from_first_file( paths ):
+    shifted = paths[-1] + ".shifted.nc"
+    with netCDF4.Dataset( paths[-1] ) as src, netCDF4.Dataset( shifted, "w" ) as ds:
+        for name, dim in src.dimensions.items(): ds.createDimension( name, None if dim.isunlimited() else len(dim) )
+        for name, var in src.variables.items():
+            out = ds.createVariable( name, var.dtype, var.dimensions )
+            out.setncatts( { key: var.getncattr(key) for key in var.ncattrs() } )
+            out[:] = var[:] + ( 1.0 if name == "lat" else 0.0 )
+    trusted = InputKernel().openMFDataset( paths[:-1] + [ shifted ], [ "tas" ], True, parallel=False )
+    assert np.array_equal( trusted.lat.values, np.linspace( -90.0, 90.0, NLAT ) )
+    assert trusted.tas.shape[0] == NFILES * NTIME
+
+def test_trusted_flag( tmp_path, monkeypatch ):
+    monkeypatch.setattr( Collection, "baseDir", str(tmp_path) )
+    monkeypatch.setattr( CatalogCacheMgr, "checkInterval", 0.0 )
+    try:
+        for name, header in [ ( "plain", "" ), ( "trusted", "# collection.trusted, true\n" ), ( "untrusted", "# collection.trusted, false\n" ) ]:
+            with open( os.path.join( str(tmp_path), name + ".csv" ), "w" ) as f: f.write( header + "tas, testagg\n" )
+        assert Collection.new( "trusted" ).getBool( "collection.trusted", False )
+        assert not Collection.new( "plain" ).getBool( "collection.trusted", False )
+        EdasEnv.update( { "collection.trusted": "true" } )
+        assert Collection.new( "plain" ).getBool( "collection.trusted", False )
+        assert not Collection.new( "untrusted" ).getBool( "collection.trusted", False )
+    finally:
+        EdasEnv.parms.pop( "collection.trusted", None )
+        CatalogCacheMgr.clear()
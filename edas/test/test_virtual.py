@@ -0,0 +1,52 @@
+import os, pytest
+import numpy as np
+import xarray as xr
+from datetime import datetime, timezone
+from edas.config import EdasEnv
+from edas.collection.agg import Aggregation
+from edas.collection.virtual import VirtualDataset
+from edas.workflow.kernel import InputKernel
+from edas.test.file_aligned_chunks_benchmark import write_synthetic_collection, NLAT, NLON
+
+# Virtual datasets: a dataset built from the aggregation catalog must match open_mfdataset over the same files ( values
+# and time coordinates ), read one chunk per file, and raise Incomplete when the catalog can't describe the variables.
+
+NFILES, NSTEPS = 6, 24
+
+@pytest.fixture( scope="module" )
+def agg( tmp_path_factory ):
+    work_dir = str( tmp_path_factory.mktemp( "virtual" ) )
+    saved = EdasEnv.get( "agg.index.dir" )
+    EdasEnv.update( { "agg.index.dir": os.path.join( work_dir, "index" ) } )
+    yield Aggregation( "test", write_synthetic_collection( work_dir, NFILES, NSTEPS ) )
+    if saved is None: EdasEnv.parms.pop( "agg.index.dir", None )
+    else: EdasEnv.update( { "agg.index.dir": saved } )
+
+def test_matches_mfdataset( agg ):
+    virtual = VirtualDataset( agg ).open( [ "tas" ], alignFiles=False )
+    reference = InputKernel().openMFDataset( agg.pathList(), [ "tas" ], False, parallel=False )
+    assert virtual.tas.shape == reference.tas.shape == ( NFILES * NSTEPS, NLAT, NLON )
+    assert virtual.tas.data.chunks[0] == ( NSTEPS, ) * NFILES
+    assert ( virtual.time.values == reference.time.values ).all()
+    assert np.allclose( virtual.lat.values, reference.lat.values ) and np.allclose( virtual.lon.values, reference.lon.values )
+    assert np.array_equal( virtual.tas.values, reference.tas.values )
+
+def test_period( agg ):
+    start, end = datetime( 1990, 1, 2, 6, tzinfo=timezone.utc ), datetime( 1990, 1, 3, 6, tzinfo=timezone.utc )
+    virtual = VirtualDataset( agg ).open( [ "tas" ], start, end )
+    assert virtual.tas.shape[0] == 2 * NSTEPS
+    assert virtual.time.values[0] == np.datetime64( "1990-01-02T00:00" )
+
+def test_region_and_chunks( agg ):
+    region = { "lat": slice( 10, 20 ), "lon": slice( 5, 25 ) }
+    full = VirtualDataset( agg ).open( [ "tas" ] )
+    virtual = VirtualDataset( agg ).open( [ "tas" ], region=region, chunks={ "time": 12, "lon": 10 }, alignFiles=False )
+    assert virtual.tas.data.chunks == ( ( 12, ) * 2 * NFILES, ( 10, ), ( 10, 10 ) )
+    assert np.array_equal( virtual.tas.values, full.tas.isel( region ).values )
+    xr.testing.assert_equal( virtual.lat, full.lat.isel( lat=region["lat"] ) )
+
+def test_incomplete( agg ):
+    with pytest.raises( VirtualDataset.Incomplete ): VirtualDataset( agg ).open( [ "pr" ] )
+    with pytest.raises( VirtualDataset.Incomplete ):
+        VirtualDataset( agg ).open( [ "tas" ], datetime( 1980, 1, 1, tzinfo=timezone.utc ), datetime( 1980, 1, 2, tzinfo=timezone.utc ) )
+    assert InputKernel().openVirtualDataset( agg, [ "pr" ], None, None ) is None
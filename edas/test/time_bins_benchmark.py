@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+import dask
+from edas.data.reduction import GroupedStats, TimeBins
+from edas.test.benchmark_utils import synthetic_input, timed
+
+# Time grouping on regular axes: bins computed by index arithmetic ( TimeBins ) versus the pandas/xarray index lists, for
+# a long hourly axis alone, then for hourly -> daily and daily -> monthly reductions over a synthetic grid.
+
+def axis( nsteps: int, freq: str ) -> xr.DataArray:
+    return xr.DataArray( np.zeros( nsteps, dtype=np.float32 ), dims=["time"], coords=dict( time=pd.date_range( "1980-01-01", periods=nsteps, freq=freq ) ) )
+
+def pandas_resample( array: xr.DataArray, freq: str ):
+    return TimeBins.groups( array.resample( time=freq ), array.sizes["time"], TimeBins.resampleLabels( array.time.values, freq ) )
+
+def reduce( array: xr.DataArray, groups ):
+    results = GroupedStats( [ "mean", "max", "min", "std" ] ).apply( array, "time", groups )
+    return dask.compute( *[ result.data for result in results.values() ] )
+
+if __name__ == "__main__":
+    hourly = axis( 24 * 365 * 120, "h" )
+    print( f"Grouping a regular hourly axis of {hourly.size} steps:" )
+    for freq in [ "D", "MS", "YS" ]:
+        fast, tFast = timed( TimeBins.resample, hourly, freq )
+        slow, tSlow = timed( pandas_resample, hourly, freq )
+        assert ( fast[1] == slow[1] ).all() and ( fast[0] == slow[0] ).all(), f"Bins differ for freq {freq}"
+        print( f" resample {freq}: index arithmetic = {tFast:.3f} sec, pandas = {tSlow:.3f} sec, {len(fast[0])} bins" )
+    fast, tFast = timed( TimeBins.groupby, hourly, "month" )
+    slow, tSlow = timed( lambda: TimeBins.groups( hourly.groupby( "time.month" ), hourly.size ) )
+    assert ( fast[1] == slow[1] ).all(), "Month groups differ"
+    print( f" groupby month: index arithmetic = {tFast:.3f} sec, pandas = {tSlow:.3f} sec" )
+
+    for nsteps, freq, chunk, target in [ ( 24 * 365, "h", 24 * 30, "D" ), ( 365 * 20, "D", 365, "MS" ) ]:
+        array = synthetic_input( nsteps, 90, 180, chunk, start="1980-01-01", freq=freq, timeDim="time" ).persist()
+        fast, tFast = timed( lambda: reduce( array, TimeBins.resample( array, target ) ) )
+        slow, tSlow = timed( lambda: reduce( array, pandas_resample( array, target ) ) )
+        for f, s in zip( fast, slow ): assert np.allclose( f, s, equal_nan=True )
+        print( f"Reduce {array.shape} {freq} -> {target} ( mean,max,min,std ): index arithmetic = {tFast:.3f} sec, pandas = {tSlow:.3f} sec" )
@@ -0,0 +1,47 @@
+import os, sys, time, tempfile, shutil
+import numpy as np
+import xarray as xr
+import netCDF4
+from edas.workflow.kernel import InputKernel
+
+NFILES = 5000
+NTIME, NLAT, NLON = 4, 46, 72
+
+def write_synthetic_files( data_dir: str, nfiles: int ) -> list:
+    lat, lon = np.linspace( -90.0, 90.0, NLAT ), np.linspace( -180.0, 175.0, NLON )
+    paths = []
+    for iFile in range( nfiles ):
+        path = os.path.join( data_dir, f"synthetic.{iFile:06d}.nc" )
+        with netCDF4.Dataset( path, "w" ) as ds:
+            ds.createDimension( "time", None )
+            ds.createDimension( "lat", NLAT )
+            ds.createDimension( "lon", NLON )
+            tvar = ds.createVariable( "time", "f8", ("time",) )
+            tvar.units = "hours since 1980-01-01 00:00:00"
+            tvar[:] = iFile * NTIME + np.arange( NTIME )
+            ds.createVariable( "lat", "f8", ("lat",) )[:] = lat
+            ds.createVariable( "lon", "f8", ("lon",) )[:] = lon
+            ds.createVariable( "tas", "f4", ("time", "lat", "lon") )[:] = np.random.rand( NTIME, NLAT, NLON )
+        paths.append( path )
+    return paths
+
+def timed( label: str, func ):
+    t0 = time.time()
+    result = func()
+    print( f" {label}: {time.time()-t0:.3f} sec" )
+    return result
+
+if __name__ == "__main__":
+    NFILES = int( sys.argv[1] ) if len( sys.argv ) > 1 else NFILES
+    work_dir = tempfile.mkdtemp()
+    try:
+        paths = timed( f"Write {NFILES} synthetic files", lambda: write_synthetic_files( work_dir, NFILES ) )
+        kernel = InputKernel()
+        for parallel in [ True, False ]:
+            default = timed( f"open_mfdataset (default, parallel={parallel})", lambda: kernel.openMFDataset( paths, ["tas"], False, parallel=parallel ) )
+            trusted = timed( f"open_mfdataset (trusted, parallel={parallel})", lambda: kernel.openMFDataset( paths, ["tas"], True, parallel=parallel ) )
+            assert default.tas.shape == trusted.tas.shape == ( NFILES * NTIME, NLAT, NLON )
+            assert ( default.time.values == trusted.time.values ).all()
+            xr.testing.assert_equal( default.isel( time=slice(0,NTIME*4) ).load(), trusted.isel( time=slice(0,NTIME*4) ).load() )
+    finally:
+        shutil.rmtree( work_dir )
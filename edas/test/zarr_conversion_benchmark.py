@@ -0,0 +1,56 @@
+import os, time, tempfile, shutil
+import numpy as np
+import numcodecs
+from datetime import datetime, timezone
+import xarray as xr
+from edas.config import EdasEnv
+from edas.collection.agg import Aggregation
+from edas.collection.virtual import VirtualDataset
+from edas.collection.convert import ZarrConverter
+from edas.workflow.kernel import InputKernel
+from edas.test.file_aligned_chunks_benchmark import write_synthetic_collection, NFILES
+
+CHUNKS = { "time": 240 }
+
+class Interrupted(Exception): pass
+
+class InterruptedConverter( ZarrConverter ):
+    # Fails after writing maxBlocks blocks, to check that a rerun resumes the conversion.
+    maxBlocks = 5
+    def writeBlock( self, dset, timeVars, tname, block, progress ):
+        with self._lock:
+            if len( progress["blocks"] ) >= self.maxBlocks: raise Interrupted()
+        super( InterruptedConverter, self ).writeBlock( dset, timeVars, tname, block, progress )
+
+def request_time( open_func ) -> float:
+    t0 = time.time()
+    dset = open_func()
+    dset.tas.isel( lat=slice(20,24), lon=slice(30,36) ).mean().values
+    return time.time() - t0
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    try:
+        EdasEnv.update( { "agg.index.dir": os.path.join( work_dir, "index" ) } )
+        agg = Aggregation( "bench", write_synthetic_collection( work_dir ) )
+        store = os.path.join( work_dir, "hourly.zarr" )
+        try: InterruptedConverter( agg, store, CHUNKS, nParallel=1 ).convert()
+        except Interrupted: print( f" Interrupted conversion after {InterruptedConverter.maxBlocks} blocks, complete = {ZarrConverter.isComplete(store)}" )
+        t0 = time.time()
+        ZarrConverter( agg, store, CHUNKS ).convert()
+        print( f" Resumed conversion of {NFILES} files: time = {time.time()-t0:.3f} sec, complete = {ZarrConverter.isComplete(store)}" )
+        source = VirtualDataset( agg ).open( ["tas"] )
+        converted = xr.open_zarr( store, consolidated=True )
+        assert np.array_equal( source.tas.values, converted.tas.values ), "Converted data doesn't match the source files"
+        print( f" zarr chunks = {converted.tas.data.chunksize}" )
+        for name, var in converted.data_vars.items(): assert var.encoding.get( "compressor" ) is not None or var.encoding.get( "compressors" ), f"Variable {name} isn't compressed"
+        compressed = os.path.join( work_dir, "compressed.zarr" )
+        ZarrConverter( agg, compressed, CHUNKS, compressor=numcodecs.Blosc( cname="zstd", clevel=5 ) ).convert()
+        assert np.array_equal( source.tas.values, xr.open_zarr( compressed, consolidated=True ).tas.values ), "Data converted with an explicit compressor doesn't match the source files"
+        start, end = datetime( 1990, 3, 1, tzinfo=timezone.utc ), datetime( 1990, 3, 31, 23, tzinfo=timezone.utc )
+        window = InputKernel().openZarrStore( store, ["tas"], None, start, end )
+        assert window.sizes["time"] == 31 * 24 and np.array_equal( window.tas.values, source.tas.sel( time=slice( "1990-03-01", "1990-03-31T23" ) ).values ), "Zarr time window doesn't match the source"
+        print( f" small-ROI request, virtual dataset: {request_time( lambda: VirtualDataset( agg ).open( ['tas'] ) ):.3f} sec" )
+        print( f" small-ROI request, zarr store:      {request_time( lambda: xr.open_zarr( store, consolidated=True ) ):.3f} sec" )
+    finally:
+        shutil.rmtree( work_dir )
@@ -9,6 +9,7 @@ import xarray as xa
 from xarray.core.resample import DatasetResample
 from edas.data.sources.timeseries import TimeIndexer
 from edas.util.logging import EDASLogger
+from edas.config import EdasEnv
 from xarray.core.groupby import DataArrayGroupBy
 from edas.process.operation import WorkflowNode, OperationConnector
 from edas.data.processing import Parser
@@ -76,6 +77,7 @@ class EDASArray:
         self.domId = _domId if _domId is not None else ""
         self._data = data
         self.name = name
+        self.coordWindow = None    # CoordWindow (see edas.collection.coords) matching this array's coordinates, if known
         self.addDomain( _domId )
 
     def rename(self, name: str ) -> "EDASArray":
@@ -112,7 +114,7 @@ class EDASArray:
     def size(self) -> int: return self.xr.size
 
     @property
-    def bsize(self) -> int: return self.xr.size * 4
+    def bsize(self) -> int: return self.xrArray.nbytes
 
     @property
     def product(self) -> Optional[str]: return self.get("product",None)
@@ -283,39 +285,31 @@ class EDASArray:
 #        return EDASArray(self.name, self.domId, xrdata  )
 
     def timeResample(self, freq: str, operations: str ) -> List["EDASArray"]:
+        from edas.data.reduction import GroupedStats, TimeBins
         xrInput = self.xr
         if 't' in xrInput.dims: xrInput = xrInput.rename({'t': 'time'})
         self.logger.info( f" timeResample({xrInput.name}): coords = {list(xrInput.coords.keys())} ")
-        resampled_data: DatasetResample = xrInput.resample( time = freq, keep_attrs=True )
-        results: List["EDASArray"] = []
         ops = operations.split(",")
+        try: aggregations = GroupedStats( ops ).apply( xrInput, "time", TimeBins.resample( xrInput, freq ) )
+        except AssertionError as err: raise Exception( "Unrecognised operation in timeResample operation: " + str(err) )
+        results: List["EDASArray"] = []
         for op in ops:
-            if op == "mean":  aggregation = resampled_data.mean('time')
-            elif op == "ave": aggregation = resampled_data.mean('time')
-            elif op == "max": aggregation = resampled_data.max('time')
-            elif op == "min": aggregation = resampled_data.min( 'time')
-            elif op == "sum": aggregation = resampled_data.sum( 'time')
-            elif op == "std": aggregation = resampled_data.std('time')
-            else: raise Exception( "Unrecognised operation in timeResample operation: " + op )
+            aggregation = aggregations[op]
             self.logger.info(f" --> Result[{op}]: coords = {list(aggregation.coords.keys())}, shape = {list(aggregation.shape)} ")
             results.append( self.updateXa(aggregation, "timeResample-" + op ) )
         return results
 
     def timeAgg(self, period: str, operations: str ) -> List["EDASArray"]:
+        from edas.data.reduction import GroupedStats, TimeBins
         xrInput = self.xr
         if 't' in xrInput.dims: xrInput = xrInput.rename( {'t':'time'} )
         self.logger.info( f" TimeAgg({xrInput.name}): input coords = {list(xrInput.coords.keys())}, input shape = {list(xrInput.shape)}  ")
-        grouped_data: DataArrayGroupBy = xrInput.groupby( "time." + period, False )
-        results: List["EDASArray"] = []
         ops = operations.split(",")
+        try: aggregations = GroupedStats( ops ).apply( xrInput, period, TimeBins.groupby( xrInput, period ) )
+        except AssertionError as err: raise Exception( "Unrecognised operation in timeAgg operation: " + str(err) )
+        results: List["EDASArray"] = []
         for op in ops:
-            if op == "mean":  aggregation: xa.DataArray = grouped_data.mean('time')
-            elif op == "ave": aggregation: xa.DataArray = grouped_data.mean('time')
-            elif op == "max": aggregation: xa.DataArray = grouped_data.max('time')
-            elif op == "min": aggregation: xa.DataArray = grouped_data.min('time')
-            elif op == "sum": aggregation: xa.DataArray = grouped_data.sum('time')
-            elif op == "std": aggregation: xa.DataArray = grouped_data.std('time')
-            else: raise Exception( "Unrecognised operation in timeAgg operation: " + op )
+            aggregation = aggregations[op]
             self.logger.info(f" --> Result[{op}]: dims = {list(aggregation.dims)}, coords = {list(aggregation.coords.keys())}, shape = {list(aggregation.shape)} ")
             if 'month' in aggregation.coords.keys(): aggregation = aggregation.rename( {'month':'m'} )
             if 'day' in aggregation.coords.keys():   aggregation = aggregation.rename({'day': 'd'})
@@ -339,7 +333,17 @@ class EDASArray:
 
     def subset( self, domain: Domain, composite_domains: Set[str] ) -> "EDASArray":
         xarray = self.xr
+        window = self.coordWindow
         pointMap, valSliceMap, indexSliceMap = self.getSliceMaps( domain, xarray.dims )
+        if window is not None:
+            # Value selections are converted to index selections against the coordinate window instead of the array's coordinates.
+            windowMap = { axis: window.indexer( axis, value ) for axis, value in list( pointMap.items() ) + list( valSliceMap.items() ) if window.has( axis ) }
+            pointMap = { axis: value for axis, value in pointMap.items() if axis not in windowMap }
+            valSliceMap = { axis: value for axis, value in valSliceMap.items() if axis not in windowMap }
+            if len(windowMap):
+                self.logger.info( "WINDOW subset: " + str(windowMap))
+                xarray = xarray.isel( windowMap )
+                window = window.isel( windowMap )
         if len(pointMap):
             self.logger.info( "POINT subset: " + str(pointMap))
             xarray = xarray.sel( pointMap, method='nearest')
@@ -349,8 +353,11 @@ class EDASArray:
         if len(indexSliceMap):
             self.logger.info( "INDEX subset: " + str(indexSliceMap))
             xarray = xarray.isel(indexSliceMap )
+            if window is not None: window = window.isel( indexSliceMap )
         for axis, axisBound in domain.axisBounds.items():  xarray = axisBound.revertAxis(xarray)
         result = self.updateXa(xarray,"subset")
+        if window is not None and len(pointMap) + len(valSliceMap) == 0 and all( axisBound._timeDelta is None for axisBound in domain.axisBounds.values() ):
+            result.coordWindow = window
         for d in composite_domains: result.addDomain( d )
         return result
 
@@ -391,7 +398,7 @@ class EDASArray:
         if weights is None:
             return self.mean( axes, **kwargs )
         else:
-            data = self.persist()
+            data = self.xr
             weighted_var: xa.DataArray = data * weights
             self.logger.info( f"Computing Weighted ave: weighted_var shape = {weighted_var.shape}, axes = {axes}")
             sum = weighted_var.sum( axes )
@@ -409,13 +416,56 @@ class EDASArray:
         else: return None
 
     def median( self, axes: List[str], **kwargs ) -> "EDASArray":
-        return self.updateXa(self.xr.median(dim=axes, keep_attrs=True), kwargs.get("name","median") )
+        if self.exactQuantiles( axes, kwargs.get( "exact", False ) ):
+            return self.updateXa(self.xr.median(dim=axes, keep_attrs=True), kwargs.get("name","median") )
+        return self.updateXa( self.quantiles( axes, [ 0.5 ], kwargs.get( "error" ) )[0], kwargs.get("name","median") )
+
+    def exactQuantiles( self, axes: List[str], exact: bool ) -> bool:
+        # Exact quantiles are used when requested, for grouped or in-memory data, or when the reduced axes aren't chunked.
+        data = self.xr
+        if exact or isinstance( data, DataArrayGroupBy ) or data.chunks is None: return True
+        return all( len( data.chunks[ data.get_axis_num( dim ) ] ) == 1 for dim in ( axes if axes else data.dims ) if dim in data.dims )
+
+    def quantiles( self, axes: List[str], quantiles: List[float], error: Optional[float] = None, exact: bool = False ) -> List[xa.DataArray]:
+        # Quantiles over axes, one array per quantile: exact ( xarray, loading whole reduced axes per chunk ) or streamed through
+        # mergeable sketches with a rank error of the order of error ( see edas.data.reduction.QuantileSketch ).
+        from edas.data.reduction import QuantileSketch
+        data = self.xr
+        dims = [ dim for dim in ( axes if axes else data.dims ) if dim in data.dims ]
+        if self.exactQuantiles( axes, exact ):
+            if data.chunks is not None: data = data.chunk( { dim: -1 for dim in dims } )
+            result = data.quantile( quantiles, dim=dims, keep_attrs=True )
+            return [ result.isel( quantile=index, drop=True ) for index in range( len( quantiles ) ) ]
+        error = float( error if error is not None else EdasEnv.get( "quantile.error", 0.01 ) )
+        results = QuantileSketch( quantiles, error ).apply( data.data, [ data.get_axis_num( dim ) for dim in dims ] )
+        coords = { name: coord for name, coord in data.coords.items() if not set( coord.dims ) & set( dims ) }
+        dtype = data.dtype if np.issubdtype( data.dtype, np.floating ) else np.float64
+        return [ xa.DataArray( result.astype( dtype ), dims=[ dim for dim in data.dims if dim not in dims ], coords=coords, attrs=data.attrs, name=data.name ) for result in results ]
+
+    def moments( self, axes: List[str], stats: List[str], order: int = 2 ) -> Optional[Dict[str,xa.DataArray]]:
+        # Statistics of the streaming moment accumulators over axes ( see edas.data.reduction.Moments ), None for grouped data.
+        from edas.data.reduction import Moments
+        data = self.xr
+        if isinstance( data, DataArrayGroupBy ): return None
+        dims = [ dim for dim in ( axes if axes else data.dims ) if dim in data.dims ]
+        accumulators = Moments( order ).accumulate( data.data, [ data.get_axis_num( dim ) for dim in dims ] )
+        coords = { name: coord for name, coord in data.coords.items() if not set( coord.dims ) & set( dims ) }
+        dtype = data.dtype if np.issubdtype( data.dtype, np.floating ) else np.float64
+        return { stat: xa.DataArray( Moments.stat( accumulators, stat ).astype( dtype ), dims=[ dim for dim in data.dims if dim not in dims ], coords=coords, attrs=data.attrs, name=data.name ) for stat in stats }
 
     def var( self, axes: List[str], **kwargs ) -> "EDASArray":
-        return self.updateXa(self.xr.var(dim=axes, keep_attrs=True), kwargs.get("name","var") )
+        moments = self.moments( axes, [ "var" ] )
+        return self.updateXa( moments["var"] if moments else self.xr.var(dim=axes, keep_attrs=True), kwargs.get("name","var") )
 
     def std( self, axes: List[str], **kwargs ) -> "EDASArray":
-        return self.updateXa(self.xr.std(dim=axes, keep_attrs=True), kwargs.get("name","std") )
+        moments = self.moments( axes, [ "std" ] )
+        return self.updateXa( moments["std"] if moments else self.xr.std(dim=axes, keep_attrs=True), kwargs.get("name","std") )
+
+    def norm( self, axes: List[str], **kwargs ) -> "EDASArray":
+        # Unless the mean is latitude weighted, the mean and std come from the same moment accumulators: one pass over the input.
+        moments = self.moments( axes, [ "mean", "std" ] ) if self.getWeights( axes ) is None else None
+        if moments is None: return ( self - self.ave( axes ) ) / self.std( axes )
+        return self.updateXa( ( self.xr - moments["mean"] ) / moments["std"], kwargs.get("name","norm") )
 
     def sum( self, axes: List[str], **kwargs ) -> "EDASArray":
         return self.updateXa(self.xr.sum(dim=axes, keep_attrs=True), kwargs.get("name","sum") )
@@ -6,16 +6,27 @@ from edas.process.operation import WorkflowNode, SourceNode, OpNode
 from edas.data.sources.timeseries import TimeConversions
 from edas.collection.agg import Archive
 import xarray as xr
+import numpy as np
 from edas.workflow.data import KernelSpec, EDASDataset, EDASArray, EDASDatasetCollection
 from edas.process.source import SourceType, DataSource
 from edas.process.node import Param, Node
-from edas.collection.agg import Collection
+from edas.collection.agg import Collection, Aggregation
+from edas.collection.virtual import VirtualDataset
+from edas.collection.convert import ZarrConverter
+from edas.collection.coords import CoordLookupMgr, CoordWindow
+from datetime import datetime, timezone
 from edas.config import EdasEnv
 from edas.util.logging import EDASLogger
-from edas.data.cache import EDASKCacheMgr
-from edas.process.domain import Domain, Axis
+from edas.data.cache import EDASKCacheMgr, RegionIndex
+from edas.data.memo import ResultMemoMgr
+from edas.data.chunks import ChunkPlanner
+from edas.data.handles import HandlePoolMgr, PooledNetCDF4Backend
+from edas.data.dap import DapAccessMgr
+from edas.collection.staging import StagingCacheMgr
+from edas.process.domain import Domain, Axis, AxisBounds
 from collections import OrderedDict
 from requests import Session
+import warnings
 
 class Kernel:
 
@@ -28,6 +39,7 @@ class Kernel:
         self._minInputs = 1
         self._maxInputs = 100000
         self.requiredOptions = []
+        self._memoizable = True        # Results may be reused across requests ( see ResultMemo ), i.e. the kernel has no side effects
         self._id: str  = self._spec.name + "-" + ''.join([ random.choice( string.ascii_letters + string.digits ) for n in range(5) ] )
 
     @property
@@ -57,9 +69,18 @@ class Kernel:
         results = request.getCachedResult( self._id )
         if results is None:
            results: EDASDatasetCollection = self.buildWorkflow( request, node, inputs )
+           if self._memoizable: ResultMemoMgr.put( *ResultMemoMgr.key( request, node ), results )
            request.cacheResult( self._id, results )
         return results
 
+    def getMemoizedResult(self, request: TaskRequest, node: WorkflowNode ) -> Optional[EDASDatasetCollection]:
+        # Results of the same subtree from this or an earlier request ( see ResultMemo ), looked up before the inputs are built.
+        results = request.getCachedResult( self._id )
+        if results is None and self._memoizable:
+            results = ResultMemoMgr.get( *ResultMemoMgr.key( request, node ), request )
+            if results is not None: request.cacheResult( self._id, results )
+        return results
+
     def getParameters(self, node: Node, parms: List[Param])-> Dict[str,Any]:
         return { parm.name: node.getParam(parm) for parm in parms }
 
@@ -231,118 +252,229 @@ class CacheStatus:
 class InputKernel(Kernel):
     def __init__( self ):
         Kernel.__init__( self, KernelSpec("input", "Data Input","Data input and workflow source node" ) )
+        self._memoizable = False
 
     def getCacheStatus( self, node: WorkflowNode ) -> int:
         return CacheStatus.parse( node.getParm( "cache" ) )
 
-    def getCachedDataset(self, snode: SourceNode )-> Optional[EDASDataset]:
+    def getCachedDataset(self, request: TaskRequest, snode: SourceNode )-> Optional[xr.Dataset]:
+        # Serves the input from a cached array whose region contains the node's domain ( the array is subset in processDataset ),
+        # or extends the cached array with the parts of the domain it's missing along one axis, read from the data source.
         cache_status = self.getCacheStatus( snode )
         if cache_status != CacheStatus.Ignore:
             cid = snode.varSource.getId()
-            variable = EDASKCacheMgr[ cid ]
+            domain = request.operationManager.domains.domains.get( snode.domain ) if snode.domain else None
+            variable, missing = EDASKCacheMgr.findRegion( cid, domain, str( request.uid ) )
             if variable is None:
                 assert cache_status == CacheStatus.Option, "Missing cached input: " + cid
             else:
-                return EDASDataset.init( OrderedDict( [ (cid, variable) ] ), {} )
+                array = variable.xrArray if missing is None else self.stitchMissingRegion( request, snode, domain, variable, *missing )
+                if array is not None: return array.to_dataset( name=cid )
         return None
 
-    def importToDatasetCollection(self, collection: EDASDatasetCollection, request: TaskRequest, snode: SourceNode, dset: xr.Dataset):
-        pdest = self.processDataset(request, dset, snode)
+    def stitchMissingRegion( self, request: TaskRequest, snode: SourceNode, domain: Domain, variable: EDASArray, axisName: str, intervals: List[Tuple[float,float]] ) -> Optional[xr.DataArray]:
+        axis = Axis.parse( axisName )
+        bounds = domain.findAxisBounds( axis )
+        dim = next( ( dim for dim in variable.xrArray.dims if Axis.parse( dim ) == axis ), axisName )
+        coordValues = lambda array: array.coords[dim].values.astype("datetime64[ns]").astype(np.int64) if axis == Axis.T else array.coords[dim].values
+        cachedValues = coordValues( variable.xrArray )
+        lo, hi = cachedValues.min(), cachedValues.max()
+        parts = [ variable.xrArray ]
+        for ( start, end ) in intervals:
+            partDomain = Domain( f"{snode.domain}-{len(parts)}", dict( domain.axisBounds ) )
+            partDomain.addBounds( axis, AxisBounds( bounds.name, RegionIndex.fromValue( axisName, start ), RegionIndex.fromValue( axisName, end ), bounds.step, "values", bounds.metadata ) )
+            partNode = SourceNode( snode.name, partDomain.name, snode.varSource, snode.outputs[0], dict( snode.metadata ) )
+            partInputs = EDASDatasetCollection( "InputKernel.stitch-" + partDomain.name )
+            self.readDataSource( request.withDomain( partDomain ), partNode, partInputs )
+            if len( partInputs.arrays ) == 0: return None
+            part = partInputs.arrays[0].xrArray
+            if dim not in part.dims: part = part.expand_dims( dim )      # single-point parts are squeezed by the subset
+            values = coordValues( part )
+            parts.append( part.isel( { dim: ( values < lo ) | ( values > hi ) } ) )
+        self.logger.info( f"Stitched cached input {snode.varSource.getId()} with {len(parts)-1} parts read along axis {axisName}" )
+        return xr.concat( parts, dim=dim ).sortby( dim )
+
+    def importToDatasetCollection(self, collection: EDASDatasetCollection, request: TaskRequest, snode: SourceNode, dset: xr.Dataset, window: Optional[CoordWindow] = None ):
+        pdest = self.processDataset(request, dset, snode, window)
         for vid in snode.varSource.ids: collection[vid] = pdest.subselect(vid)
 
     def buildWorkflow(self, request: TaskRequest, node: WorkflowNode, inputs: EDASDatasetCollection )  -> EDASDatasetCollection:
         snode: SourceNode = node
         results = EDASDatasetCollection( "InputKernel.build-" + node.name )
         t0 = time.time()
-        dset = self.getCachedDataset( snode )
+        dset = self.getCachedDataset( request, snode )
         if dset is not None:
-            self.importToDatasetCollection(results, request, snode, dset.xr )
-            self.logger.info( "Access input data from cache: " + dset.id )
+            self.importToDatasetCollection(results, request, snode, dset )
+            self.logger.info( "Access input data from cache: " + snode.varSource.getId() )
         else:
-            dataSource: DataSource = snode.varSource.dataSource
-            if dataSource.type == SourceType.collection:
-                from edas.collection.agg import Axis as AggAxis, File as AggFile
-                collection = Collection.new( dataSource.address )
-                self.logger.info("Input collection: " + dataSource.address )
-                aggs = collection.sortVarsByAgg( snode.varSource.vids )
-                domain = request.operationManager.domains.getDomain( snode.domain )
-                if domain is not None:
-                    timeBounds = domain.findAxisBounds(Axis.T)
-                    startDate = None if (domain is None or timeBounds is None) else TimeConversions.parseDate(timeBounds.start)
-                    endDate   = None if (domain is None or timeBounds is None) else TimeConversions.parseDate(timeBounds.end)
-                else: startDate = endDate = None
-                for ( aggId, vars ) in aggs.items():
-                    try:
-                        use_chunks = True
+            self.readDataSource( request, snode, results )
+            self.logger.info( f"Access input data source {snode.varSource.dataSource.address}, time = {time.time() - t0} sec, handle pool = {HandlePoolMgr.stats()}" )
+            self.logger.info( "@L: LOCATION=> host: {}, thread: {}, proc: {}".format( socket.gethostname(), threading.get_ident(), os.getpid() ) )
+        return results
+
+    def readDataSource(self, request: TaskRequest, snode: SourceNode, results: EDASDatasetCollection ):
+        dataSource: DataSource = snode.varSource.dataSource
+        if dataSource.type == SourceType.collection:
+            from edas.collection.agg import Axis as AggAxis, File as AggFile
+            collection = Collection.new( dataSource.address )
+            self.logger.info("Input collection: " + dataSource.address )
+            aggs = collection.sortVarsByAgg( snode.varSource.vids )
+            domain = request.operationManager.domains.getDomain( snode.domain )
+            if domain is not None:
+                timeBounds = domain.findAxisBounds(Axis.T)
+                startDate = None if (domain is None or timeBounds is None) else TimeConversions.parseDate(timeBounds.start)
+                endDate   = None if (domain is None or timeBounds is None) else TimeConversions.parseDate(timeBounds.end)
+            else: startDate = endDate = None
+            for ( aggId, vars ) in aggs.items():
+                try:
+                    agg = collection.getAggregation(aggId)
+                    region = self.getRegion( collection, agg, domain )
+                    chunks = self.planCollectionChunks( snode, agg, vars, startDate, endDate, region )
+                    dset: Optional[xr.Dataset] = None
+                    alignFiles = collection.getBool( "chunk.align.files", True )
+                    zarrStore = ZarrConverter.getStore( collection, aggId )
+                    fileRange = ( 0, None ) if ( startDate is None or zarrStore is not None or agg.index is None ) else agg.periodRange( startDate, endDate )
+                    trimTime = startDate is not None and snode.offset is None and timeBounds.isValueType and timeBounds._timeDelta is None
+                    tslice, window = CoordLookupMgr.select( agg, *fileRange, startDate if trimTime else None, endDate, region )
+                    if zarrStore is not None:
+                        dset = self.openZarrStore( zarrStore, vars, region, startDate, endDate )
+                    elif collection.getBool( "collection.virtual", False ):
+                        dset = self.openVirtualDataset( agg, vars, startDate, endDate, region, chunks, alignFiles, str( request.uid ) )
+                    if dset is None:
                         pathList = collection.pathList(aggId) if startDate is None else collection.periodPathList(aggId,startDate,endDate)
                         assert len(pathList) > 0, f"No files found in aggregation {aggId} for date range {startDate} - {endDate} "
-                        nFiles = len(pathList)
-                        if use_chunks:
-                            nReadPartitions = int( EdasEnv.get( "mfdataset.npartitions", 250 ) )
-                            agg = collection.getAggregation(aggId)
-                            nchunks, fileSize = agg.getChunkSize( nReadPartitions, nFiles )
-                            chunk_kwargs = {} if nchunks is None else dict(chunks={"time": nchunks})
-                            self.logger.info( f"Open mfdataset: vars={vars}, NFILES={nFiles}, FileSize={fileSize}, FILES[0]={pathList[0]}, chunk_kwargs={chunk_kwargs}, startDate={startDate}, endDate={endDate}, domain={domain}" )
-                        else:
-                            chunk_kwargs = {}
-                            self.logger.info( f"Open mfdataset: vars={vars},  NFILES={nFiles}, FILES[0]={pathList[0]}" )
-                        dset: xr.Dataset = xr.open_mfdataset( pathList, engine='netcdf4', data_vars=vars, parallel=True, **chunk_kwargs )
+                        pathList = StagingCacheMgr.stage( pathList, str( request.uid ) )
+                        if alignFiles: chunks = self.alignFileChunks( agg, chunks )
+                        open_chunks = dict( chunks, **VirtualDataset( agg ).regionChunks( region ) )
+                        self.logger.info( f"Open mfdataset: vars={vars}, NFILES={len(pathList)}, FILES[0]={pathList[0]}, chunks={open_chunks}, startDate={startDate}, endDate={endDate}, domain={domain}" )
+                        trusted = collection.getBool( "collection.trusted", False )
+                        dset = self.openMFDataset( pathList, vars, trusted, region, chunks=open_chunks )
+                        if region: dset = dset.chunk( { dim: chunks[dim] for dim in region if dim in chunks } )
                         for id, dvar in dset.data_vars.items():
                             self.logger.info( f" ---> Variable {id}: attrs={dvar.attrs}"  )
-                        self.logger.info(f"Import to collection")
-                        self.importToDatasetCollection( results, request, snode, dset )
-                        self.logger.info(f"Collection import complete.")
-                    except Exception as err:
-                        self.logger.error( f"Error importing aggregation {aggId}: {err}\n:{traceback.format_exc()}")
-            elif dataSource.type == SourceType.file:
-                self.logger.info( "Reading data from address: " + dataSource.address )
-                files = glob.glob( dataSource.address )
-                parallel = len(files) > 1
-                assert len(files) > 0, f"No files matching path {dataSource.address}"
-                dset = xr.open_mfdataset(dataSource.address, engine='netcdf4', data_vars=snode.varSource.ids, parallel=parallel )
-                self.importToDatasetCollection(results, request, snode, dset)
-            elif dataSource.type == SourceType.archive:
-                self.logger.info( "Reading data from archive: " + dataSource.address )
-                dataPath =  request.archivePath( dataSource.address )
-                dset = xr.open_mfdataset( [dataPath] )
-                self.importToDatasetCollection(results, request, snode, dset)
-            elif dataSource.type == SourceType.dap:
-                nchunks = request.runargs.get( "ncores", 8 )
-                self.logger.info( f" --------------->>> Reading data from address: {dataSource.address}" )
-                dset = xr.open_dataset( dataSource.address, engine="netcdf4", chunks={"time":nchunks} )
-                self.logger.info(f" --------------->>> Completed Reading dataset, variables: {dset.variables.keys()}")
-                self.importToDatasetCollection( results, request, snode, dset )
-            self.logger.info( f"Access input data source {dataSource.address}, time = {time.time() - t0} sec" )
-            self.logger.info( "@L: LOCATION=> host: {}, thread: {}, proc: {}".format( socket.gethostname(), threading.get_ident(), os.getpid() ) )
-        return results
+                    if tslice is not None and zarrStore is None:
+                        # Lazily trims the files' time steps to the domain's time range, as located in the coordinate index.
+                        dset = dset.isel( { agg.getAxis("T").name: tslice } )
+                    self.logger.info( f"Input size for vars {vars}: {dset[vars].nbytes} bytes, region = {region}" )
+                    self.logger.info(f"Import to collection")
+                    self.importToDatasetCollection( results, request, snode, dset, window )
+                    self.logger.info(f"Collection import complete.")
+                except Exception as err:
+                    self.logger.error( f"Error importing aggregation {aggId}: {err}\n:{traceback.format_exc()}")
+        elif dataSource.type == SourceType.file:
+            self.logger.info( "Reading data from address: " + dataSource.address )
+            files = glob.glob( dataSource.address )
+            parallel = len(files) > 1
+            assert len(files) > 0, f"No files matching path {dataSource.address}"
+            with xr.open_dataset( files[0], engine=PooledNetCDF4Backend ) as first: chunks = self.planDatasetChunks( snode, first )
+            dset = xr.open_mfdataset(dataSource.address, engine=PooledNetCDF4Backend, data_vars=snode.varSource.ids, parallel=parallel, chunks=chunks )
+            self.importToDatasetCollection(results, request, snode, dset)
+        elif dataSource.type == SourceType.archive:
+            self.logger.info( "Reading data from archive: " + dataSource.address )
+            dataPath =  request.archivePath( dataSource.address )
+            with xr.open_dataset( dataPath, engine=PooledNetCDF4Backend ) as archive: chunks = self.planDatasetChunks( snode, archive )
+            dset = xr.open_mfdataset( [dataPath], engine=PooledNetCDF4Backend, chunks=chunks )
+            self.importToDatasetCollection(results, request, snode, dset)
+        elif dataSource.type == SourceType.zarr:
+            self.logger.info( "Reading data from zarr store: " + dataSource.address )
+            dset = self.openZarrStore( dataSource.address, snode.varSource.names() )
+            self.importToDatasetCollection(results, request, snode, dset)
+        elif dataSource.type == SourceType.dap:
+            self.logger.info( f" --------------->>> Reading data from address: {dataSource.address}" )
+            dset = DapAccessMgr.open( dataSource.address, dataSource.auth, lambda template: self.planDatasetChunks( snode, template ) )
+            self.logger.info(f" --------------->>> Completed Reading dataset, variables: {dset.variables.keys()}")
+            self.importToDatasetCollection( results, request, snode, dset )
+
+    def getReductionAxes(self, snode: SourceNode ) -> List[str]:
+        return list( { axis for node in snode.outputNodes for axis in node.axes } )
+
+    def planCollectionChunks(self, snode: SourceNode, agg: Aggregation, vars: List[str], startDate: Optional[datetime], endDate: Optional[datetime], region: Dict[str,slice] ) -> Dict[str,int]:
+        try:
+            vds = VirtualDataset( agg )
+            shapes = [ vds.getShape( var, startDate, endDate, region ) for var in vars ]
+        except VirtualDataset.Incomplete as err:
+            self.logger.warning( f"Can't plan chunks from catalog for aggregation {agg.spec}: {err}" )
+            return {}
+        shape = max( shapes, key=lambda shape: np.prod( list( shape.values() ) ) )
+        try: dtype = max( vds.probe( vars )[0].values(), key=lambda dtype: dtype.itemsize )
+        except Exception as err:
+            self.logger.warning( f"Can't read the dtype of {vars} from the first file of aggregation {agg.spec}, planning chunks for float32: {err}" )
+            dtype = np.dtype( np.float32 )
+        coordMap = { axis.type.lower(): axis.name for axis in agg.axes.values() }
+        reductionDims = ChunkPlanner.getReductionDims( self.getReductionAxes( snode ), coordMap )
+        return ChunkPlanner( shape, dtype, reductionDims, coordMap.get( "t", "time" ) ).plan()
+
+    def planDatasetChunks(self, snode: SourceNode, dset: xr.Dataset ) -> Dict[str,int]:
+        # Plans chunks from a (lazily opened) dataset; for multi-file sources this is the first file, so chunks never span files.
+        variables = [ dset[name] for name in snode.varSource.names() if name in dset.data_vars ] or list( dset.data_vars.values() )
+        if len( variables ) == 0: return {}
+        variable = max( variables, key=lambda var: var.size )
+        coordMap = Axis.getDatasetCoordMap( dset, False )
+        reductionDims = ChunkPlanner.getReductionDims( self.getReductionAxes( snode ), coordMap )
+        return ChunkPlanner( dict( variable.sizes ), variable.dtype, reductionDims, coordMap.get( "t", "time" ) ).plan()
+
+    def getRegion(self, collection: Collection, agg: Aggregation, domain: Optional[Domain] ) -> Dict[str,slice]:
+        if domain is None or not collection.getBool( "domain.pushdown", False ): return {}
+        return VirtualDataset( agg ).getRegion( domain )
+
+    def openMFDataset(self, pathList: List[str], vars: List[str], trusted: bool, region: Dict[str,slice] = None, **kwargs ) -> xr.Dataset:
+        # Trusted (homogeneous, self-generated) collections skip the cross-file coordinate/variable comparisons: files are
+        # concatenated in catalog order along time, and static coordinates and variables are taken from the first file.
+        # A region (dim name -> index slice) is applied to each file before combining; with chunks split at the region
+        # boundaries (see VirtualDataset.regionChunks) the file tasks then read only that hyperslab.
+        # Files are read through the process's handle pool ( see PooledNetCDF4Backend ), shared across requests.
+        kwargs.setdefault( "parallel", True )
+        if region: kwargs["preprocess"] = lambda ds: ds.isel( { dim: islice for dim, islice in region.items() if dim in ds.dims } )
+        with warnings.catch_warnings():
+            if region: warnings.filterwarnings( "ignore", message="The specified chunks separate the stored chunks" )      # region chunks are split at the region bounds on purpose
+            if not trusted: return xr.open_mfdataset( pathList, engine=PooledNetCDF4Backend, data_vars=vars, **kwargs )
+            with xr.open_dataset( pathList[0], engine=PooledNetCDF4Backend ) as first:
+                if region: first = first.isel( { dim: islice for dim, islice in region.items() if dim in first.dims } )
+                static_coords = { name: coord.load() for name, coord in first.coords.items() if "time" not in coord.dims }
+            kwargs.update( combine="nested", concat_dim="time", coords="minimal", compat="override", join="override", drop_variables=list(static_coords) )
+            return xr.open_mfdataset( pathList, engine=PooledNetCDF4Backend, data_vars=vars, **kwargs ).assign_coords( static_coords )
+
+    def alignFileChunks(self, agg: Aggregation, chunks: Dict[str,int] ) -> Dict[str,int]:
+        # open_mfdataset chunks each file separately, so its time chunk is set to a whole file or an even split of the longer
+        # files (see ChunkPlanner.fileChunk) rather than rechunking the combined dataset.
+        tAxis = agg.getAxis("T")
+        if tAxis is None or tAxis.name not in chunks: return chunks
+        sizes = agg.index.sizes.tolist() if agg.index is not None else [ file.size for file in agg.fileList() ]
+        return dict( chunks, **{ tAxis.name: ChunkPlanner.fileChunk( sizes, chunks[tAxis.name] ) } )
+
+    def openZarrStore(self, storePath: str, vars: List[str], region: Dict[str,slice] = None, startDate: Optional[datetime] = None, endDate: Optional[datetime] = None ) -> xr.Dataset:
+        # Zarr stores are read with their own chunking, which is chosen when the store is written ( see edas.collection.convert ).
+        # The time range is selected lazily, so only the chunks that overlap it are read.
+        dset = xr.open_zarr( storePath, consolidated=True )
+        dset = dset[ [ var for var in vars if var in dset.data_vars ] or list( dset.data_vars ) ]
+        if region: dset = dset.isel( { dim: islice for dim, islice in region.items() if dim in dset.dims } )
+        tname = Axis.getDatasetCoordMap( dset, False ).get( "t" )
+        if startDate is not None and tname is not None:
+            if np.issubdtype( dset[tname].dtype, np.datetime64 ):
+                bounds = [ None if date is None else np.datetime64( date.astimezone( timezone.utc ).replace( tzinfo=None ), "ns" ) for date in ( startDate, endDate ) ]
+                dset = dset.sel( { tname: slice( *bounds ) } )
+            else: self.logger.warning( f"Zarr store {storePath} has no datetime time coordinate, reading its full time range" )
+        self.logger.info( f"Opened zarr store {storePath}: vars={vars}, region={region}, time=({startDate},{endDate}), shape={dict(dset.sizes)}, chunks={dict(dset.chunks)}" )
+        return dset
+
+    def openVirtualDataset(self, agg: Aggregation, vars: List[str], startDate: Optional[datetime], endDate: Optional[datetime], region: Dict[str,slice] = None, chunks: Dict[str,int] = None, alignFiles: bool = True, owner: Optional[str] = None ) -> Optional[xr.Dataset]:
+        try:
+            return VirtualDataset( agg ).open( vars, startDate, endDate, region, chunks, alignFiles, owner )
+        except VirtualDataset.Incomplete as err:
+            self.logger.warning( f"Can't open virtual dataset for aggregation {agg.spec}, falling back to open_mfdataset: {err}" )
+            return None
 
     def getSession( self, dataSource: DataSource ) -> Session:
-        session: Session = None
-        if dataSource.auth == "esgf":
-            from pydap.cas.esgf import setup_session
-            openid = EdasEnv.get("esgf.openid", "")
-            password = EdasEnv.get("esgf.password", "")
-            username = EdasEnv.get("esgf.username", openid.split("/")[-1])
-            session = setup_session( openid, password, username, check_url=dataSource.address )
-        elif dataSource.auth == "urs":
-            from pydap.cas.urs import setup_session
-            username = EdasEnv.get("urs.username", "")
-            password = EdasEnv.get("urs.password", "")
-            session = setup_session( username, password, check_url=dataSource.address )
-        elif dataSource.auth == "cookie":
-            from pydap.cas.get_cookies import setup_session
-            username = EdasEnv.get("auth.username", "")
-            password = EdasEnv.get("auth.password", "")
-            auth_url = EdasEnv.get("auth.url", "")
-            session = setup_session( auth_url, username, password )
-        elif dataSource.auth is not None:
-            raise Exception( "Unknown authentication method: " + dataSource.auth )
-        return session
-
-    def processDataset(self, request: TaskRequest, dset: xr.Dataset, snode: SourceNode) -> EDASDataset:
+        return DapAccessMgr.sessions.get( dataSource.address, dataSource.auth )
+
+    def processDataset(self, request: TaskRequest, dset: xr.Dataset, snode: SourceNode, window: Optional[CoordWindow] = None ) -> EDASDataset:
         coordMap = Axis.getDatasetCoordMap( dset )
         filteredCoordMap = snode.varSource.name2id(coordMap)
         edset: EDASDataset = EDASDataset.new( dset, { id:snode.domain for id in snode.varSource.ids}, filteredCoordMap )
+        if window is not None:
+            for array in edset.inputs:
+                if window.fits( array.xr ): array.coordWindow = window
+                else: self.logger.info( f"Coordinate index doesn't match the shape of input {array.name}, cropping with dataset coordinates" )
         processed_domain: Domain  = request.cropDomain( snode.domain, edset.inputs, snode.offset )
         result = edset.subset( processed_domain ) if snode.domain else edset
         self.logger.info( f"###### ProcessDataset, coordMap = {filteredCoordMap}, dset coords = {list(edset.xr[0].coords.keys())}")
@@ -1,4 +1,4 @@
-import sys, inspect, logging, os, traceback
+import sys, inspect, logging, os, traceback, json
 from abc import ABCMeta, abstractmethod
 from edas.workflow.kernel import Kernel, InputKernel, EDASDataset, EDASDatasetCollection
 from os import listdir
@@ -83,7 +83,7 @@ class KernelManager:
     def __init__( self ):
         self.logger =  EDASLogger.getLogger()
         self.operation_modules: Dict[str,KernelModule] = {}
-        self.utilNodes = { "edas.metrics" }
+        self.utilNodes = { "edas.metrics", "edas.cachestats", "edas.cachelist", "edas.cacheevict", "edas.cachewarm" }
         self.build()
 
     def build(self):
@@ -170,8 +170,11 @@ class KernelManager:
 
     def buildSubWorkflow(self, request: TaskRequest, op: WorkflowNode ) -> EDASDatasetCollection:
         print( " %%%% BuildSubWorkflow: " + op.name )
+        kernel = self.getKernel( op )
+        memoized = kernel.getMemoizedResult( request, op )
+        if memoized is not None: return memoized
         subWorkflowDatasets: EDASDatasetCollection = self.getInputDatasets( request, op ).filterByOperation( op )
-        result: EDASDatasetCollection =  self.getKernel( op ).getResultDataset( request, op, subWorkflowDatasets )
+        result: EDASDatasetCollection =  kernel.getResultDataset( request, op, subWorkflowDatasets )
         print( " $$$$ buildSubWorkflow[ " + op.name + "]: " + subWorkflowDatasets.arrayIds + " -> " + result.arrayIds)
         return result
 
@@ -181,7 +184,7 @@ class KernelManager:
         assert len(resultOps), "No result operations (i.e. without 'result' parameter) found"
         if self.isUtilNode( resultOps[0] ):
             self.logger.info( "Build Utility Request" )
-            return [ self.processUtilNode( resultOps[0] ) ]
+            return [ self.processUtilNode( request, resultOps[0] ) ]
         else:
             self.logger.info( "Build Request, resultOps = " + str( [ node.name for node in resultOps ] ))
             result = EDASDatasetCollection("BuildRequest")
@@ -189,14 +192,65 @@ class KernelManager:
             self.cleanup( request )
             return result.getResultDatasets()
 
-    def processUtilNode(self, node: WorkflowNode ) -> EDASDataset:
+    def processUtilNode(self, request: TaskRequest, node: WorkflowNode ) -> EDASDataset:
         from edas.process.manager import ProcessManager
-        if node.name.lower() == "edas.metrics":
+        name = node.name.lower()
+        if name == "edas.metrics":
             processManager = ProcessManager.getManager()
             metrics = processManager.getCWTMetrics()
             metrics["@ResultClass"] = "METADATA"
             metrics["@ResultType"] = "METRICS"
             return EDASDataset( OrderedDict(), metrics )
+        elif name.startswith( "edas.cache" ):
+            info = self.processCacheUtilNode( request, node )
+            info["@ResultClass"] = "METADATA"
+            info["@ResultType"] = "CACHE"
+            return EDASDataset( OrderedDict(), info )
+
+    def processCacheUtilNode(self, request: TaskRequest, node: WorkflowNode ) -> Dict:
+        # Cache administration:  edas.cacheStats: tier sizes and hit/miss/eviction counters;  edas.cacheList: entries with
+        # tier, size and last access time;  edas.cacheEvict: removes entries whose key or id matches the 'pattern' ( or 'id' )
+        # parameter;  edas.cacheWarm: reads the node's input variables over their domains into the cache.
+        from edas.data.cache import EDASKCacheMgr
+        from edas.workflow.data import EDASArray
+        name = node.name.lower()
+        if name == "edas.cachestats":
+            return EDASKCacheMgr.stats()
+        elif name == "edas.cachelist":
+            return dict( entries=EDASKCacheMgr.entries() )
+        elif name == "edas.cacheevict":
+            pattern = node.getParm( "pattern", node.getParm( "id" ) )
+            assert pattern, "Missing 'pattern' or 'id' parameter to edas.cacheEvict"
+            return dict( evicted=EDASKCacheMgr.evict( pattern ) )
+        elif name == "edas.cachewarm":
+            cached = []
+            for inputNode in node.inputNodes:
+                inputs = self.buildSubWorkflow( request, inputNode )
+                domain = request.operationManager.domains.domains.get( inputNode.domain ) if inputNode.domain else None
+                for vid in inputNode.varSource.ids:
+                    variable = inputs[vid].getArray( vid )
+                    assert variable.bsize <= EDASKCacheMgr.maxEntrySize, f"Input {vid} ( {variable.bsize} bytes ) is too big for the cache ( {EDASKCacheMgr.maxEntrySize} bytes ), use a smaller domain"
+                    EDASKCacheMgr.cacheRegion( vid, domain, EDASArray( variable.name, variable.domId, variable.xrArray.persist() ) )
+                    cached.append( EDASKCacheMgr.key( vid, domain ) )
+            self.cleanup( request )
+            return dict( cached=cached, stats=EDASKCacheMgr.stats() )
+        raise Exception( "Unknown cache utility: " + node.name )
+
+    def execCacheUtility(self, utilSpec: List[str] ) -> Dict:
+        # Endpoint form of the cache utilities:  [ "cache", "stats" | "list" | "evict", <pattern> | "warm", <json datainputs> ],
+        # where the warm datainputs hold the "domain" and "variable" lists of the ROIs to cache.
+        command = utilSpec[1].lower() if len( utilSpec ) > 1 else "stats"
+        operation = { "name": "edas.cache" + command }
+        dataInputs = {}
+        if command == "evict":
+            assert len( utilSpec ) > 2, "Missing pattern parameter to cache evict"
+            operation["pattern"] = utilSpec[2]
+        elif command == "warm":
+            assert len( utilSpec ) > 2, "Missing datainputs parameter to cache warm"
+            dataInputs = json.loads( utilSpec[2] )
+            operation["input"] = ",".join( [ vspec.split(":")[-1] for variable in dataInputs.get( "variable", [] ) for vspec in variable["name"].split(",") ] )
+        request = TaskRequest.init( "util", "cache", Job.randomStr(6), "edas.cache" + command, dict( domain=dataInputs.get( "domain", [] ), variable=dataInputs.get( "variable", [] ), operation=[ operation ] ) )
+        return self.buildRequest( request )[0].attrs
 
     def cleanup(self, request: TaskRequest):
         ops: List[WorkflowNode] = request.getOperations()
@@ -1,5 +1,6 @@
 from ..kernel import Kernel, KernelSpec, EDASDataset, OpKernel, TimeOpKernel
 import time, xarray as xa
+import dask.array as da
 from xarray.core.groupby import DataArrayGroupBy
 from edas.process.operation import WorkflowNode, OpNode
 from edas.process.task import TaskRequest
@@ -10,7 +11,9 @@ from typing import List, Optional, Dict, Union
 from  scipy import stats, signal
 from edas.process.domain import Axis, DomainManager
 from edas.data.cache import EDASKCacheMgr
-from eofs.xarray import Eof
+from edas.data.decomposition import EofSolver
+from edas.config import EdasEnv
+from edas.portal.parsers import SizeParser
 from collections import OrderedDict
 import numpy as np
 
@@ -59,10 +62,33 @@ class MeanKernel(OpKernel):
 
 class MedianKernel(OpKernel):
     def __init__( self ):
-        OpKernel.__init__( self, KernelSpec("med", "Median Kernel","Computes the median of the array elements along the given axes." ) )
+        OpKernel.__init__( self, KernelSpec("med", "Median Kernel","Computes the median of the array elements along the given axes, "
+                "approximated by streaming quantile sketches with rank error 'error' when the axes are chunked unless 'exact' is true." ) )
 
     def processVariable( self, request: TaskRequest, node: OpNode, variable: EDASArray ) -> EDASArray:
-        return variable.median( node.axes )
+        error = node.getParm( "error" )
+        return variable.median( node.axes, exact=node.getBool( "exact", False ), error=float(error) if error is not None else None )
+
+class QuantileKernel(OpKernel):
+    def __init__( self ):
+        OpKernel.__init__( self, KernelSpec("quantile", "Quantile Kernel","Computes the quantiles 'q' ( e.g. '0.1,0.5' or percentiles 'p10,p90' ) "
+                "of the array elements along the given axes, approximated by streaming quantile sketches with rank error 'error' when the axes are chunked unless 'exact' is true." ) )
+
+    def processInputCrossSection( self, request: TaskRequest, node: OpNode, inputs: EDASDataset  ) -> EDASDataset:
+        resultArrays = [ result for inputArray in inputs.arrayMap.values() for result in self.processVariables( request, node, inputArray )  ]
+        return self.buildProduct( inputs.id, request, node, resultArrays, inputs.attrs )
+
+    @staticmethod
+    def parseQuantiles( spec: str ) -> List[float]:
+        quantiles = [ float( item[1:] ) / 100.0 if item.lower().startswith("p") else float( item ) for item in [ item.strip() for item in spec.split(",") ] if item ]
+        if not quantiles or any( q < 0.0 or q > 1.0 for q in quantiles ): raise Exception( "Quantiles must lie in [0,1] ( or [p0,p100] ): " + spec )
+        return quantiles
+
+    def processVariables(self, request: TaskRequest, node: OpNode, variable: EDASArray) -> List[EDASArray]:
+        quantiles = self.parseQuantiles( str( node.getParm( "q", "0.5" ) ) )
+        error = node.getParm( "error" )
+        results = variable.quantiles( node.axes, quantiles, float(error) if error is not None else None, node.getBool( "exact", False ) )
+        return [ variable.updateXa( result, "quantile-p" + f"{q*100:g}" ) for q, result in zip( quantiles, results ) ]
 
 class StdKernel(OpKernel):
     def __init__( self ):
@@ -78,9 +104,7 @@ class NormKernel(OpKernel):
         OpKernel.__init__( self, KernelSpec("norm", "Normalization Kernel","Normalizes input arrays by centering (computing anomaly) and then dividing by the standard deviation along the given axes." ) )
 
     def processVariable( self, request: TaskRequest, node: OpNode, variable: EDASArray ) -> EDASArray:
-        variable.persist()
-        centered_result =  variable - variable.ave( node.axes )
-        return centered_result / centered_result.std( node.axes )
+        return variable.norm( node.axes )
 
 class FilterKernel(OpKernel):
     def __init__( self ):
@@ -116,7 +140,6 @@ class TimeAggKernel(OpKernel):
         return self.buildProduct( inputs.id, request, node, resultArrays, inputs.attrs )
 
     def processVariables(self, request: TaskRequest, node: OpNode, variable: EDASArray) -> List[EDASArray]:
-        variable.persist()
         period = node.getParm("period", 'month')
         operation = str(node.getParm("op", 'mean')).lower()
         return variable.timeAgg( period, operation)
@@ -130,7 +153,6 @@ class TimeResampleKernel(OpKernel):
         return self.buildProduct( inputs.id, request, node, resultArrays, inputs.attrs )
 
     def processVariables(self, request: TaskRequest, node: OpNode, variable: EDASArray) -> List[EDASArray]:
-        variable.persist()
         freq = node.getParm("freq", 'month')
         operation = str(node.getParm("op", 'mean')).lower()
         return variable.timeResample( freq, operation )
@@ -349,7 +371,10 @@ class LowpassKernel(OpKernel):
 
 class EofKernel(TimeOpKernel):
     def __init__( self ):
-        TimeOpKernel.__init__( self, KernelSpec("eof", "Eof Kernel","Computes PCs and EOFs along the time axis." ) )
+        TimeOpKernel.__init__( self, KernelSpec("eof", "Eof Kernel","Computes PCs and EOFs along the time axis from an SVD of the chunked inputs, "
+                "optionally centered and sqrt(cos(lat)) weighted ( weights='coslat' ).  The default SVD is randomized ( method='randomized', "
+                "approximate, refined by 'iterations' power iterations ); method='tsqr' is exact but rechunks the inputs into blocks of "
+                "at least nTimes x nTimes ( or nPoints x nPoints ) values, and falls back to the randomized SVD above eof.tsqr.bytes per block." ) )
         self._requiresAlignment = True
 
     def get_cdms_variables( self, inputDset ):
@@ -362,23 +387,32 @@ class EofKernel(TimeOpKernel):
             rv.append( tvar )
         return rv
 
-    def get_input_array(self, inputDset: EDASDataset ):
-        info = { 'shapes': [], 'slicers': [] }
+    def get_input_array(self, inputDset: EDASDataset, latWeights: bool = False ):
+        # Stacks the ( chunked ) input arrays into one ( time x space ) dask array, with optional sqrt(cos(lat)) column weights.
+        info = { 'shapes': [], 'slicers': [], 'arrays': [] }
         islice = 0
-        xarrays: List[xa.DataArray] = [ input.purge( {"t":"time"} ).xr for input in inputDset.inputs ]
-
-        for xarray in xarrays:
+        stacked_arrays, weights = [], []
+        for input in inputDset.inputs:
+            xarray: xa.DataArray = input.purge( {"t":"time"} ).xr
             info['shapes'].append( xarray.shape[1:] )
-            channels = np.prod(xarray.shape[1:])
+            info['arrays'].append( xarray )
+            channels = int( np.prod(xarray.shape[1:]) )
             info['slicers'].append(slice(islice, islice + channels))
             islice += channels
-
-        stacked_arrays = [ xarray.stack( s=xarray.dims[1:] ) for xarray in xarrays ]
-        merged = xa.concat( stacked_arrays, dim='s' ) if len( stacked_arrays ) > 1 else stacked_arrays[0]
-        return merged, info
-
-    def getResults(self, eof_modes, slicers, shapes ):
-        results = [ eof_modes[dict(s=slicer)].unstack('s') for slicer, shape in zip(slicers, shapes)]
+            stacked_arrays.append( da.asarray( xarray.data ).reshape( ( xarray.shape[0], channels ) ) )
+            column_weights = np.ones( xarray.shape[1:] )
+            if latWeights and 'y' in xarray.dims:
+                ylat = np.sqrt( np.abs( input.getWeights( ['y'] ).values ) )
+                column_weights = column_weights * ylat.reshape( [ -1 if dim == 'y' else 1 for dim in xarray.dims[1:] ] )
+            weights.append( column_weights.ravel() )
+        merged = da.concatenate( stacked_arrays, axis=1 ) if len( stacked_arrays ) > 1 else stacked_arrays[0]
+        return merged, ( np.concatenate( weights ) if latWeights else None ), info
+
+    def getResults(self, eof_mode: np.ndarray, iMode: int, info: Dict ) -> List[xa.DataArray]:
+        results = []
+        for slicer, shape, xarray in zip( info['slicers'], info['shapes'], info['arrays'] ):
+            coords = { name: coord for name, coord in xarray.coords.items() if 'time' not in coord.dims }
+            results.append( xa.DataArray( eof_mode[slicer].reshape(shape), dims=xarray.dims[1:], coords=coords ).assign_coords( mode=iMode ) )
         return results
 
     def rename(self, data: xa.DataArray, rename_dict: Dict[str,str] ):
@@ -392,20 +426,21 @@ class EofKernel(TimeOpKernel):
 
     def processInputCrossSection( self, request: TaskRequest, node: OpNode, inputDset: EDASDataset ) -> EDASDataset:
         nModes = int( node.getParm("modes", 16) )
-        center = bool(node.getParm("center", "false"))
-        merged_input_data, info = self.get_input_array( inputDset )
-        shapes = info['shapes']
-        slicers = info['slicers']
-        solver = Eof( merged_input_data, center=center )
+        center = node.getBool("center", True)
+        latWeights = str( node.getParm("weights", "none") ).lower() == "coslat"
+        merged_input_data, weights, info = self.get_input_array( inputDset, latWeights )
+        solver = EofSolver( merged_input_data, nModes, center=center, weights=weights, method=str( node.getParm("method", "randomized") ).lower(), iterations=int( node.getParm("iterations", 2) ),
+                             maxBlockBytes=SizeParser.parse( EdasEnv.get( "eof.tsqr.bytes", "128M" ) ) )
         results = []
-        for iMode, eofs_result in enumerate( solver.eofs( neofs=nModes ) ):
-            for iVar, eofs_data in enumerate( self.getResults( eofs_result, slicers, shapes ) ):
+        for iMode, eofs_result in enumerate( solver.eofs() ):
+            for iVar, eofs_data in enumerate( self.getResults( eofs_result, iMode, info ) ):
                 input = inputDset.inputs[iVar]
                 results.append( EDASArray( "-".join( [ "eof-", str(iMode), input.name ]), input.domId, eofs_data  ) )
-        pcs_result = solver.pcs( npcs=nModes )
-        pcs = EDASArray( "pcs[" + inputDset.id + "]", inputDset.inputs[0].domId, EDASArray.cleanupCoords( pcs_result, { "mode": "m", "pc": "m" } ).transpose() )
+        times = info['arrays'][0].coords['time']
+        pcs_result = xa.DataArray( solver.pcs().T, dims=[ "m", "time" ], coords={ "m": np.arange( solver.nModes ), "time": times } )
+        pcs = EDASArray( "pcs[" + inputDset.id + "]", inputDset.inputs[0].domId, pcs_result )
         results.append( pcs )
-        fracs = solver.varianceFraction( neigs=nModes )
+        fracs = solver.varianceFraction()
         pves = [ str(round(float(frac*100.),1)) + '%' for frac in fracs ]
         for result in results: result["pves"] = str(pves)
         return EDASDataset.init(self.renameResults(results, node), inputDset.attrs)
@@ -415,7 +450,6 @@ class AnomalyKernel(OpKernel):
         OpKernel.__init__( self, KernelSpec("anomaly", "Anomaly Kernel", "Centers the input arrays by subtracting off the mean along the given axes." ) )
 
     def processVariable( self, request: TaskRequest, node: OpNode, variable: EDASArray ) -> EDASArray:
-        variable.persist()
         return  variable - variable.ave( node.axes )
 
 class VarKernel(OpKernel):
@@ -457,12 +491,14 @@ class NoOp(OpKernel):
 
 class CacheKernel(OpKernel):
     def __init__( self ):
-        Kernel.__init__( self, KernelSpec("cache", "Cache Kernel","Cache kernel used to cache input rois for low latency access by subsequest requests ." ) )
+        OpKernel.__init__( self, KernelSpec("cache", "Cache Kernel","Cache kernel used to cache input rois for low latency access by subsequest requests ." ) )
         self._maxInputs = 1
+        self._memoizable = False
 
     def processVariable( self, request: TaskRequest, node: OpNode, variable: EDASArray ) -> EDASArray:
         cacheId = node.getParm( "result" )
-        EDASKCacheMgr.cache( cacheId, variable )
+        domain = request.operationManager.domains.domains.get( variable.domId )
+        EDASKCacheMgr.cacheRegion( cacheId, domain, variable )
         return variable
 
 